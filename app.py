@@ -1,276 +1,1294 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+import hashlib
+import re
+import threading
+import time
+from collections import namedtuple
+
+import click
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, render_template, stream_with_context
+from datetime import date, datetime, timedelta
 import pytz
-from dateutil import parser
+from sqlalchemy import BigInteger, delete, insert, select, text, type_coerce
+from sqlalchemy.exc import OperationalError
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///reservations.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+from availability import ceil_to_grid, free_windows, parse_granularity
+from config import load_config
+from events import KEEPALIVE_FRAME, EventBroker, Subscription
+from metrics import NULL_METRICS, NULL_TIMER, PROMETHEUS_MIMETYPE, Metrics
+from models import (DEFAULT_RESOURCE, ArchivedReservation, RecurringSeries, Reservation, ReservationTombstone,
+                    bump_version, current_version, db, read_counter, upgrade_schema, write_counter)
+from occupancy import SlotOccupancy
+from recurrence import conflicts, occurrence_count, occurrences, parse_recurrence
+from reservation_index import ResourceIndexes
+from response_cache import create_response_cache
+from serialization import RESERVATION_COLUMNS, create_encoder
+from compression import create_compressor
+from storage import apply_pragmas, engine_options
+from timeparse import LOCAL_ZONE, from_epoch, localize, parse_local
 
-# Define the PST timezone
+# Define the PST timezone. The API's timestamps are wall-clock times in this
+# zone, and the stored epoch seconds were converted from them, so it is a
+# property of the data rather than a setting.
 PST = pytz.timezone('America/Los_Angeles')
 
-# Maximum reservation duration (e.g., 4 hours)
-MAX_RESERVATION_DURATION = timedelta(hours=4)
-# Minimum time slot (15 minutes)
-MIN_RESERVATION_DURATION = timedelta(minutes=15)
-# Advance booking limit (30 days)
-ADVANCE_BOOKING_LIMIT = timedelta(days=30)
-
-class Reservation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
-    end_time = db.Column(db.DateTime, nullable=False)
-
-    def __repr__(self):
-        return f'<Reservation {self.username} from {self.start_time} to {self.end_time}>'
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'start_time': self.start_time.isoformat(),
-            'end_time': self.end_time.isoformat()
-        }
-
-@app.route('/reservations', methods=['POST'])
-def create_reservation():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid input"}), 400
+# Resource ids are short identifiers; ',' and ':' stay free for query strings and cache keys
+RESOURCE_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# cli_group=None: commands are top level, e.g. `flask --app app archive`
+bp = Blueprint('reservations', __name__, cli_group=None)
+
+def _index_key(dt):
+    """Key used by the conflict index: naive PST wall-clock time, which is
+    what the EpochSeconds timestamp columns hand back.
+
+    An aware time is read as the instant it names first, as the database
+    stores it: a wall-clock time skipped when DST starts (02:15, localized
+    as standard time) becomes 03:15.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(LOCAL_ZONE)
+    return dt.replace(tzinfo=None)
+
+def get_reservation_index():
+    """Return this process's per-resource conflict indexes, caught up with the database.
+
+    The first call loads every reservation. Later calls compare the indexes'
+    version with the table version and, when another worker has written,
+    only fetch rows stamped with a newer version (new or updated
+    reservations) and tombstones of newer deletes. Versions are handed out in
+    commit order, so unlike ids they cannot be skipped by a slower writer
+    committing after a faster one. Indexes older than the tombstones that
+    archival has already pruned are rebuilt from scratch.
+    """
+    # Read the version before the rows: a write landing in between leaves
+    # the indexes marked older than they are, so the next call just re-checks.
+    version = current_version()
+    indexes = current_app.extensions.get('reservation_index')
+    if indexes is not None and indexes.version != version and indexes.version is not None \
+            and indexes.version < read_counter('tombstone_floor'):
+        indexes = None
+        current_app.extensions.pop('slot_occupancy', None)
+    if indexes is None:
+        indexes = current_app.extensions['reservation_index'] = ResourceIndexes()
+    if indexes.version != version:
+        new_rows = db.session.query(Reservation.resource_id, Reservation.id,
+                                    Reservation.start_time, Reservation.end_time)
+        if indexes.version is not None:
+            new_rows = new_rows.filter(Reservation.version > indexes.version)
+            # Deletes first: SQLite may hand a deleted row's id to a newer row
+            _remove_from_memory(indexes, db.session.scalars(
+                select(ReservationTombstone.reservation_id).where(ReservationTombstone.version > indexes.version)))
+        _add_to_memory(indexes, ((r.resource_id, r.id, r.start_time, r.end_time) for r in new_rows))
+        indexes.version = version
+    return indexes
+
+def _add_to_memory(indexes, rows):
+    """Add (resource_id, id, start_time, end_time) rows to the conflict
+    indexes and, where one exists, the resource's slot occupancy map, which
+    only counts rows the index did not already hold. A row already indexed
+    with another resource or interval was updated and is moved."""
+    occupancies = current_app.extensions.get('slot_occupancy', {})
+    for resource_id, reservation_id, start_time, end_time in rows:
+        start_key, end_key = _index_key(start_time), _index_key(end_time)
+        indexed = indexes.find(reservation_id)
+        if indexed is not None:
+            if indexed == (resource_id, start_key, end_key):
+                continue
+            _remove_from_memory(indexes, [reservation_id])
+        if indexes.add(resource_id, reservation_id, start_key, end_key):
+            occupancy = occupancies.get(resource_id)
+            if occupancy is not None:
+                occupancy.add(start_key, end_key)
+
+def _remove_from_memory(indexes, reservation_ids):
+    """Drop deleted reservations from the conflict indexes and slot occupancy maps."""
+    occupancies = current_app.extensions.get('slot_occupancy', {})
+    for reservation_id in reservation_ids:
+        removed = indexes.remove(reservation_id)
+        if removed is not None:
+            resource_id, start_key, end_key = removed
+            occupancy = occupancies.get(resource_id)
+            if occupancy is not None:
+                occupancy.remove(start_key, end_key)
+
+def get_slot_occupancy(indexes, resource_id, now_pst):
+    """Return the SlotOccupancy of one resource for the booking horizon starting today.
+
+    Built from the resource's (already synced) conflict index the first time
+    it is needed and again when the date rolls over; in between it is updated
+    together with the index. Maps are only kept for resources that have
+    reservations.
+    """
+    origin = _index_key(now_pst).replace(hour=0, minute=0, second=0, microsecond=0)
+    occupancies = current_app.extensions.setdefault('slot_occupancy', {})
+    occupancy = occupancies.get(resource_id)
+    if occupancy is None or occupancy.origin != origin:
+        # Today, the advance booking window and a spare day for reservations
+        # running past midnight of the last bookable day
+        slot = current_app.config['MIN_RESERVATION_DURATION']
+        n_slots = (current_app.config['ADVANCE_BOOKING_LIMIT'] + timedelta(days=2)) // slot
+        occupancy = SlotOccupancy(origin, slot, n_slots)
+        occupancy.extend(indexes.get(resource_id).overlapping(occupancy.origin, occupancy.end))
+        if resource_id in indexes:
+            occupancies[resource_id] = occupancy
+    return occupancy
+
+def begin_write(resource_ids):
+    """Open a write transaction that serializes conflict check and insert.
+
+    Without it two workers can both see a free slot and both insert. SQLite
+    takes the database write lock up front with BEGIN IMMEDIATE (other
+    writers wait up to the connection's busy timeout). PostgreSQL takes a
+    transaction-scoped advisory lock per resource, in sorted order so that
+    batches cannot deadlock, and readers are never blocked. Writers for
+    other resources only run their overlap checks side by side: every write
+    then bumps the table version (models.bump_version), whose row lock
+    serializes all writers from there until commit.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(text('BEGIN IMMEDIATE'))
+    elif dialect == 'postgresql':
+        for resource_id in sorted(set(resource_ids)):
+            db.session.execute(text("SELECT pg_advisory_xact_lock(hashtext('reservation:' || :resource_id))"),
+                               {'resource_id': resource_id})
+
+def load_conflict_indexes(resource_ids, start_time, end_time):
+    """Return ``{resource_id: ReservationIndex}`` holding every stored
+    reservation of those resources that could collide with [start_time, end_time).
+
+    With CONFLICT_CHECK='index' or 'bitmap' these are the process-wide
+    indexes; otherwise they are built from one range query, so a batch of
+    entries can be checked against the database in a single sweep.
+    """
+    resource_ids = set(resource_ids)
+    if current_app.config['CONFLICT_CHECK'] in ('index', 'bitmap'):
+        indexes = get_reservation_index()
+        return {resource_id: indexes.get(resource_id) for resource_id in resource_ids}
+    rows = db.session.query(Reservation.resource_id, Reservation.id, Reservation.start_time, Reservation.end_time) \
+        .filter(Reservation.resource_id.in_(resource_ids),
+                (Reservation.start_time < end_time) & (Reservation.end_time > start_time))
+    loaded = ResourceIndexes((r.resource_id, r.id, _index_key(r.start_time), _index_key(r.end_time)) for r in rows)
+    return {resource_id: loaded.get(resource_id) for resource_id in resource_ids}
+
+def has_overlap(resource_id, start_time, end_time, exclude_id=None):
+    """Check whether [start_time, end_time) collides with a stored reservation
+    of the same resource, other than reservation ``exclude_id`` (the one
+    being moved)."""
+    conflict_check = current_app.config['CONFLICT_CHECK']
+    # The slot map cannot leave one reservation out, so moves use the index
+    if conflict_check == 'index' or (conflict_check == 'bitmap' and exclude_id is not None):
+        return get_reservation_index().get(resource_id).overlaps(_index_key(start_time), _index_key(end_time),
+                                                                 exclude_id)
+    if conflict_check == 'bitmap':
+        indexes = get_reservation_index()
+        occupancy = get_slot_occupancy(indexes, resource_id, datetime.now(PST))
+        return occupancy.overlaps(_index_key(start_time), _index_key(end_time), indexes.get(resource_id).overlaps)
+    # EXISTS probe: stops at the first colliding row instead of loading them all
+    overlapping = Reservation.query.filter(
+        Reservation.resource_id == resource_id,
+        (Reservation.start_time < end_time) & (Reservation.end_time > start_time)
+    )
+    if exclude_id is not None:
+        overlapping = overlapping.filter(Reservation.id != exclude_id)
+    return db.session.query(overlapping.exists()).scalar()
+
+CONFLICT_ERROR = "Requested time slot is already reserved or overlaps with an existing reservation"
+
+class ReservationError(Exception):
+    """A reservation payload that failed validation, with the HTTP status to
+    report and the name of the booking rule it broke (a metrics label)."""
+
+    def __init__(self, message, status_code=400, rule='invalid_input'):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.rule = rule
+
+def booking_horizon_end(now_pst):
+    """First moment that can no longer be booked.
+
+    Reservations can be made up to ADVANCE_BOOKING_LIMIT days in the future.
+    This means if today is Day 0, the latest reservable day is Day 30.
+    The start_time must be before the beginning of Day 31.
+    """
+    return (now_pst.replace(hour=0, minute=0, second=0, microsecond=0) +
+            current_app.config['ADVANCE_BOOKING_LIMIT'] +
+            timedelta(days=1))
+
+def parse_reservation(data, now_pst, timer=NULL_TIMER):
+    """Validate one reservation payload against the booking rules.
+
+    Returns (username, resource_id, start_time, end_time) with the times
+    localized to PST, or raises ReservationError. ``resource_id`` is optional
+    and defaults to DEFAULT_RESOURCE. Overlaps are checked separately by the
+    caller. ``timer`` marks the 'parse' and 'validate' stages.
+    """
+    if not isinstance(data, dict):
+        raise ReservationError("Invalid input")
 
     username = data.get('username')
     start_time_str = data.get('start_time')
     end_time_str = data.get('end_time')
 
     if not all([username, start_time_str, end_time_str]):
-        return jsonify({"error": "Missing required fields"}), 400
+        raise ReservationError("Missing required fields", rule='missing_fields')
+
+    resource_id = data.get('resource_id', DEFAULT_RESOURCE)
+    if not isinstance(resource_id, str) or not RESOURCE_ID_RE.match(resource_id):
+        raise ReservationError("Invalid resource_id. Use up to 64 letters, digits, '.', '_' or '-'",
+                               rule='resource_id')
 
     try:
-        # Parse and localize to PST. Assume input is naive and represents PST.
-        start_time = PST.localize(parser.isoparse(start_time_str))
-        end_time = PST.localize(parser.isoparse(end_time_str))
-    except ValueError:
-        return jsonify({"error": "Invalid date format. Use ISO format YYYY-MM-DD HH:MM"}), 400
+        # Parse naive date/time string. Backend assumes it's in PST,
+        # so it comes back timezone-aware with the PST/PDT offset.
+        start_time = parse_local(start_time_str)
+        end_time = parse_local(end_time_str)
 
-    now_pst = datetime.now(PST)
+    except (ValueError, TypeError):
+        raise ReservationError("Invalid date format. Use YYYY-MM-DD HH:MM", rule='date_format')
+    timer.mark('parse')
 
     # Validate: Start time must be in the future
     if start_time <= now_pst:
-        return jsonify({"error": "Reservations can only be made for future dates/times"}), 400
+        raise ReservationError("Reservations can only be made for future dates/times", rule='past')
 
     # Validate: End time must be after start time
     if end_time <= start_time:
-        return jsonify({"error": "End time must be after start time"}), 400
+        raise ReservationError("End time must be after start time", rule='end_before_start')
+
+    min_duration = current_app.config['MIN_RESERVATION_DURATION']
+    max_duration = current_app.config['MAX_RESERVATION_DURATION']
+    advance_limit = current_app.config['ADVANCE_BOOKING_LIMIT']
 
     # Validate: Minimum reservation duration
-    if (end_time - start_time) < MIN_RESERVATION_DURATION:
-        return jsonify({"error": f"Minimum reservation duration is {MIN_RESERVATION_DURATION.total_seconds() / 60} minutes"}), 400
+    if (end_time - start_time) < min_duration:
+        raise ReservationError(f"Minimum reservation duration is {min_duration.total_seconds() / 60} minutes",
+                               rule='min_duration')
 
     # Validate: Maximum reservation duration
-    if (end_time - start_time) > MAX_RESERVATION_DURATION:
-        return jsonify({"error": f"Maximum reservation duration is {MAX_RESERVATION_DURATION.total_seconds() / 3600} hours"}), 400
+    if (end_time - start_time) > max_duration:
+        raise ReservationError(f"Maximum reservation duration is {max_duration.total_seconds() / 3600} hours",
+                               rule='max_duration')
 
     # Validate: Advance booking limit
-    if start_time > (now_pst + ADVANCE_BOOKING_LIMIT):
-        return jsonify({"error": f"Reservations can only be made up to {ADVANCE_BOOKING_LIMIT.days} days in advance"}), 400
+    limit_cutoff_datetime = booking_horizon_end(now_pst)
 
-    # Validate: No overlapping reservations
-    overlapping_reservations = Reservation.query.filter(
-        (Reservation.start_time < end_time) & (Reservation.end_time > start_time)
-    ).all()
+    if start_time >= limit_cutoff_datetime:
+        # To display a user-friendly "last allowed day"
+        last_allowed_day = limit_cutoff_datetime - timedelta(days=1)
+        raise ReservationError(
+            f"Reservations can only be made up to {advance_limit.days} days in advance (last available day is {last_allowed_day.strftime('%Y-%m-%d')})",
+            rule='advance_limit'
+        )
 
-    if overlapping_reservations:
-        return jsonify({"error": "Requested time slot is already reserved or overlaps with an existing reservation"}), 409
+    timer.mark('validate')
+    return username, resource_id, start_time, end_time
 
-    new_reservation = Reservation(username=username, start_time=start_time, end_time=end_time)
-    db.session.add(new_reservation)
-    db.session.commit()
+def _reservations_changed(event, reservations, version, deleted=False):
+    """Update this process's in-memory state after a committed write.
 
-    return jsonify(new_reservation.to_dict()), 201
+    ``reservations`` were created or updated, or, with ``deleted``, removed.
+    ``version`` is the table version the write committed. The conflict index
+    only moves to it if it was current just before the write; otherwise it
+    still has other workers' changes to fetch on its next sync. The
+    in-process response cache is cleared to free memory; its version-keyed
+    entries would never be read again anyway, so a cache error is only
+    logged and cannot fail the committed write. Finally ``event`` is
+    published to GET /reservations/stream subscribers.
+    """
+    indexes = current_app.extensions.get('reservation_index')
+    if indexes is not None:
+        if deleted:
+            _remove_from_memory(indexes, (r.id for r in reservations))
+        else:
+            _add_to_memory(indexes, ((r.resource_id, r.id, r.start_time, r.end_time) for r in reservations))
+        if indexes.version == version - 1:
+            indexes.version = version
+    cache = get_response_cache()
+    if cache is not None:
+        try:
+            cache.invalidate()
+        except Exception:
+            current_app.logger.warning("Response cache invalidation failed", exc_info=True)
+    dumps = current_app.json.dumps
+    get_event_broker().publish(event, [(r.resource_id, dumps(r.to_dict())) for r in reservations])
+
+def get_metrics():
+    """This app's Metrics, or NULL_METRICS when METRICS_ENABLED is off."""
+    return current_app.extensions['metrics']
+
+@bp.before_request
+def start_request_timer():
+    if get_metrics().enabled:
+        g.request_started = time.perf_counter()
+
+@bp.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        get_metrics().observe('http_request_duration_seconds', time.perf_counter() - started,
+                              endpoint=request.endpoint.rpartition('.')[2], method=request.method,
+                              status=str(response.status_code))
+    return response
+
+@bp.route('/reservations', methods=['POST'])
+def create_reservation():
+    metrics = get_metrics()
+    timer = metrics.timer(endpoint='create_reservation')
+    data = request.get_json()
+    if not data:
+        metrics.inc('reservation_rejections_total', rule='invalid_input')
+        return jsonify({"error": "Invalid input"}), 400
+    if isinstance(data, dict) and 'recurrence' in data:
+        return create_recurring_reservation(data)
 
-@app.route('/reservations', methods=['GET'])
-def get_reservations():
-    view = request.args.get('view', 'all') # 'all', 'day', 'week'
     now_pst = datetime.now(PST)
+    try:
+        username, resource_id, start_time, end_time = parse_reservation(data, now_pst, timer)
+    except ReservationError as e:
+        metrics.inc('reservation_rejections_total', rule=e.rule)
+        return jsonify({"error": e.message}), e.status_code
 
-    query = Reservation.query.filter(Reservation.end_time > now_pst) # Only future/active
+    try:
+        # Check and insert inside one serialized write transaction so that
+        # concurrent workers cannot both book the same slot.
+        begin_write([resource_id])
+        timer.mark('lock')
 
-    if view == 'day':
-        today_start = now_pst.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        query = query.filter(Reservation.start_time >= today_start, Reservation.start_time < today_end)
-    elif view == 'week':
-        # Start of the current week (assuming Monday is the first day)
-        week_start = (now_pst - timedelta(days=now_pst.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + timedelta(weeks=1)
-        query = query.filter(Reservation.start_time >= week_start, Reservation.start_time < week_end)
+        # Validate: No overlapping reservations on the same resource
+        # The database compares UTC epoch seconds (models.EpochSeconds); the
+        # in-memory index compares naive PST wall-clock times (_index_key).
+        overlapping = has_overlap(resource_id, start_time, end_time)
+        timer.mark('overlap')
+        if overlapping:
+            db.session.rollback()
+            metrics.inc('reservation_conflicts_total', endpoint='create_reservation')
+            return jsonify({"error": CONFLICT_ERROR}), 409
 
-    reservations = query.order_by(Reservation.start_time).all()
-    return jsonify([r.to_dict() for r in reservations]), 200
+        version = bump_version()
+        new_reservation = Reservation(username=username, resource_id=resource_id,
+                                      start_time=start_time, end_time=end_time, version=version)
+        db.session.add(new_reservation)
+        db.session.commit()
+        timer.mark('commit')
+    except OperationalError:
+        # Lock wait timed out ("database is locked") or similar transient failure
+        db.session.rollback()
+        metrics.inc('reservation_rejections_total', rule='busy')
+        return jsonify({"error": "Reservation service is busy, please retry"}), 503
 
-from flask import Flask, request, jsonify, render_template # Added render_template
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
-import pytz
-from dateutil import parser
+    _reservations_changed('created', [new_reservation], version)
+    timer.mark('publish')
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///reservations.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+    response = jsonify(new_reservation.to_dict())
+    timer.mark('serialize')
+    return response, 201
 
-# Define the PST timezone
-PST = pytz.timezone('America/Los_Angeles')
+def _expand_series(series, cutoff):
+    """Occurrences of ``series`` not handled yet that start before ``cutoff``
+    (naive PST), generated lazily; moves the series' bookkeeping past them."""
+    due = []
+    for start, end in occurrences(series.start_time, series.end_time, series.recurrence(), series.expanded):
+        if start >= cutoff:
+            series.next_start = start
+            break
+        due.append((start, end))
+    else:
+        series.next_start = None
+    series.expanded += len(due)
+    return due
 
-# Maximum reservation duration (e.g., 4 hours)
-MAX_RESERVATION_DURATION = timedelta(hours=4)
-# Minimum time slot (15 minutes)
-MIN_RESERVATION_DURATION = timedelta(minutes=15)
-# Advance booking limit (30 days)
-ADVANCE_BOOKING_LIMIT = timedelta(days=30)
-
-class Reservation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
-    end_time = db.Column(db.DateTime, nullable=False)
-
-    def __repr__(self):
-        return f'<Reservation {self.username} from {self.start_time} to {self.end_time}>'
-
-    def to_dict(self):
-        # Ensure times are converted to PST for consistent ISO format output if they are timezone-aware
-        # If stored as naive in DB but representing PST, localize before formatting
-        # If stored as UTC, convert to PST then format
-
-        # Assuming start_time and end_time from DB are already correct (e.g. stored as UTC or naive PST)
-        # For this example, the backend logic localizes to PST upon creation.
-        # So, they should be PST-aware datetime objects.
-
-        # No, the model stores naive datetimes after they've been converted from strings.
-        # The API converts them to ISO strings directly.
-        # The critical part is that the backend *interprets* incoming naive strings as PST.
-        # And stores timezone-aware datetimes in the DB if the DB & SQLAlchemy support it,
-        # or converts to UTC then stores naive, or stores naive PST.
-        # Given current code, they are stored as timezone-aware after PST.localize().
-
-        return {
-            'id': self.id,
-            'username': self.username,
-            'start_time': self.start_time.isoformat(), # Will include +00:00 if UTC, or -07:00/-08:00 if PST
-            'end_time': self.end_time.isoformat()
-        }
-
-@app.route('/reservations', methods=['POST'])
-def create_reservation():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid input"}), 400
+def _conflicting_occurrences(resource_id, candidates, accepted=None):
+    """Positions of the sorted ``candidates`` that collide with stored
+    reservations of the resource, or with those in ``accepted`` (a
+    ResourceIndexes of rows not committed yet), found in one merge pass."""
+    if not candidates:
+        return []
+    start, end = candidates[0][0], candidates[-1][1]
+    busy = load_conflict_indexes([resource_id], start, end)[resource_id].overlapping(start, end)
+    if accepted is not None:
+        busy = sorted(busy + accepted.get(resource_id).overlapping(start, end))
+    return conflicts(candidates, busy)
 
-    username = data.get('username')
-    start_time_str = data.get('start_time')
-    end_time_str = data.get('end_time')
+def create_recurring_reservation(data):
+    """POST /reservations with a ``recurrence`` rule.
 
-    if not all([username, start_time_str, end_time_str]):
-        return jsonify({"error": "Missing required fields"}), 400
+    The first occurrence is validated like a single reservation. Occurrences
+    inside the booking horizon are booked now, all or nothing: if any of
+    them collides, nothing is stored and the response lists the collisions.
+    Later occurrences are booked as the horizon reaches them (see
+    expand_recurring_series), skipping any whose slot is taken by then.
+    """
+    now_pst = datetime.now(PST)
+    try:
+        username, resource_id, start_time, end_time = parse_reservation(data, now_pst)
+        recurrence = parse_recurrence(data['recurrence'], current_app.config['MAX_RECURRENCE_OCCURRENCES'])
+    except ReservationError as e:
+        get_metrics().inc('reservation_rejections_total', rule=e.rule)
+        return jsonify({"error": e.message}), e.status_code
+    except ValueError as e:
+        get_metrics().inc('reservation_rejections_total', rule='recurrence')
+        return jsonify({"error": str(e)}), 400
+    series = RecurringSeries(username=username, resource_id=resource_id,
+                             start_time=_index_key(start_time), end_time=_index_key(end_time),
+                             freq=recurrence.freq, interval=recurrence.interval, count=recurrence.count,
+                             until=recurrence.until, expanded=0, skipped=0)
+    total = occurrence_count(series.start_time, recurrence)
+    if total == 0:
+        return jsonify({"error": "recurrence until is before the first occurrence"}), 400
+    if total > current_app.config['MAX_RECURRENCE_OCCURRENCES']:
+        return jsonify({"error": f"A recurring reservation can have at most {current_app.config['MAX_RECURRENCE_OCCURRENCES']} occurrences"}), 400
 
     try:
-        # Parse naive date/time string. Backend assumes it's in PST.
-        # Then localize it to make it timezone-aware.
-        naive_start_time = parser.isoparse(start_time_str)
-        naive_end_time = parser.isoparse(end_time_str)
+        begin_write([resource_id])
+        due = _expand_series(series, _index_key(booking_horizon_end(now_pst)))
+        clashes = _conflicting_occurrences(resource_id, due)
+        if clashes:
+            db.session.rollback()
+            get_metrics().inc('reservation_conflicts_total', endpoint='create_recurring_reservation')
+            return jsonify({"error": CONFLICT_ERROR, "conflicts": [
+                {"start_time": due[i][0].isoformat(), "end_time": due[i][1].isoformat()} for i in clashes
+            ]}), 409
+        version = bump_version()
+        db.session.add(series)
+        db.session.flush()
+        reservations = [Reservation(username=username, resource_id=resource_id, start_time=start, end_time=end,
+                                    version=version, series_id=series.id) for start, end in due]
+        db.session.add_all(reservations)
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        return jsonify({"error": "Reservation service is busy, please retry"}), 503
 
-        start_time = PST.localize(naive_start_time)
-        end_time = PST.localize(naive_end_time)
+    # Reload the rows expired by the commit with one query, not one per object
+    Reservation.query.filter(Reservation.series_id == series.id).all()
+    _reservations_changed('created', reservations, version)
+    return jsonify({"series": series.to_dict(), "reservations": [r.to_dict() for r in reservations]}), 201
 
-    except ValueError:
-        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD HH:MM"}), 400
+@bp.before_request
+def expand_recurring_series():
+    """Book the occurrences of recurring series that have entered the booking horizon.
 
-    now_pst = datetime.now(PST)
+    The horizon moves by a day at midnight, so each process does this on its
+    first request of the day, before handling it. Series are re-read under
+    the write lock, which makes the work idempotent across processes.
+    """
+    today = datetime.now(PST).date()
+    if current_app.extensions.get('series_expanded_on') == today:
+        return
+    cutoff = _index_key(booking_horizon_end(datetime.now(PST)))
+    due_series = select(RecurringSeries).where(RecurringSeries.next_start < cutoff)
+    try:
+        resource_ids = set(db.session.scalars(due_series.with_only_columns(RecurringSeries.resource_id)))
+        created, version = [], None
+        if resource_ids:
+            begin_write(resource_ids)
+            # Occurrences booked here, so that series of the same resource see each other
+            accepted = ResourceIndexes()
+            for series in db.session.scalars(due_series.order_by(RecurringSeries.id)
+                                             .execution_options(populate_existing=True)).all():
+                due = _expand_series(series, cutoff)
+                clashes = set(_conflicting_occurrences(series.resource_id, due, accepted))
+                series.skipped += len(clashes)
+                for i, (start, end) in enumerate(due):
+                    if i not in clashes:
+                        accepted.add(series.resource_id, None, start, end)
+                        created.append(Reservation(username=series.username, resource_id=series.resource_id,
+                                                   start_time=start, end_time=end, series_id=series.id))
+            if created:
+                version = bump_version()
+                for reservation in created:
+                    reservation.version = version
+                db.session.add_all(created)
+            db.session.commit()
+    except OperationalError:
+        # Busy: leave it to the next request
+        db.session.rollback()
+        return
+    current_app.extensions['series_expanded_on'] = today
+    if created:
+        # Reload the rows expired by the commit with one query, not one per object
+        Reservation.query.filter(Reservation.version == version).all()
+        _reservations_changed('created', created, version)
 
-    # Validate: Start time must be in the future
-    if start_time <= now_pst:
-        return jsonify({"error": "Reservations can only be made for future dates/times"}), 400
+@bp.route('/reservations/batch', methods=['POST'])
+def create_reservations_batch():
+    """Create many reservations in one transaction.
 
-    # Validate: End time must be after start time
-    if end_time <= start_time:
-        return jsonify({"error": "End time must be after start time"}), 400
+    Accepts a JSON array of reservation payloads. Every entry is validated
+    with the same rules as POST /reservations and checked for overlaps
+    against stored reservations and against earlier entries of the same
+    batch on the same resource; all accepted entries are committed together. The response lists a
+    result per entry, in request order.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty JSON array of reservations"}), 400
+    if len(items) > current_app.config['MAX_BATCH_SIZE']:
+        return jsonify({"error": f"A batch can contain at most {current_app.config['MAX_BATCH_SIZE']} reservations"}), 400
 
-    # Validate: Minimum reservation duration
-    if (end_time - start_time) < MIN_RESERVATION_DURATION:
-        return jsonify({"error": f"Minimum reservation duration is {MIN_RESERVATION_DURATION.total_seconds() / 60} minutes"}), 400
+    metrics = get_metrics()
+    now_pst = datetime.now(PST)
+    results = [None] * len(items)
+    candidates = []
+    for i, item in enumerate(items):
+        try:
+            candidates.append((i, *parse_reservation(item, now_pst)))
+        except ReservationError as e:
+            metrics.inc('reservation_rejections_total', rule=e.rule)
+            results[i] = {"index": i, "status": e.status_code, "error": e.message}
 
-    # Validate: Maximum reservation duration
-    if (end_time - start_time) > MAX_RESERVATION_DURATION:
-        return jsonify({"error": f"Maximum reservation duration is {MAX_RESERVATION_DURATION.total_seconds() / 3600} hours"}), 400
+    created = []
+    if candidates:
+        try:
+            resource_ids = {c[2] for c in candidates}
+            begin_write(resource_ids)
+            existing = load_conflict_indexes(resource_ids, min(c[3] for c in candidates), max(c[4] for c in candidates))
+            accepted = ResourceIndexes()
+            for i, username, resource_id, start_time, end_time in candidates:
+                start_key, end_key = _index_key(start_time), _index_key(end_time)
+                if existing[resource_id].overlaps(start_key, end_key) \
+                        or accepted.get(resource_id).overlaps(start_key, end_key):
+                    results[i] = {"index": i, "status": 409, "error": CONFLICT_ERROR}
+                    metrics.inc('reservation_conflicts_total', endpoint='create_reservations_batch')
+                    continue
+                accepted.add(resource_id, None, start_key, end_key)
+                created.append((i, Reservation(username=username, resource_id=resource_id,
+                                               start_time=start_time, end_time=end_time)))
 
-    # Validate: Advance booking limit
-    # Reservations can be made up to ADVANCE_BOOKING_LIMIT days in the future.
-    # This means if today is Day 0, the latest reservable day is Day 30.
-    # The start_time must be before the beginning of Day 31.
-    limit_cutoff_datetime = (now_pst.replace(hour=0, minute=0, second=0, microsecond=0) +
-                             ADVANCE_BOOKING_LIMIT +
-                             timedelta(days=1))
+            if created:
+                version = bump_version()
+                for _, reservation in created:
+                    reservation.version = version
+            db.session.add_all(r for _, r in created)
+            db.session.flush()
+            new_ids = [r.id for _, r in created]
+            db.session.commit()
+        except OperationalError:
+            db.session.rollback()
+            return jsonify({"error": "Reservation service is busy, please retry"}), 503
 
-    if start_time >= limit_cutoff_datetime:
-        # To display a user-friendly "last allowed day"
-        last_allowed_day = limit_cutoff_datetime - timedelta(days=1)
-        return jsonify({
-            "error": f"Reservations can only be made up to {ADVANCE_BOOKING_LIMIT.days} days in advance (last available day is {last_allowed_day.strftime('%Y-%m-%d')})"
-        }), 400
-
-    # Validate: No overlapping reservations
-    # Query needs to handle timezone-aware datetime objects correctly.
-    # SQLAlchemy typically converts aware datetimes to UTC for storage in SQLite if not configured otherwise,
-    # or stores them as is if the column type supports it (which DateTime does by default with SQLite).
-    # Let's assume they are stored as timezone-aware (or converted to a consistent TZ like UTC).
-    # For filtering, ensure comparison values are also timezone-aware.
-    overlapping_reservations = Reservation.query.filter(
-        (Reservation.start_time < end_time) & (Reservation.end_time > start_time)
-    ).all()
+    if created:
+        # Reload the rows expired by the commit with one query, not one per object
+        Reservation.query.filter(Reservation.id.in_(new_ids)).all()
+        _reservations_changed('created', [r for _, r in created], version)
+        for i, reservation in created:
+            results[i] = {"index": i, "status": 201, "reservation": reservation.to_dict()}
 
-    if overlapping_reservations:
-        return jsonify({"error": "Requested time slot is already reserved or overlaps with an existing reservation"}), 409
+    status = 201 if len(created) == len(items) else 207
+    return jsonify({"created": len(created), "results": results}), status
 
-    new_reservation = Reservation(username=username, start_time=start_time, end_time=end_time)
-    db.session.add(new_reservation)
-    db.session.commit()
+# Fields PATCH /reservations/<id> may change; others keep their stored value
+UPDATABLE_FIELDS = ('username', 'resource_id', 'start_time', 'end_time')
 
-    return jsonify(new_reservation.to_dict()), 201
+@bp.route('/reservations/<int:reservation_id>', methods=['PATCH'])
+def update_reservation(reservation_id):
+    """Change a reservation's username, resource or times in place.
+
+    The stored reservation merged with the given fields is validated with
+    the same rules as POST /reservations and checked for overlaps with every
+    other reservation of its (possibly new) resource. The row is updated in
+    one write transaction, so a move never leaves the old slot free or the
+    reservation missing in between. Reservations that have started cannot
+    be changed.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not any(field in data for field in UPDATABLE_FIELDS):
+        return jsonify({"error": f"Expected a JSON object with any of {', '.join(UPDATABLE_FIELDS)}"}), 400
+    reservation = db.session.get(Reservation, reservation_id)
+    if reservation is None:
+        return jsonify({"error": "Reservation not found"}), 404
+    target_resource = data.get('resource_id', reservation.resource_id)
+    # Checked before it is used as a lock key; parse_reservation checks it again
+    if not isinstance(target_resource, str) or not RESOURCE_ID_RE.match(target_resource):
+        get_metrics().inc('reservation_rejections_total', rule='resource_id')
+        return jsonify({"error": "Invalid resource_id. Use up to 64 letters, digits, '.', '_' or '-'"}), 400
 
-@app.route('/reservations', methods=['GET'])
-def get_reservations():
-    view = request.args.get('view', 'all') # 'all', 'day', 'week'
     now_pst = datetime.now(PST)
+    try:
+        begin_write([target_resource])
+        # Re-read under the write lock: another request may have changed it since
+        reservation = db.session.get(Reservation, reservation_id, populate_existing=True, with_for_update=True)
+        if reservation is None:
+            db.session.rollback()
+            return jsonify({"error": "Reservation not found"}), 404
+        if data.get('resource_id', reservation.resource_id) != target_resource:
+            db.session.rollback()
+            return jsonify({"error": "Reservation was changed by another request, please retry"}), 409
+        if reservation.start_time <= _index_key(now_pst):
+            db.session.rollback()
+            return jsonify({"error": "Reservations that have started cannot be changed"}), 409
+
+        merged = {'username': reservation.username, 'resource_id': reservation.resource_id,
+                  'start_time': reservation.start_time.isoformat(), 'end_time': reservation.end_time.isoformat()}
+        merged.update((field, data[field]) for field in UPDATABLE_FIELDS if field in data)
+        try:
+            username, resource_id, start_time, end_time = parse_reservation(merged, now_pst)
+        except ReservationError as e:
+            db.session.rollback()
+            get_metrics().inc('reservation_rejections_total', rule=e.rule)
+            return jsonify({"error": e.message}), e.status_code
+
+        if has_overlap(resource_id, start_time, end_time, exclude_id=reservation_id):
+            db.session.rollback()
+            get_metrics().inc('reservation_conflicts_total', endpoint='update_reservation')
+            return jsonify({"error": CONFLICT_ERROR}), 409
+
+        version = bump_version()
+        reservation.username = username
+        reservation.resource_id = resource_id
+        reservation.start_time = start_time
+        reservation.end_time = end_time
+        reservation.version = version
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        return jsonify({"error": "Reservation service is busy, please retry"}), 503
+
+    _reservations_changed('updated', [reservation], version)
+    return jsonify(reservation.to_dict()), 200
 
-    # Base query: only future/active reservations, ordered by start time
-    query = Reservation.query.filter(Reservation.end_time > now_pst)
+@bp.route('/reservations/<int:reservation_id>', methods=['DELETE'])
+def delete_reservation(reservation_id):
+    """Cancel a reservation, freeing its slot.
 
+    The delete leaves a tombstone with the new table version, from which
+    other workers learn to drop the reservation from their in-memory state.
+    """
+    try:
+        # Freeing a slot cannot cause a conflict, so no resource lock is needed
+        begin_write([])
+        reservation = db.session.get(Reservation, reservation_id, with_for_update=True)
+        if reservation is None:
+            db.session.rollback()
+            return jsonify({"error": "Reservation not found"}), 404
+        version = bump_version()
+        db.session.add(ReservationTombstone(version=version, reservation_id=reservation_id))
+        db.session.delete(reservation)
+        db.session.commit()
+    except OperationalError:
+        db.session.rollback()
+        return jsonify({"error": "Reservation service is busy, please retry"}), 503
+
+    _reservations_changed('cancelled', [reservation], version, deleted=True)
+    return '', 204
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def parse_page_limit(value):
+    """Page size for a paginated listing; defaults to DEFAULT_PAGE_SIZE."""
+    if value is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= current_app.config['MAX_PAGE_SIZE']:
+        raise ValueError(f"limit must be between 1 and {current_app.config['MAX_PAGE_SIZE']}")
+    return limit
+
+def parse_cursor(value):
+    """Parse an ``after`` cursor of the form '<start_time>,<id>' into a tuple."""
+    if value is None:
+        return None
+    try:
+        start_str, id_str = value.rsplit(',', 1)
+        start_time, id_ = datetime.fromisoformat(start_str), int(id_str)
+    except ValueError:
+        start_time = id_ = None
+    # Ids are 64-bit signed integers in the database
+    if id_ is None or not -2 ** 63 <= id_ < 2 ** 63:
+        raise ValueError("after must be a cursor of the form '<start_time>,<id>'")
+    return start_time, id_
+
+def format_cursor(reservation):
+    """Cursor pointing just past ``reservation`` in start_time, id order."""
+    start_time = reservation.start_time
+    if isinstance(start_time, int):
+        # Columnar listings select the stored epoch seconds
+        start_time = from_epoch(start_time)
+    return f"{start_time.isoformat()},{reservation.id}"
+
+def parse_resources(values):
+    """Resource ids from ``resource`` query parameters, each repeatable and
+    comma-separated; sorted and de-duplicated, or None if none were given."""
+    resource_ids = {r.strip() for value in values for r in value.split(',') if r.strip()}
+    if not resource_ids:
+        return None
+    for resource_id in resource_ids:
+        if not RESOURCE_ID_RE.match(resource_id):
+            raise ValueError(f"Invalid resource id: {resource_id}")
+    return sorted(resource_ids)
+
+def wants_ndjson(args, accept_mimetypes):
+    """True if the client asked for newline-delimited JSON, either with
+    ?format=ndjson or by preferring it in the Accept header. ?format=columnar
+    overrides the header."""
+    if args.get('format') == 'ndjson':
+        return True
+    if args.get('format') == 'columnar':
+        return False
+    return accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+Listing = namedtuple('Listing', 'statement view window_start resource_ids limit columnar')
+
+def parse_listing(args, now_pst):
+    """Build the GET /reservations query for the given query parameters.
+
+    Returns a Listing whose ``statement`` selects the listed reservations in
+    start_time, id order, without a LIMIT; ``limit`` is the page size, or
+    None for an unpaginated listing; ``columnar`` is set for ?format=columnar.
+    Raises ValueError for bad parameters. Shared by the WSGI route and the async listing in asgi.py.
+    """
+    view = args.get('view', 'all') # 'all', 'day', 'week'
+    # ?resource=a,b (or repeated) restricts the listing to those resources
+    resource_ids = parse_resources(args.getlist('resource'))
+
+    # Base query: only future/active reservations, ordered by start time.
+    # No reservation is longer than MAX_RESERVATION_DURATION, so the start_time
+    # bound never drops a row; it lets the database seek ix_reservation_start_end
+    # instead of walking the whole index in start_time order.
+    statement = select(Reservation).where(Reservation.end_time > now_pst,
+                                          Reservation.start_time > now_pst - current_app.config['MAX_RESERVATION_DURATION'])
+    if resource_ids is not None:
+        # Seeks ix_reservation_resource_start_end once per listed resource
+        statement = statement.where(Reservation.resource_id.in_(resource_ids))
+
+    window_start = None
     if view == 'day':
         # Today in PST
         today_start_pst = now_pst.replace(hour=0, minute=0, second=0, microsecond=0)
         today_end_pst = today_start_pst + timedelta(days=1)
-        query = query.filter(Reservation.start_time >= today_start_pst, Reservation.start_time < today_end_pst)
+        statement = statement.where(Reservation.start_time >= today_start_pst, Reservation.start_time < today_end_pst)
+        window_start = today_start_pst
     elif view == 'week':
         # Current week in PST, starting Monday
         start_of_week_pst = (now_pst - timedelta(days=now_pst.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_week_pst = start_of_week_pst + timedelta(weeks=1)
-        query = query.filter(Reservation.start_time >= start_of_week_pst, Reservation.start_time < end_of_week_pst)
+        statement = statement.where(Reservation.start_time >= start_of_week_pst, Reservation.start_time < end_of_week_pst)
+        window_start = start_of_week_pst
+
+    # id breaks ties so that the order, and therefore page cursors, are stable
+    statement = statement.order_by(Reservation.start_time, Reservation.id)
+
+    limit = None
+    if 'limit' in args or 'after' in args:
+        limit = parse_page_limit(args.get('limit'))
+        after = parse_cursor(args.get('after'))
+        if after is not None:
+            # Keyset seek: resume right after the last row of the previous page
+            after_start, after_id = after
+            statement = statement.where(Reservation.start_time >= after_start,
+                                        (Reservation.start_time > after_start) | (Reservation.id > after_id))
+
+    return Listing(statement, view, window_start, resource_ids, limit, args.get('format') == 'columnar')
+
+class ObjectListing:
+    """Listing rows loaded as model objects and serialized with to_dict()
+    and the app's JSON provider."""
+
+    def statement(self, statement):
+        return statement
+
+    def rows(self, result):
+        return result.scalars()
+
+    def array(self, reservations):
+        return current_app.json.response([r.to_dict() for r in reservations]).get_data()
+
+    def page(self, reservations, next_cursor):
+        return current_app.json.response({"reservations": [r.to_dict() for r in reservations],
+                                          "next": next_cursor}).get_data()
+
+    def lines(self, reservations):
+        dumps = current_app.json.dumps
+        return ''.join(dumps(r.to_dict()) + '\n' for r in reservations).encode()
+
+    def split_keys(self, rows, count):
+        """Rows of ``statement(...).add_columns(*keys)`` as (listing rows,
+        tuples of the ``count`` trailing key values)."""
+        return [row[0] for row in rows], [tuple(row[-count:]) for row in rows]
+
+class RowListing:
+    """Listing rows selected as RESERVATION_COLUMNS tuples (SQLAlchemy Core)
+    and encoded by a serialization.py encoder: no ORM objects at all."""
+
+    def __init__(self, encoder):
+        self.array = encoder.array
+        self.page = encoder.page
+        self.lines = encoder.lines
+
+    def statement(self, statement):
+        model = statement.column_descriptions[0]['entity']
+        return statement.with_only_columns(*(getattr(model, c) for c in RESERVATION_COLUMNS))
+
+    def rows(self, result):
+        return result
+
+    def split_keys(self, rows, count):
+        return [row[:-count] for row in rows], [tuple(row[-count:]) for row in rows]
+
+class ColumnarListing(RowListing):
+    """RowListing for ?format=columnar: start_time and end_time are selected
+    as the stored epoch seconds, and rows are encoded as parallel arrays."""
+
+    def __init__(self, encoder):
+        self.page = encoder.columns
+        self.array = encoder.columns
+        self.lines = None
+
+    def statement(self, statement):
+        model = statement.column_descriptions[0]['entity']
+        return statement.with_only_columns(*(
+            # Skip EpochSeconds' conversion to datetimes
+            type_coerce(getattr(model, c), BigInteger).label(c) if c in ('start_time', 'end_time')
+            else getattr(model, c) for c in RESERVATION_COLUMNS))
+
+OBJECT_LISTING = ObjectListing()
+
+def listing_format(route, columnar=False):
+    """How listing route ``route`` reads and encodes rows: ColumnarListing
+    for ?format=columnar, RowListing if the route is in CORE_LISTING_ROUTES,
+    else ObjectListing."""
+    if columnar:
+        return ColumnarListing(current_app.extensions['json_encoder'])
+    if route in current_app.config['CORE_LISTING_ROUTES']:
+        return RowListing(current_app.extensions['json_encoder'])
+    return OBJECT_LISTING
+
+def listing_page(listing_fmt, rows, limit):
+    """Page envelope for the first ``limit`` of ``rows``, which were fetched
+    with LIMIT limit + 1 so an extra row tells whether a page follows."""
+    next_cursor = format_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return listing_fmt.page(rows[:limit], next_cursor)
+
+def listing_cache_key(listing, version):
+    """Response cache key for a listing, or None if it is not cached.
+
+    Only unpaginated listings are cached, keyed by view, window, body format
+    and table version so that no worker sharing the cache can read a stale
+    body.
+    Compressed copies live under the same key plus ``:<encoding>``.
+    """
+    if listing.limit is not None:
+        return None
+    window_key = listing.window_start.date().isoformat() if listing.window_start is not None else '-'
+    resources_key = ','.join(listing.resource_ids) if listing.resource_ids is not None else '*'
+    format_key = 'columnar' if listing.columnar else 'json'
+    return f"{listing.view}:{window_key}:{resources_key}:{format_key}:{version}"
+
+def get_response_cache():
+    """This process's listing cache, built from RESPONSE_CACHE_URL (None if disabled)."""
+    if 'response_cache' not in current_app.extensions:
+        current_app.extensions['response_cache'] = create_response_cache(
+            current_app.config['RESPONSE_CACHE_URL'], current_app.config['RESPONSE_CACHE_SIZE'])
+    return current_app.extensions['response_cache']
+
+def response_cache_ttl(next_expiry, now_pst):
+    """Seconds a cached listing stays valid: until the next listed reservation
+    ends (``next_expiry``, naive PST) and drops out of it, capped at
+    RESPONSE_CACHE_MAX_TTL."""
+    ttl = current_app.config['RESPONSE_CACHE_MAX_TTL']
+    if next_expiry is not None:
+        ttl = min(ttl, (localize(next_expiry) - now_pst).total_seconds())
+    return ttl
+
+def listing_etag(version, next_expiry, now_pst, args, ndjson):
+    """ETag for a listing.
+
+    A listing can only change when the table version moves, when one of the
+    reservations still listed ends (``next_expiry``), or (for day/week views)
+    when the date rolls over. All three go into the tag together with the
+    query string and response format, so the tag changes whenever the body
+    would.
+    """
+    key = repr((next_expiry, now_pst.date(), sorted(args.items(multi=True)), ndjson))
+    return f"{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+
+def _with_etag(response, etag):
+    """Attach a weak ETag and ask clients to revalidate before reusing the body.
+
+    Every content encoding of a listing shares the tag: they are the same
+    representation as far as weak comparison goes.
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    if current_app.extensions['compressor'].encodings:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def listing_response(body, encoding, etag):
+    """200 JSON listing response for ``body``, compressed with ``encoding`` (or None)."""
+    response = Response(body, 200, mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return _with_etag(response, etag)
+
+@bp.route('/reservations', methods=['GET'])
+def get_reservations():
+    metrics = get_metrics()
+    timer = metrics.timer(endpoint='get_reservations')
+    now_pst = datetime.now(PST)
+    try:
+        listing = parse_listing(request.args, now_pst)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    ndjson = wants_ndjson(request.args, request.accept_mimetypes)
+
+    # Conditional GET: a client holding the current listing gets a 304
+    # before any listing query runs.
+    indexes = get_reservation_index()
+    next_expiry = indexes.next_expiry(_index_key(now_pst), listing.resource_ids)
+    etag = listing_etag(indexes.version, next_expiry, now_pst, request.args, ndjson)
+    if request.if_none_match.contains_weak(etag):
+        return _with_etag(Response(status=304), etag)
+
+    listing_fmt = listing_format('get_reservations', listing.columnar)
+    if ndjson:
+        statement = listing_fmt.statement(listing.statement)
+        if listing.limit is not None:
+            # Clients build the next cursor from the last line they received
+            statement = statement.limit(listing.limit)
+        # Stream one JSON object per line, fetching rows in chunks, so memory
+        # stays flat no matter how many reservations match.
+        statement = statement.execution_options(yield_per=current_app.config['STREAM_YIELD_PER'])
+        def generate():
+            rows = 0
+            for partition in listing_fmt.rows(db.session.execute(statement)).partitions():
+                rows += len(partition)
+                yield listing_fmt.lines(partition)
+            metrics.inc('reservation_rows_returned_total', rows, view=listing.view)
+        return _with_etag(Response(stream_with_context(generate()), 200, mimetype=NDJSON_MIMETYPE), etag)
+
+    compressor = current_app.extensions['compressor']
+    encoding = compressor.negotiate(request.accept_encodings)
+    if listing.limit is not None:
+        # Fetch one extra row to learn whether another page follows
+        statement = listing_fmt.statement(listing.statement).limit(listing.limit + 1)
+        rows = listing_fmt.rows(db.session.execute(statement)).all()
+        metrics.inc('reservation_rows_returned_total', min(len(rows), listing.limit), view=listing.view)
+        body, encoding = compressor.compress(listing_page(listing_fmt, rows, listing.limit), encoding)
+        return listing_response(body, encoding, etag), 200
+
+    # Read-through cache of the full listings, compressed copies included,
+    # so a repeated poll is one cache lookup
+    cache_key = listing_cache_key(listing, indexes.version)
+    cache = get_response_cache()
+    body = None
+    if cache is not None:
+        if encoding is not None:
+            body = cache.get(f"{cache_key}:{encoding}")
+            if body is not None:
+                metrics.inc('reservation_listing_cache_total', result='hit')
+                return listing_response(body, encoding, etag), 200
+        body = cache.get(cache_key)
+        metrics.inc('reservation_listing_cache_total', result='miss' if body is None else 'hit')
+        ttl = response_cache_ttl(next_expiry, now_pst)
+
+    if body is None:
+        rows = listing_fmt.rows(db.session.execute(listing_fmt.statement(listing.statement))).all()
+        timer.mark('query')
+        metrics.inc('reservation_rows_returned_total', len(rows), view=listing.view)
+        body = listing_fmt.array(rows)
+        timer.mark('encode')
+        if cache is not None:
+            cache.set(cache_key, body, ttl)
+    body, encoding = compressor.compress(body, encoding)
+    if encoding is not None:
+        timer.mark('compress')
+        if cache is not None:
+            cache.set(f"{cache_key}:{encoding}", body, ttl)
+    return listing_response(body, encoding, etag), 200
+
+def archive_expired(now_pst=None):
+    """Move reservations that ended ARCHIVE_AFTER ago to archived_reservation.
+
+    Rows go ARCHIVE_BATCH_SIZE at a time, oldest first, each batch in its own
+    write transaction, so bookings only ever wait for one batch. Every moved
+    row leaves a tombstone, so other workers drop it from memory the way
+    they drop cancellations. Tombstones are pruned one run later: by then
+    every worker that is still serving has had an archival interval to
+    apply them, and any worker that has not is rebuilt (see
+    get_reservation_index). Returns the number of rows moved.
+    """
+    cutoff = _index_key(now_pst or datetime.now(PST)) - current_app.config['ARCHIVE_AFTER']
+    batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+    columns = ['id', 'username', 'resource_id', 'start_time', 'end_time', 'series_id']
+    moved = 0
+    while True:
+        # Finished reservations cannot conflict with anything, so no resource lock
+        begin_write([])
+        ids = db.session.scalars(select(Reservation.id).where(Reservation.end_time <= cutoff)
+                                 .order_by(Reservation.end_time).limit(batch_size)).all()
+        if not ids:
+            db.session.rollback()
+            break
+        version = bump_version()
+        db.session.execute(insert(ArchivedReservation).from_select(
+            columns, select(*(getattr(Reservation, c) for c in columns)).where(Reservation.id.in_(ids))))
+        db.session.execute(insert(ReservationTombstone), [{'version': version, 'reservation_id': i} for i in ids])
+        db.session.execute(delete(Reservation).where(Reservation.id.in_(ids)))
+        db.session.commit()
+
+        indexes = current_app.extensions.get('reservation_index')
+        if indexes is not None:
+            _remove_from_memory(indexes, ids)
+            if indexes.version == version - 1:
+                indexes.version = version
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    begin_write([])
+    mark = read_counter('archive_mark')
+    db.session.execute(delete(ReservationTombstone).where(ReservationTombstone.version <= mark))
+    write_counter('tombstone_floor', mark)
+    write_counter('archive_mark', current_version())
+    db.session.commit()
+    return moved
+
+def start_archiver(app):
+    """Run archive_expired every ARCHIVE_INTERVAL seconds in a daemon thread.
+
+    Returns the thread, or None when ARCHIVE_INTERVAL is unset. Several
+    processes may each run one: the write lock serializes their batches.
+    """
+    interval = app.config['ARCHIVE_INTERVAL']
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    moved = archive_expired()
+                    db.session.remove()
+                if moved:
+                    app.logger.info("Archived %d finished reservations", moved)
+            except OperationalError:
+                app.logger.warning("Archival skipped, database busy", exc_info=True)
+            except Exception:
+                # Keep the thread alive: the next run may well succeed
+                app.logger.exception("Archival failed")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='reservation-archiver', daemon=True)
+    thread.start()
+    return thread
+
+@bp.cli.command('archive')
+def archive_command():
+    """Move finished reservations to the archive table now."""
+    click.echo(f"Archived {archive_expired()} reservations")
+
+def parse_date(value, name):
+    """A YYYY-MM-DD query parameter, or None if it was not given."""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+@bp.route('/reservations/history', methods=['GET'])
+def get_history():
+    """Archived reservations in start_time, archive_id order, one page at a time.
+
+    Query parameters: ``resource`` (as for GET /reservations), ``from`` and
+    ``to`` (YYYY-MM-DD, inclusive start dates), and ``limit`` / ``after``
+    for keyset pagination. The same reservation id can be archived more
+    than once, so cursors are '<start_time>,<archive_id>'.
+    """
+    try:
+        resource_ids = parse_resources(request.args.getlist('resource'))
+        first_day, last_day = (parse_date(request.args.get(name), name) for name in ('from', 'to'))
+        limit = parse_page_limit(request.args.get('limit'))
+        after = parse_cursor(request.args.get('after'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    statement = select(ArchivedReservation)
+    if resource_ids is not None:
+        statement = statement.where(ArchivedReservation.resource_id.in_(resource_ids))
+    if first_day is not None:
+        statement = statement.where(ArchivedReservation.start_time >= datetime.combine(first_day, datetime.min.time()))
+    # No day follows date.max, and every start_time is before its end anyway
+    if last_day is not None and last_day < date.max:
+        statement = statement.where(ArchivedReservation.start_time <
+                                    datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    if after is not None:
+        after_start, after_archive_id = after
+        statement = statement.where(ArchivedReservation.start_time >= after_start,
+                                    (ArchivedReservation.start_time > after_start) |
+                                    (ArchivedReservation.archive_id > after_archive_id))
+    statement = statement.order_by(ArchivedReservation.start_time, ArchivedReservation.archive_id).limit(limit + 1)
+    listing_fmt = listing_format('get_history')
+    rows, keys = listing_fmt.split_keys(db.session.execute(listing_fmt.statement(statement).add_columns(
+        ArchivedReservation.start_time, ArchivedReservation.archive_id)).all(), 2)
+    next_cursor = None
+    if len(rows) > limit:
+        start_time, archive_id = keys[limit - 1]
+        next_cursor = f"{start_time.isoformat()},{archive_id}"
+    return Response(listing_fmt.page(rows[:limit], next_cursor), 200, mimetype='application/json')
+
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+
+def get_event_broker():
+    """This process's EventBroker, which GET /reservations/stream subscribers follow."""
+    return current_app.extensions['event_broker']
+
+def open_subscription(args, last_event_id):
+    """Subscription for a GET /reservations/stream request, filtered by
+    ``?resource=`` like the listing. Raises ValueError for bad parameters.
+    Shared by the WSGI route and the async stream in asgi.py."""
+    return Subscription(get_event_broker(), parse_resources(args.getlist('resource')), last_event_id)
+
+@bp.route('/reservations/stream', methods=['GET'])
+def stream_reservations():
+    """Server-Sent Events feed of reservation changes.
+
+    Sends a ``created``, ``updated`` or ``cancelled`` event with the
+    reservation's JSON for every reservation this process creates (batches
+    included), changes or cancels. Each request holds a server thread for
+    as long as the client stays connected, so large numbers of subscribers
+    should be served through asgi.py instead.
+    """
+    try:
+        subscription = open_subscription(request.args, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    broker = subscription.broker
+    keepalive = current_app.config['EVENT_KEEPALIVE']
+
+    def generate():
+        # Flush the headers straight away so clients see the stream open
+        yield KEEPALIVE_FRAME
+        while True:
+            chunk = subscription.pending()
+            if chunk:
+                yield chunk
+            elif not broker.wait(subscription.cursor, keepalive):
+                yield KEEPALIVE_FRAME
+
+    response = Response(generate(), 200, mimetype=EVENT_STREAM_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/availability', methods=['GET'])
+def get_availability():
+    """Open booking windows for one day on one resource.
 
-    reservations = query.order_by(Reservation.start_time).all()
-    return jsonify([r.to_dict() for r in reservations]), 200
+    Query parameters: ``date`` (YYYY-MM-DD, default today, at most
+    ADVANCE_BOOKING_LIMIT days ahead), ``granularity`` (default 15m) and
+    ``resource`` (default DEFAULT_RESOURCE). Windows are computed with a
+    single sweep over the day's reservations from the resource's conflict
+    index and cached per resource, day and table version.
+    """
+    now_pst = datetime.now(PST)
+    today = now_pst.date()
+    try:
+        day = date.fromisoformat(request.args['date']) if 'date' in request.args else today
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    try:
+        granularity = parse_granularity(request.args.get('granularity', '15m'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    advance_limit = current_app.config['ADVANCE_BOOKING_LIMIT']
+    if not today <= day <= today + advance_limit:
+        return jsonify({"error": f"Availability is only available from today up to {advance_limit.days} days in advance"}), 400
+    resource_id = request.args.get('resource', DEFAULT_RESOURCE)
+    if not RESOURCE_ID_RE.match(resource_id):
+        return jsonify({"error": f"Invalid resource id: {resource_id}"}), 400
+
+    indexes = get_reservation_index()
+    granularity_minutes = int(granularity.total_seconds() // 60)
+    cache = get_response_cache()
+    if cache is not None:
+        # 'today' is part of the key because the earliest bookable slot of
+        # the current day moves with the clock
+        cache_key = f"availability:{resource_id}:{today.isoformat()}:{day.isoformat()}:{granularity_minutes}:{indexes.version}"
+        body = cache.get(cache_key)
+        if body is not None:
+            return Response(body, 200, mimetype='application/json')
+
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    # Reservations must start strictly after now
+    earliest = _index_key(now_pst) + timedelta(microseconds=1) if day == today else None
+    min_duration = current_app.config['MIN_RESERVATION_DURATION']
+    if current_app.config['CONFLICT_CHECK'] == 'bitmap' and granularity % min_duration == timedelta(0):
+        # On a grid of whole slots, busy slot runs give the same windows as
+        # the exact reservation intervals
+        busy = get_slot_occupancy(indexes, resource_id, now_pst).busy_intervals(day_start, day_end)
+    else:
+        busy = indexes.get(resource_id).overlapping(day_start, day_end)
+    windows = free_windows(busy, day_start, day_end, granularity, min_duration, earliest)
 
-@app.route('/')
+    response = jsonify({
+        "resource_id": resource_id,
+        "date": day.isoformat(),
+        "granularity_minutes": granularity_minutes,
+        "slots": [{"start_time": start.isoformat(), "end_time": end.isoformat()} for start, end in windows],
+    })
+    if cache is not None:
+        ttl = current_app.config['RESPONSE_CACHE_MAX_TTL']
+        if earliest is not None:
+            # Today's first window moves at the next grid point
+            next_slot = ceil_to_grid(earliest, day_start, granularity)
+            ttl = min(ttl, (localize(next_slot) - now_pst).total_seconds())
+        cache.set(cache_key, response.get_data(), max(ttl, 0.001))
+    return response, 200
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics_text():
+    """Prometheus scrape endpoint; 404 while METRICS_ENABLED is off."""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), 200, content_type=PROMETHEUS_MIMETYPE)
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
+def create_app(config=None):
+    """Application factory.
+
+    Builds the app with settings from config.load_config (defaults, settings
+    file, environment, then ``config``), binds the database with the
+    selected storage profile and registers the routes.
+    """
+    app = Flask(__name__)
+    load_config(app, config)
+    profile = app.config['STORAGE_PROFILE']
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(profile, app.config['SQLALCHEMY_DATABASE_URI']),
+        **app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+    }
+    app.extensions['event_broker'] = EventBroker(app.config['EVENT_HISTORY_SIZE'])
+    app.extensions['metrics'] = Metrics() if app.config['METRICS_ENABLED'] else NULL_METRICS
+    app.extensions['json_encoder'] = create_encoder(app.config['JSON_ENCODER'])
+    app.extensions['compressor'] = create_compressor(app.config['RESPONSE_ENCODINGS'],
+                                                     app.config['RESPONSE_COMPRESSION_MIN_SIZE'])
+    db.init_app(app)
+    with app.app_context():
+        apply_pragmas(db.engine, profile)
+    app.register_blueprint(bp)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        indexes = get_reservation_index() # Load the conflict indexes before serving
+        if app.config['CONFLICT_CHECK'] == 'bitmap':
+            for resource_id in indexes.resources():
+                get_slot_occupancy(indexes, resource_id, datetime.now(PST))
+    start_archiver(app)
 
     app.run(host='0.0.0.0', debug=True)
-    app.run(debug=True)
@@ -0,0 +1,280 @@
+"""ASGI entry point with a native async GET /reservations.
+
+Listing requests are served on an async SQLAlchemy engine (aiosqlite, or
+asyncpg for PostgreSQL), so a request waiting on the database holds no
+thread and one process can keep thousands of listings in flight. Query
+building, ETags, cache keys and response bodies are shared with the Flask
+route, so both paths answer a request identically and share the response
+cache. GET /reservations/stream is served natively too: each subscriber is
+a coroutine parked on the shared event broker rather than a thread. Every
+other route (writes, availability, the UI) is handed to the Flask app
+through asgiref's WSGI adapter, which runs it in a worker thread.
+
+Run with::
+
+    uvicorn asgi:application
+"""
+import asyncio
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import Accept, MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from app import (EVENT_STREAM_MIMETYPE, NDJSON_MIMETYPE, PST, create_app, expand_recurring_series, get_metrics,
+                 get_response_cache, listing_cache_key, listing_etag, listing_format, listing_page, open_subscription, parse_listing, response_cache_ttl, start_archiver,
+                 wants_ndjson)
+from events import KEEPALIVE_FRAME
+from models import DataVersion, Reservation, db
+from storage import apply_pragmas, engine_options
+
+# Async driver for each database backend the app supports
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_url(url):
+    """The app's database URL with the backend's async driver swapped in."""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def timed_send(send, metrics, endpoint):
+    """Wrap an ASGI ``send`` so that the request's duration is recorded when
+    the last body message goes out, as Flask's after_request hook does for
+    the routes it serves."""
+    started = time.perf_counter()
+    status = None
+
+    async def send_and_record(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                            endpoint=endpoint, method='GET', status=str(status))
+
+    return send_and_record
+
+
+class ReservationASGI:
+    """ASGI application serving GET /reservations and its event stream natively and the rest through Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self._engine = None
+        self._sessions = None
+
+    def sessions(self):
+        """Async session factory, created on first use inside the serving event loop."""
+        if self._sessions is None:
+            with self.flask_app.app_context():
+                # Flask-SQLAlchemy has already resolved relative SQLite paths
+                url = async_database_url(db.engine.url)
+            profile = self.flask_app.config['STORAGE_PROFILE']
+            self._engine = create_async_engine(url, **engine_options(profile, url))
+            apply_pragmas(self._engine.sync_engine, profile)
+            self._sessions = async_sessionmaker(self._engine, expire_on_commit=False)
+        return self._sessions
+
+    async def dispose(self):
+        """Close the async engine's pooled connections."""
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = self._sessions = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/reservations':
+            if self.flask_app.extensions.get('series_expanded_on') != datetime.now(PST).date():
+                # Flask routes run this as a before_request hook; a worker that
+                # only serves listings must still book the day's occurrences
+                await asyncio.to_thread(self._expand_recurring_series)
+            # The context lives in this request's task, across its awaits
+            with self.flask_app.app_context():
+                metrics = get_metrics()
+                if metrics.enabled:
+                    send = timed_send(send, metrics, 'get_reservations')
+                await self.get_reservations(scope, send)
+        elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/reservations/stream':
+            await self.stream_reservations(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    def _expand_recurring_series(self):
+        with self.flask_app.app_context():
+            expand_recurring_series()
+            db.session.remove()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_archiver(self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_reservations(self, scope, send):
+        """Async counterpart of app.get_reservations."""
+        metrics = get_metrics()
+        timer = metrics.timer(endpoint='get_reservations')
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        now_pst = datetime.now(PST)
+        try:
+            listing = parse_listing(args, now_pst)
+        except ValueError as e:
+            await self._send_json(send, 400, {"error": str(e)})
+            return
+        ndjson = wants_ndjson(args, parse_accept_header(headers.get('accept'), MIMEAccept))
+
+        async with self.sessions()() as session:
+            # Table version and next expiry in one round trip, in the same
+            # transaction as the listing query, so the tag matches the rows
+            expiring = select(func.min(Reservation.end_time)).where(Reservation.end_time > now_pst)
+            if listing.resource_ids is not None:
+                expiring = expiring.where(Reservation.resource_id.in_(listing.resource_ids))
+            version, next_expiry = (await session.execute(select(
+                select(DataVersion.version).where(DataVersion.name == 'reservation').scalar_subquery(),
+                expiring.scalar_subquery(),
+            ))).one()
+            version = version or 0
+            etag = listing_etag(version, next_expiry, now_pst, args, ndjson)
+            etag_headers = [(b'etag', quote_etag(etag, weak=True).encode()), (b'cache-control', b'no-cache')]
+            compressor = self.flask_app.extensions['compressor']
+            if compressor.encodings:
+                etag_headers.append((b'vary', b'Accept-Encoding'))
+            if parse_etags(headers.get('if-none-match')).contains_weak(etag):
+                await self._send(send, 304, b'', etag_headers)
+                return
+
+            listing_fmt = listing_format('get_reservations', listing.columnar)
+            if ndjson:
+                await self._stream_ndjson(session, listing, listing_fmt, send, etag_headers)
+                return
+
+            encoding = compressor.negotiate(parse_accept_header(headers.get('accept-encoding'), Accept))
+            if listing.limit is not None:
+                # Fetch one extra row to learn whether another page follows
+                statement = listing_fmt.statement(listing.statement).limit(listing.limit + 1)
+                rows = listing_fmt.rows(await session.execute(statement)).all()
+                metrics.inc('reservation_rows_returned_total', min(len(rows), listing.limit), view=listing.view)
+                body, encoding = compressor.compress(listing_page(listing_fmt, rows, listing.limit), encoding)
+                await self._send_listing(send, body, encoding, etag_headers)
+                return
+
+            cache_key = listing_cache_key(listing, version)
+            cache = get_response_cache()
+            body = None
+            if cache is not None:
+                if encoding is not None:
+                    body = cache.get(f"{cache_key}:{encoding}")
+                    if body is not None:
+                        metrics.inc('reservation_listing_cache_total', result='hit')
+                        await self._send_listing(send, body, encoding, etag_headers)
+                        return
+                body = cache.get(cache_key)
+                metrics.inc('reservation_listing_cache_total', result='miss' if body is None else 'hit')
+                ttl = response_cache_ttl(next_expiry, now_pst)
+            if body is None:
+                rows = listing_fmt.rows(await session.execute(listing_fmt.statement(listing.statement))).all()
+                timer.mark('query')
+                metrics.inc('reservation_rows_returned_total', len(rows), view=listing.view)
+                body = listing_fmt.array(rows)
+                timer.mark('encode')
+                if cache is not None:
+                    cache.set(cache_key, body, ttl)
+        body, encoding = compressor.compress(body, encoding)
+        if encoding is not None:
+            timer.mark('compress')
+            if cache is not None:
+                cache.set(f"{cache_key}:{encoding}", body, ttl)
+        await self._send_listing(send, body, encoding, etag_headers)
+
+    async def _send_listing(self, send, body, encoding, headers):
+        headers = [(b'content-type', b'application/json'), *headers]
+        if encoding is not None:
+            headers.append((b'content-encoding', encoding.encode()))
+        await self._send(send, 200, body, headers)
+
+    async def _stream_ndjson(self, session, listing, listing_fmt, send, headers):
+        """Send the listing as NDJSON, one chunk per STREAM_YIELD_PER rows."""
+        statement = listing_fmt.statement(listing.statement)
+        if listing.limit is not None:
+            statement = statement.limit(listing.limit)
+        statement = statement.execution_options(yield_per=self.flask_app.config['STREAM_YIELD_PER'])
+        result = listing_fmt.rows(await session.stream(statement))
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', NDJSON_MIMETYPE.encode()), *headers]})
+        rows = 0
+        async for partition in result.partitions():
+            rows += len(partition)
+            await send({'type': 'http.response.body', 'body': listing_fmt.lines(partition), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+        get_metrics().inc('reservation_rows_returned_total', rows, view=listing.view)
+
+    async def stream_reservations(self, scope, receive, send):
+        """Async counterpart of app.stream_reservations, held open until the client disconnects."""
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        with self.flask_app.app_context():
+            try:
+                subscription = open_subscription(args, headers.get('last-event-id'))
+            except ValueError as e:
+                await self._send_json(send, 400, {"error": str(e)})
+                return
+
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', EVENT_STREAM_MIMETYPE.encode()), (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        pump = asyncio.ensure_future(self._pump_events(subscription, send))
+        disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({pump, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pump.cancel()
+            disconnect.cancel()
+        if pump.done() and not pump.cancelled():
+            pump.result()  # Re-raise a failure while sending
+
+    async def _pump_events(self, subscription, send):
+        keepalive = self.flask_app.config['EVENT_KEEPALIVE']
+        broker = subscription.broker
+        await send({'type': 'http.response.body', 'body': KEEPALIVE_FRAME, 'more_body': True})
+        while True:
+            chunk = subscription.pending()
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            elif not await broker.wait_async(subscription.cursor, keepalive):
+                await send({'type': 'http.response.body', 'body': KEEPALIVE_FRAME, 'more_body': True})
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _send_json(self, send, status, payload, headers=()):
+        # Flask's JSON provider, so bodies are byte-identical to the WSGI route's
+        body = self.flask_app.json.response(payload).get_data()
+        await self._send(send, status, body, [(b'content-type', b'application/json'), *headers])
+
+    @staticmethod
+    async def _send(send, status, body, headers):
+        if status != 304:
+            headers = [(b'content-length', str(len(body)).encode()), *headers]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+application = ReservationASGI(create_app())
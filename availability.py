@@ -0,0 +1,59 @@
+"""Free-slot computation for the availability endpoint.
+
+Free time is found with one pass over a day's reservations sorted by start
+time, rather than by probing every candidate slot for conflicts.
+"""
+import re
+from datetime import timedelta
+
+_GRANULARITY_RE = re.compile(r'^(\d+)([mh]?)$')
+
+
+def parse_granularity(value):
+    """Parse a slot granularity such as ``15m``, ``1h`` or ``30`` (minutes)."""
+    match = _GRANULARITY_RE.match(value.strip().lower())
+    if not match:
+        raise ValueError("granularity must look like '15m' or '1h'")
+    amount, unit = int(match.group(1)), match.group(2)
+    granularity = timedelta(hours=amount) if unit == 'h' else timedelta(minutes=amount)
+    if not timedelta(minutes=1) <= granularity <= timedelta(days=1):
+        raise ValueError("granularity must be between 1 minute and 24 hours")
+    return granularity
+
+
+def ceil_to_grid(t, origin, step):
+    """Smallest grid point ``origin + k * step`` that is >= ``t``."""
+    return origin - ((origin - t) // step) * step
+
+
+def floor_to_grid(t, origin, step):
+    """Largest grid point ``origin + k * step`` that is <= ``t``."""
+    return origin + ((t - origin) // step) * step
+
+
+def free_windows(busy, window_start, window_end, granularity, min_duration, earliest=None):
+    """Return the free ``(start, end)`` windows inside ``[window_start, window_end)``.
+
+    ``busy`` is an iterable of ``(start, end)`` reservations sorted by start.
+    Windows are aligned to a ``granularity`` grid anchored at
+    ``window_start``, start no earlier than ``earliest`` and are at least
+    ``min_duration`` long; shorter gaps cannot be booked and are dropped.
+    """
+    windows = []
+
+    def emit(gap_start, gap_end):
+        start = ceil_to_grid(gap_start, window_start, granularity)
+        end = floor_to_grid(gap_end, window_start, granularity)
+        if end - start >= min_duration:
+            windows.append((start, end))
+
+    cursor = window_start if earliest is None else max(window_start, earliest)
+    for busy_start, busy_end in busy:
+        if cursor >= window_end:
+            break
+        if busy_start > cursor:
+            emit(cursor, min(busy_start, window_end))
+        cursor = max(cursor, busy_end)
+    if cursor < window_end:
+        emit(cursor, window_end)
+    return windows
@@ -0,0 +1,294 @@
+"""End-to-end benchmark of the reservation API, with JSON results.
+
+Seeds a temporary SQLite database with synthetic upcoming reservations
+spread over the booking window and several resources. It then drives these
+scenarios:
+
+* create:     POST /reservations into free slots
+* list_all:   GET /reservations
+* list_day:   GET /reservations?view=day
+* list_week:  GET /reservations?view=week
+
+Each scenario runs against two targets:
+
+* test_client: the Flask test client, in process, one request at a time
+  (application cost without HTTP)
+* server:      the app served by Werkzeug's threaded server in a subprocess,
+  driven by --clients concurrent HTTP clients
+
+For every target and scenario the script reports throughput, p50/p95/p99
+latency and resident memory. ``--output`` saves the results as JSON, and
+``--compare`` prints the change against an earlier results file.
+
+Usage::
+
+    python benchmarks/bench_api.py --rows 10000 --requests 500 --output results.json
+    python benchmarks/bench_api.py --rows 10000 --requests 500 --compare results.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import PST, create_app  # noqa: E402
+from models import Reservation, db  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+SCENARIOS = {
+    'create': ('POST', '/reservations', 201),
+    'list_all': ('GET', '/reservations', 200),
+    'list_day': ('GET', '/reservations?view=day', 200),
+    'list_week': ('GET', '/reservations?view=week', 200),
+}
+SERVER = [sys.executable, '-c',
+          "import sys; from app import create_app; create_app().run(port=int(sys.argv[1]), threaded=True)"]
+# Bookings per resource per day when seeding: one 45-minute slot an hour, 8:00-20:00
+SLOTS_PER_DAY = 12
+
+
+def seed(database_url, rows, now):
+    """Create the schema and ``rows`` reservations over the next 30 days,
+    on as many resources as that takes."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    resources = max(1, math.ceil(rows / (30 * SLOTS_PER_DAY)))
+    first_day = now.replace(hour=8, minute=0, second=0, microsecond=0, tzinfo=None) + timedelta(days=1)
+    batch = []
+    for i in range(rows):
+        day, slot = divmod(i // resources, SLOTS_PER_DAY)
+        start = first_day + timedelta(days=day, hours=slot)
+        batch.append({'username': f'user{i % 97}', 'resource_id': f'server-{i % resources}', 'version': 0,
+                      'start_time': start, 'end_time': start + timedelta(minutes=45)})
+    with app.app_context():
+        db.create_all()
+        if batch:
+            db.session.execute(insert(Reservation), batch)
+        db.session.commit()
+
+
+def create_payloads(n, now):
+    """``n`` POST bodies for slots nobody holds: a fresh resource per day of bookings."""
+    first_day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    payloads = []
+    for i in range(n):
+        day, slot = divmod(i, 96)
+        start = first_day + timedelta(minutes=15 * slot)
+        payloads.append({'username': 'bench', 'resource_id': f'bench-{day}',
+                         'start_time': start.strftime('%Y-%m-%d %H:%M'),
+                         'end_time': (start + timedelta(minutes=15)).strftime('%Y-%m-%d %H:%M')})
+    return payloads
+
+
+def rss_mib(pid='self'):
+    """Current and peak resident memory of a process, in MiB."""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0]) / 1024
+    return values.get('VmRSS', 0.0), values.get('VmHWM', 0.0)
+
+
+def summarize(target, scenario, latencies, errors, elapsed, memory):
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[max(math.ceil(len(latencies) * p) - 1, 0)], 3) if latencies else None
+
+    rss, peak = memory
+    return {'target': target, 'scenario': scenario, 'requests': len(latencies) + errors, 'errors': errors,
+            'rps': round(len(latencies) / elapsed, 1), 'p50_ms': pct(0.50), 'p95_ms': pct(0.95),
+            'p99_ms': pct(0.99), 'rss_mib': round(rss, 1), 'peak_rss_mib': round(peak, 1)}
+
+
+def run_test_client(database_url, scenario, n, payloads):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    client = app.test_client()
+    method, path, expected = SCENARIOS[scenario]
+    client.get('/reservations')  # Load the conflict index outside the timings
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        if method == 'POST':
+            status = client.post(path, json=payloads[i]).status_code
+        else:
+            status = client.get(path).status_code
+        if status == expected:
+            latencies.append((time.perf_counter() - t0) * 1000)
+        else:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    with app.app_context():
+        db.engine.dispose()
+    return latencies, errors, elapsed, rss_mib()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_url):
+    port = free_port()
+    proc = subprocess.Popen(SERVER + [str(port)], cwd=ROOT, env=dict(os.environ, DATABASE_URL=database_url),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def request(port, method, path, payload):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        if payload is None:
+            conn.request(method, path)
+        else:
+            conn.request(method, path, json.dumps(payload), {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_server(database_url, scenario, n, payloads, clients):
+    proc, port = start_server(database_url)
+    method, path, expected = SCENARIOS[scenario]
+    latencies, errors = [], []
+    next_request = iter(range(n))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                status = request(port, method, path, payloads[i] if method == 'POST' else None)
+            except OSError:
+                status = None
+            with lock:
+                if status == expected:
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                else:
+                    errors.append(status)
+
+    try:
+        request(port, 'GET', '/reservations', None)  # Warm up outside the timings
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        memory = rss_mib(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return latencies, len(errors), elapsed, memory
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['target'], r['scenario']): r for r in json.load(f)['results']}
+    print(f"\nChange against {baseline_path}:")
+    print(f"{'target':>12} {'scenario':>10} {'req/s':>9} {'p50':>9} {'p99':>9}")
+    for result in results:
+        before = baseline.get((result['target'], result['scenario']))
+        if before is None:
+            continue
+
+        def change(key):
+            if not before[key] or result[key] is None:
+                return 'n/a'
+            return f"{(result[key] - before[key]) / before[key] * 100:+.1f}%"
+
+        print(f"{result['target']:>12} {result['scenario']:>10} {change('rps'):>9} "
+              f"{change('p50_ms'):>9} {change('p99_ms'):>9}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=10000, help="reservations seeded before each run")
+    arg_parser.add_argument('--requests', type=int, default=500, help="requests per target and scenario")
+    arg_parser.add_argument('--clients', type=int, default=8, help="concurrent clients against the server")
+    arg_parser.add_argument('--targets', nargs='+', choices=['test_client', 'server'], default=['test_client', 'server'])
+    arg_parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    arg_parser.add_argument('--output', help="write the results to this JSON file")
+    arg_parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = arg_parser.parse_args()
+
+    now = datetime.now(PST)
+    payloads = create_payloads(args.requests, now)
+    results = []
+    print(f"{args.rows} reservations, {args.requests} requests per scenario, {args.clients} server clients")
+    print(f"{'target':>12} {'scenario':>10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'RSS MiB':>8} {'errors':>7}")
+    for target in args.targets:
+        for scenario in args.scenarios:
+            # A fresh database per run, so creates do not pile up across scenarios
+            with tempfile.TemporaryDirectory() as tmp:
+                database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+                seed(database_url, args.rows, now)
+                if target == 'test_client':
+                    measured = run_test_client(database_url, scenario, args.requests, payloads)
+                else:
+                    measured = run_server(database_url, scenario, args.requests, payloads, args.clients)
+            result = summarize(target, scenario, *measured)
+            results.append(result)
+            print(f"{target:>12} {scenario:>10} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['rss_mib']:>8.1f} {result['errors']:>7}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'rows': args.rows, 'requests': args.requests, 'clients': args.clients,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
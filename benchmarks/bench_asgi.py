@@ -0,0 +1,141 @@
+"""Load-test GET /reservations under WSGI and ASGI serving.
+
+Seeds a temporary SQLite database with upcoming reservations, starts the
+app once as it is served today (Flask's threaded Werkzeug server, one
+thread per connection) and once through ``asgi.application`` on uvicorn
+(one event loop, async database sessions), then drives each with the same
+number of concurrent clients and reports requests/sec and latency
+percentiles. Both servers run as a single process.
+
+Usage::
+
+    python benchmarks/bench_asgi.py --concurrency 10 100 1000 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'wsgi': [sys.executable, '-c',
+             "import sys; from app import create_app; create_app().run(port=int(sys.argv[1]), threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--log-level', 'warning',
+             '--no-access-log', '--backlog', '4096', '--port'],
+}
+
+
+def seed(database_url, rows):
+    """Create the schema and ``rows`` reservations spread over the next 30 days."""
+    sys.path.insert(0, ROOT)
+    from app import PST, create_app
+    from models import Reservation, db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+
+    start = (datetime.now(PST) + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(Reservation(username=f'user{i % 97}', resource_id=f'server-{i % 8}',
+                                       start_time=start + timedelta(hours=i // 8),
+                                       end_time=start + timedelta(hours=i // 8, minutes=45))
+                           for i in range(rows))
+        db.session.commit()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, env):
+    port = free_port()
+    proc = subprocess.Popen(SERVERS[kind] + [str(port)], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def fetch(port, path):
+    """One GET on a fresh connection; returns the status code."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, path, concurrency, duration):
+    latencies = []
+    errors = 0
+
+    async def client(deadline):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                status = await fetch(port, path)
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append((time.perf_counter() - t0) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(deadline) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] if latencies else float('nan')
+    p50 = statistics.median(latencies) if latencies else float('nan')
+    return len(latencies) / elapsed, p50, p99, errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=2000)
+    arg_parser.add_argument('--path', default='/reservations?resource=server-1&limit=50')
+    arg_parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+    arg_parser.add_argument('--duration', type=float, default=10)
+    arg_parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(database_url, args.rows)
+        env = dict(os.environ, DATABASE_URL=database_url)
+
+        print(f"GET {args.path}  ({args.rows} reservations)")
+        print(f"{'server':>6} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for kind in args.servers:
+            proc, port = start_server(kind, env)
+            try:
+                for concurrency in args.concurrency:
+                    rps, p50, p99, errors = asyncio.run(load(port, args.path, concurrency, args.duration))
+                    print(f"{kind:>6} {concurrency:>8} {rps:>9.0f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Measure compressed GET /reservations listings: bytes sent and latency.
+
+Seeds a temporary SQLite database with N upcoming reservations, then
+requests the full listing through the Flask test client with each
+Accept-Encoding the app can serve. For each it reports the body size and
+the median latency of:
+
+* a cold request (response cache emptied first): query, serialize, compress
+* a repeated poll, answered from the cache of encoded bodies
+
+Usage::
+
+    python benchmarks/bench_compression.py --rows 1000 10000 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, get_response_cache  # noqa: E402
+from models import Reservation, db  # noqa: E402
+
+SEED_BATCH = 50000
+
+
+def seed(rows, now):
+    """``rows`` one-hour reservations on 10 resources, all upcoming."""
+    first_start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    for offset in range(0, rows, SEED_BATCH):
+        db.session.execute(insert(Reservation), [
+            {'username': f'user{i % 100}', 'resource_id': f'server-{i % 10}', 'version': 0,
+             'start_time': first_start + timedelta(hours=i // 10),
+             'end_time': first_start + timedelta(hours=i // 10, minutes=50)}
+            for i in range(offset, min(offset + SEED_BATCH, rows))
+        ])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'encoding':>9} {'KiB':>9} {'cold ms':>9} {'cached ms':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+            with app.app_context():
+                db.create_all()
+                seed(rows, datetime.now())
+            client = app.test_client()
+            for encoding in ('identity', *app.extensions['compressor'].encodings):
+                headers = {'Accept-Encoding': encoding}
+                size = len(client.get('/reservations', headers=headers).data)
+
+                def cold():
+                    with app.app_context():
+                        get_response_cache().invalidate()
+                    client.get('/reservations', headers=headers)
+                cold_ms = timed(cold, args.repeat)
+                client.get('/reservations', headers=headers)
+                cached_ms = timed(lambda: client.get('/reservations', headers=headers), args.repeat)
+                print(f"{rows:>8} {encoding:>9} {size / 1024:>9.1f} {cold_ms:>9.1f} {cached_ms:>10.2f}")
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
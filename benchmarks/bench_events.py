@@ -0,0 +1,150 @@
+"""Fan-out benchmark of GET /reservations/stream.
+
+Starts ``asgi.application`` on uvicorn against a temporary SQLite database,
+opens the given number of idle SSE subscribers, then creates reservations
+one at a time and measures how long it takes every subscriber to receive
+each ``created`` event. Also reports the server's resident memory per
+subscriber.
+
+Usage::
+
+    python benchmarks/bench_events.py --subscribers 100 1000 5000 --events 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--log-level', 'warning',
+          '--no-access-log', '--backlog', '8192', '--port']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_kib(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def start_server(database_url):
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    with app.app_context():
+        db.create_all()
+    port = free_port()
+    proc = subprocess.Popen(SERVER + [str(port)], cwd=ROOT, env=dict(os.environ, DATABASE_URL=database_url),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def subscribe(port, received, ready):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"GET /reservations/stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    await reader.readuntil(b'\r\n\r\n')
+    ready()
+    try:
+        async for line in reader:
+            if line.startswith(b'event: created'):
+                received.append(time.perf_counter())
+    finally:
+        writer.close()
+
+
+async def post(port, payload):
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"POST /reservations HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                 b"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+    await writer.drain()
+    status = int((await reader.read()).split(b' ', 2)[1])
+    writer.close()
+    return status
+
+
+async def run(port, subscribers, events, pid):
+    received = []
+    opened = 0
+
+    def ready():
+        nonlocal opened
+        opened += 1
+
+    rss_before = rss_kib(pid)
+    tasks = [asyncio.ensure_future(subscribe(port, received, ready)) for _ in range(subscribers)]
+    while opened < subscribers:
+        await asyncio.sleep(0.05)
+    rss_per_subscriber = (rss_kib(pid) - rss_before) / subscribers
+
+    start = datetime.now() + timedelta(days=1)
+    latencies = []
+    for i in range(events):
+        slot = start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=30 * i)
+        received.clear()
+        t0 = time.perf_counter()
+        status = await post(port, {'username': 'bench', 'resource_id': f'bench-{subscribers}',
+                                   'start_time': slot.strftime('%Y-%m-%d %H:%M'),
+                                   'end_time': (slot + timedelta(minutes=15)).strftime('%Y-%m-%d %H:%M')})
+        if status != 201:
+            raise RuntimeError(f"POST failed with {status}")
+        while len(received) < subscribers:
+            await asyncio.sleep(0.001)
+        latencies.append((max(received) - t0) * 1000)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return statistics.median(latencies), max(latencies), rss_per_subscriber
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--subscribers', type=int, nargs='+', default=[100, 1000, 5000])
+    arg_parser.add_argument('--events', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    # Every subscriber is a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, port = start_server(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        try:
+            print(f"{'subscribers':>11} {'all received p50 ms':>20} {'max ms':>8} {'KiB/subscriber':>15}")
+            for subscribers in args.subscribers:
+                p50, worst, rss = asyncio.run(run(port, subscribers, args.events, proc.pid))
+                print(f"{subscribers:>11} {p50:>20.1f} {worst:>8.1f} {rss:>15.1f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
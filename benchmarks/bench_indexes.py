@@ -0,0 +1,120 @@
+"""Benchmark the reservation queries with and without the table indexes.
+
+Seeds a temporary SQLite database with N historical one-hour reservations
+(plus the next 30 days of bookings) and times the statements behind
+``POST /reservations`` (the overlap check) and ``GET /reservations`` (the
+``end_time > now`` listing):
+
+* before: no indexes, overlap check loads every colliding row with ``.all()``
+* after:  ``ix_reservation_start_end`` / ``ix_reservation_end_time``, an
+  EXISTS probe, and the listing's ``start_time`` seek bound
+
+Usage::
+
+    python benchmarks/bench_indexes.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, exists, insert, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import Reservation  # noqa: E402
+
+MAX_RESERVATION_DURATION = Config.MAX_RESERVATION_DURATION
+
+FUTURE_ROWS = 30 * 12  # one booking every two hours for the next 30 days
+SEED_BATCH = 50000
+
+
+def seed(engine, rows, now):
+    table = Reservation.__table__
+    first_start = now - timedelta(hours=2 * (rows - FUTURE_ROWS))
+    with engine.begin() as conn:
+        for offset in range(0, rows, SEED_BATCH):
+            batch = []
+            for i in range(offset, min(offset + SEED_BATCH, rows)):
+                start = first_start + timedelta(hours=2 * i)
+                batch.append({'username': f'user{i % 97}', 'start_time': start,
+                              'end_time': start + timedelta(hours=1)})
+            conn.execute(insert(table), batch)
+
+
+def time_calls(fn, args_list):
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(rows, repeat, mode):
+    table = Reservation.__table__
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        table.create(engine)
+        if mode == 'before':
+            for index in table.indexes:
+                index.drop(engine)
+        seed(engine, rows, now)
+
+        # Half the probes collide with a booked hour, half hit a free one.
+        rng = random.Random(rows)
+        probes = []
+        for _ in range(repeat):
+            start = now + timedelta(hours=rng.randrange(1, 2 * FUTURE_ROWS))
+            probes.append((start, start + timedelta(minutes=30)))
+
+        with engine.connect() as conn:
+            if mode == 'before':
+                def post(start, end):
+                    return bool(conn.execute(select(table).where(
+                        (table.c.start_time < end) & (table.c.end_time > start))).all())
+            else:
+                def post(start, end):
+                    return conn.execute(select(exists().where(
+                        (table.c.start_time < end) & (table.c.end_time > start)))).scalar()
+
+            if mode == 'before':
+                def get():
+                    return conn.execute(select(table).where(table.c.end_time > now)
+                                        .order_by(table.c.start_time)).all()
+            else:
+                def get():
+                    return conn.execute(select(table).where(
+                        table.c.end_time > now,
+                        table.c.start_time > now - MAX_RESERVATION_DURATION)
+                        .order_by(table.c.start_time)).all()
+
+            post_stats = time_calls(post, probes)
+            get_stats = time_calls(get, [()] * repeat)
+        engine.dispose()
+    return post_stats, get_stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    arg_parser.add_argument('--repeat', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>9} {'mode':>7} {'POST p50':>10} {'POST p95':>10} {'GET p50':>10} {'GET p95':>10}  (ms)")
+    for rows in args.rows:
+        for mode in ('before', 'after'):
+            (post_p50, post_p95), (get_p50, get_p95) = run(rows, args.repeat, mode)
+            print(f"{rows:>9} {mode:>7} {post_p50:>10.3f} {post_p95:>10.3f} {get_p50:>10.3f} {get_p95:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
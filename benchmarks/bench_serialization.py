@@ -0,0 +1,125 @@
+"""Compare listing serialization: ORM objects against Core row tuples.
+
+Seeds a temporary SQLite database with N upcoming reservations through the
+app's models, then builds the full GET /reservations body three ways:
+
+* ``orm``: Reservation objects, ``to_dict()`` and the app's JSON provider
+  (what the route did before CORE_LISTING_ROUTES)
+* ``core+json``: RESERVATION_COLUMNS tuples and serialization.JSONEncoder
+* ``core+orjson``: the same tuples and serialization.OrjsonEncoder
+* ``columnar``: the ``?format=columnar`` body (app.ColumnarListing) with
+  the default encoder
+
+For each it reports the median wall time, CPU time per row and the peak
+memory tracemalloc sees while building one body, then the body size and
+the time a client takes to parse it with ``json.loads``. It checks that
+the row bodies decode to the same JSON and that the columnar one holds
+the same ids.
+
+Usage::
+
+    python benchmarks/bench_serialization.py --rows 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ColumnarListing, RowListing, create_app, listing_format  # noqa: E402
+from models import Reservation, db  # noqa: E402
+from serialization import create_encoder, orjson  # noqa: E402
+
+SEED_BATCH = 50000
+
+
+def seed(rows, now):
+    """``rows`` one-hour reservations on 10 resources, all upcoming."""
+    first_start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    for offset in range(0, rows, SEED_BATCH):
+        db.session.execute(insert(Reservation), [
+            {'username': f'user{i % 100}', 'resource_id': f'server-{i % 10}', 'version': 0,
+             'start_time': first_start + timedelta(hours=i // 10),
+             'end_time': first_start + timedelta(hours=i // 10, minutes=50)}
+            for i in range(offset, min(offset + SEED_BATCH, rows))
+        ])
+    db.session.commit()
+
+
+def build_body(listing_fmt, statement):
+    rows = listing_fmt.rows(db.session.execute(listing_fmt.statement(statement))).all()
+    body = listing_fmt.array(rows)
+    # Drop the loaded objects, as the end of a request would
+    db.session.expunge_all()
+    return body
+
+
+def measure(listing_fmt, statement, repeat):
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        body = build_body(listing_fmt, statement)
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    tracemalloc.start()
+    build_body(listing_fmt, statement)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return body, statistics.median(walls), statistics.median(cpus), peak
+
+
+def timed_parse(body):
+    t0 = time.perf_counter()
+    json.loads(body)
+    return time.perf_counter() - t0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'path':>12} {'wall ms':>9} {'cpu us/row':>11} {'peak MiB':>9} {'KiB':>9} {'parse ms':>9}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+            with app.app_context():
+                db.create_all()
+                seed(rows, datetime.now())
+                statement = db.select(Reservation).order_by(Reservation.start_time, Reservation.id)
+                with app.test_request_context():
+                    app.config['CORE_LISTING_ROUTES'] = ()
+                    paths = [('orm', listing_format('get_reservations')), ('core+json', RowListing(create_encoder('json')))]
+                    if orjson is not None:
+                        paths.append(('core+orjson', RowListing(create_encoder('orjson'))))
+                    paths.append(('columnar', ColumnarListing(app.extensions['json_encoder'])))
+                    expected = None
+                    for name, listing_fmt in paths:
+                        body, wall, cpu, peak = measure(listing_fmt, statement, args.repeat)
+                        parse_ms = min(timed_parse(body) for _ in range(args.repeat)) * 1000
+                        decoded = json.loads(body)
+                        if expected is None:
+                            expected = decoded
+                        elif isinstance(listing_fmt, ColumnarListing):
+                            if decoded['id'] != [r['id'] for r in expected]:
+                                raise SystemExit(f"{name} body lists other reservations than the orm body")
+                        elif decoded != expected:
+                            raise SystemExit(f"{name} body differs from the orm body")
+                        print(f"{rows:>8} {name:>12} {wall * 1000:>9.1f} {cpu / rows * 1e6:>11.2f} "
+                              f"{peak / 2 ** 20:>9.1f} {len(body) / 1024:>9.1f} {parse_ms:>9.2f}")
+                db.session.remove()
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Concurrent read/write benchmark of the storage profiles.
+
+For each profile in storage.py, seeds a temporary SQLite database and runs
+reader and writer processes against it for a fixed time. Readers run the
+first page of the GET /reservations listing query. Writers run the
+POST /reservations transaction: BEGIN IMMEDIATE, the EXISTS overlap probe
+and an insert. The script reports throughput and p99 latency of both, plus
+operations that failed with "database is locked".
+
+Usage::
+
+    python benchmarks/bench_storage.py --readers 8 --writers 2 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, exists, insert, select, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import Reservation  # noqa: E402
+from storage import PROFILES, apply_pragmas, engine_options  # noqa: E402
+
+MAX_RESERVATION_DURATION = Config.MAX_RESERVATION_DURATION
+
+PAGE_SIZE = 100
+
+
+def make_engine(url, profile):
+    engine = create_engine(url, **engine_options(profile, url))
+    apply_pragmas(engine, profile)
+    return engine
+
+
+def seed(url, profile, rows, now):
+    table = Reservation.__table__
+    engine = make_engine(url, profile)
+    table.create(engine)
+    first_start = now - timedelta(hours=rows // 2)
+    with engine.begin() as conn:
+        conn.execute(insert(table), [
+            {'username': f'user{i % 97}', 'resource_id': f'server-{i % 8}',
+             'start_time': first_start + timedelta(minutes=30 * i),
+             'end_time': first_start + timedelta(minutes=30 * i + 15)}
+            for i in range(rows)
+        ])
+    engine.dispose()
+
+
+def reader(url, profile, now, deadline, results):
+    table = Reservation.__table__
+    engine = make_engine(url, profile)
+    query = select(table).where(
+        table.c.end_time > now, table.c.start_time > now - MAX_RESERVATION_DURATION,
+    ).order_by(table.c.start_time, table.c.id).limit(PAGE_SIZE + 1)
+    latencies, locked = [], 0
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(query).all()
+        except OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    results.put(('read', latencies, locked))
+
+
+def writer(url, profile, now, deadline, seed_value, results):
+    table = Reservation.__table__
+    engine = make_engine(url, profile)
+    rng = random.Random(seed_value)
+    latencies, locked = [], 0
+    while time.perf_counter() < deadline:
+        start = now + timedelta(minutes=rng.randrange(60, 60 * 24 * 30))
+        end = start + timedelta(minutes=15)
+        resource_id = f'server-{rng.randrange(8)}'
+        t0 = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+                taken = conn.execute(select(exists().where(
+                    table.c.resource_id == resource_id,
+                    (table.c.start_time < end) & (table.c.end_time > start)))).scalar()
+                if not taken:
+                    conn.execute(insert(table).values(username='bench', resource_id=resource_id,
+                                                      start_time=start, end_time=end))
+                conn.execute(text('COMMIT'))
+        except OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    results.put(('write', latencies, locked))
+
+
+def p99_ms(latencies):
+    if not latencies:
+        return float('nan')
+    latencies.sort()
+    return latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+
+
+def run(profile, args):
+    now = datetime.now().replace(second=0, microsecond=0)
+    ctx = multiprocessing.get_context('fork')
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        seed(url, profile, args.rows, now)
+        results = ctx.Queue()
+        deadline = time.perf_counter() + args.duration
+        procs = [ctx.Process(target=reader, args=(url, profile, now, deadline, results))
+                 for _ in range(args.readers)]
+        procs += [ctx.Process(target=writer, args=(url, profile, now, deadline, i, results))
+                  for i in range(args.writers)]
+        for proc in procs:
+            proc.start()
+        stats = {'read': ([], 0), 'write': ([], 0)}
+        for _ in procs:
+            kind, latencies, locked = results.get()
+            stats[kind] = (stats[kind][0] + latencies, stats[kind][1] + locked)
+        for proc in procs:
+            proc.join()
+    return stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=50000)
+    arg_parser.add_argument('--readers', type=int, default=8)
+    arg_parser.add_argument('--writers', type=int, default=2)
+    arg_parser.add_argument('--duration', type=float, default=10)
+    arg_parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['default', 'production'])
+    args = arg_parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.rows} rows, {args.duration:g} s")
+    print(f"{'profile':>10} {'reads/s':>9} {'read p99':>9} {'writes/s':>9} {'write p99':>10} {'locked':>7}  (ms)")
+    for profile in args.profiles:
+        stats = run(profile, args)
+        (reads, read_locked), (writes, write_locked) = stats['read'], stats['write']
+        print(f"{profile:>10} {len(reads) / args.duration:>9.0f} {p99_ms(reads):>9.2f} "
+              f"{len(writes) / args.duration:>9.0f} {p99_ms(writes):>10.2f} {read_locked + write_locked:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark of timestamp parsing and formatting on the request path.
+
+Times, per call, the old ``PST.localize(parser.isoparse(s))`` against
+``timeparse.parse_local(s)``. It also times each half on its own, both on
+an ordinary day and on a DST transition day (the slow path). Last come the
+formatting candidates for ``Reservation.to_dict``.
+
+Usage::
+
+    python benchmarks/bench_timeparse.py --number 200000
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytz  # noqa: E402
+from dateutil import parser  # noqa: E402
+
+from timeparse import localize, parse_local  # noqa: E402
+
+PST = pytz.timezone('America/Los_Angeles')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--number', type=int, default=200000, help="calls per measurement")
+    args = arg_parser.parse_args()
+
+    value = '2030-06-12 14:30'
+    naive = datetime(2030, 6, 12, 14, 30)
+    transition = datetime(2030, 11, 3, 1, 30)
+    cases = [
+        ('parse + localize (isoparse, pytz)', lambda: PST.localize(parser.isoparse(value))),
+        ('parse + localize (parse_local)', lambda: parse_local(value)),
+        ('parse only (isoparse)', lambda: parser.isoparse(value)),
+        ('parse only (fromisoformat)', lambda: datetime.fromisoformat(value)),
+        ('localize (pytz)', lambda: PST.localize(naive)),
+        ('localize (timeparse)', lambda: localize(naive)),
+        ('localize on DST end day (pytz)', lambda: PST.localize(transition)),
+        ('localize on DST end day (timeparse)', lambda: localize(transition)),
+        ('format (isoformat)', lambda: naive.isoformat()),
+        ('format (strftime)', lambda: naive.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('format (f-string)', lambda: f"{naive:%Y-%m-%dT%H:%M:%S}"),
+    ]
+    print(f"{'case':>38} {'ns/call':>9}")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f"{name:>38} {best / args.number * 1e9:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
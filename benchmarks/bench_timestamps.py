@@ -0,0 +1,115 @@
+"""Compare timestamp storage: DATETIME text against integer epoch seconds.
+
+Seeds two temporary SQLite databases with the same N one-hour reservations
+and the same ``reservation`` indexes. In one, start_time and end_time are
+DateTime (the text format older releases stored). In the other they are
+models.EpochSeconds. For each it reports the database size and times:
+
+* the overlap probe behind POST /reservations
+* the ``end_time > now`` listing behind GET /reservations, rows fetched
+  and converted to datetimes
+
+Usage::
+
+    python benchmarks/bench_timestamps.py --rows 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import (BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, create_engine, exists,
+                        insert, select)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import EpochSeconds  # noqa: E402
+
+MAX_RESERVATION_DURATION = Config.MAX_RESERVATION_DURATION
+SEED_BATCH = 50000
+
+
+def reservation_table(time_type):
+    table = Table('reservation', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('username', String(80), nullable=False),
+                  Column('resource_id', String(64), nullable=False),
+                  Column('start_time', time_type, nullable=False),
+                  Column('end_time', time_type, nullable=False),
+                  Column('version', BigInteger, nullable=False))
+    Index('ix_reservation_resource_start_end', table.c.resource_id, table.c.start_time, table.c.end_time)
+    Index('ix_reservation_start_end', table.c.start_time, table.c.end_time)
+    Index('ix_reservation_end_time', table.c.end_time)
+    return table
+
+
+def seed(engine, table, rows, now):
+    """``rows`` one-hour reservations on 10 resources, the last 3600 of them upcoming."""
+    table.metadata.create_all(engine)
+    first_start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=rows // 10 - 360)
+    with engine.begin() as conn:
+        for offset in range(0, rows, SEED_BATCH):
+            conn.execute(insert(table), [
+                {'username': f'user{i % 100}', 'resource_id': f'server-{i % 10}', 'version': 0,
+                 'start_time': first_start + timedelta(hours=i // 10),
+                 'end_time': first_start + timedelta(hours=i // 10, minutes=50)}
+                for i in range(offset, min(offset + SEED_BATCH, rows))
+            ])
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def run(time_type, rows, now, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        engine = create_engine(f'sqlite:///{path}')
+        table = reservation_table(time_type)
+        seed(engine, table, rows, now)
+        with engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM')
+        size = os.path.getsize(path) / 2 ** 20
+        probes = [now + timedelta(hours=random.randrange(-rows // 10, 360), minutes=15) for _ in range(repeat)]
+        listing = select(table).where(table.c.end_time > now,
+                                      table.c.start_time > now - MAX_RESERVATION_DURATION) \
+            .order_by(table.c.start_time, table.c.id)
+        with engine.connect() as conn:
+            def probe():
+                for start in probes:
+                    conn.execute(select(exists().where(
+                        table.c.resource_id == 'server-3',
+                        table.c.start_time < start + timedelta(minutes=30),
+                        table.c.end_time > start))).scalar()
+            overlap_ms = timed(probe, 5) / len(probes)
+            list_ms = timed(lambda: conn.execute(listing).all(), repeat)
+        engine.dispose()
+    return size, overlap_ms, list_ms
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    now = datetime.now().replace(microsecond=0)
+    print(f"{'rows':>9} {'storage':>8} {'db MiB':>8} {'overlap ms':>11} {'listing ms':>11}")
+    for rows in args.rows:
+        for name, time_type in (('text', DateTime), ('epoch', EpochSeconds)):
+            size, overlap_ms, list_ms = run(time_type, rows, now, args.repeat)
+            print(f"{rows:>9} {name:>8} {size:>8.1f} {overlap_ms:>11.3f} {list_ms:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
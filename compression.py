@@ -0,0 +1,68 @@
+"""Content-Encoding negotiation and compression of listing responses.
+
+Listing bodies repeat the same keys and timestamp prefixes on every row, so
+they compress well. ``Compressor`` picks the best encoding the client
+accepts from the configured ones and compresses with it. gzip comes from
+the standard library. Brotli (``br``) needs the optional ``brotli``
+package. gzip output is written with a fixed mtime, so the same body always
+compresses to the same bytes, in every worker, and can be cached.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # Only needed for the 'br' encoding
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+CODECS = {
+    'br': lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+    'gzip': lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+}
+
+
+class Compressor:
+    """Negotiates and applies one of ``encodings``, listed in order of
+    preference, for bodies of at least ``min_size`` bytes."""
+
+    def __init__(self, encodings, min_size=1024):
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+
+    def negotiate(self, accept_encodings):
+        """The encoding to use for a parsed Accept-Encoding header (a werkzeug
+        ``Accept``), or None for the body as is.
+
+        The client's highest q-value wins. Ties go to the earlier entry of
+        ``encodings``, and q=0 rules an encoding out.
+        """
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, body, encoding):
+        """``(body, encoding)`` after compressing ``body`` with ``encoding``.
+        Bodies below ``min_size`` and a None encoding come back unchanged,
+        with None."""
+        if encoding is None or len(body) < self.min_size:
+            return body, None
+        return CODECS[encoding](body), encoding
+
+
+def create_compressor(encodings, min_size=1024):
+    """Compressor for a RESPONSE_ENCODINGS setting: a sequence of 'br' and
+    'gzip' in order of preference, an empty one to turn compression off, or
+    None for br (when installed) then gzip."""
+    if encodings is None:
+        encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    for encoding in encodings:
+        if encoding not in CODECS:
+            raise ValueError(f"Unknown RESPONSE_ENCODINGS entry {encoding!r}; use 'br' or 'gzip'")
+        if encoding == 'br' and brotli is None:
+            raise RuntimeError("RESPONSE_ENCODINGS includes 'br' but the 'brotli' package is not installed")
+    return Compressor(encodings, min_size)
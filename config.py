@@ -0,0 +1,106 @@
+"""Configuration defaults and loading for the reservation service.
+
+Settings are layered, later sources winning:
+
+1. the defaults in ``Config``;
+2. a Python settings file named by the ``RESERVATIONS_SETTINGS`` environment
+   variable (the usual Flask ``from_envvar`` format: ``UPPER_CASE = value``);
+3. environment variables prefixed ``RESERVATIONS_``, e.g.
+   ``RESERVATIONS_MAX_PAGE_SIZE=500``; values are parsed as JSON where
+   possible, so numbers and ``null`` work as expected;
+4. the mapping passed to ``create_app()``, which tests use.
+
+``DATABASE_URL`` and ``STORAGE_PROFILE`` are also honoured unprefixed, as
+most hosting platforms set them that way.
+"""
+import os
+from datetime import timedelta
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///reservations.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite pragmas and pool sizing (storage.py): 'default' or 'production'
+    STORAGE_PROFILE = 'default'
+    # Extra create_engine() arguments, applied on top of the storage profile
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    # Booking rules. Numbers from a settings file or the environment are
+    # minutes for the two durations and days for the booking limit (and for
+    # ARCHIVE_AFTER below).
+    # Reservations already stored must not be longer than
+    # MAX_RESERVATION_DURATION: the listing query relies on it.
+    MAX_RESERVATION_DURATION = timedelta(hours=4)
+    MIN_RESERVATION_DURATION = timedelta(minutes=15)
+    ADVANCE_BOOKING_LIMIT = timedelta(days=30)
+
+    # How create_reservation detects overlaps: 'index' uses the resource's
+    # in-memory ReservationIndex, 'bitmap' consults its per-slot SlotOccupancy map
+    # first and the index only for partially booked slots, 'query' asks the database.
+    CONFLICT_CHECK = 'index'
+    # Largest number of entries accepted by POST /reservations/batch
+    MAX_BATCH_SIZE = 1000
+    # Most occurrences a recurring reservation may have
+    MAX_RECURRENCE_OCCURRENCES = 366
+    # Rows fetched per round trip when streaming GET /reservations as NDJSON
+    STREAM_YIELD_PER = 500
+    # Page sizes for GET /reservations?limit=...&after=...
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    # Listing routes that select plain row tuples and encode them directly
+    # (serialization.py) instead of loading Reservation objects for to_dict(),
+    # and the encoder: 'orjson', 'json', or None for orjson when installed.
+    CORE_LISTING_ROUTES = ('get_reservations', 'get_history')
+    JSON_ENCODER = None
+    # Content encodings offered for listings, in order of preference
+    # ('br' needs the brotli package); None for br when installed, then
+    # gzip; () to turn compression off. Smaller bodies are sent as they are.
+    RESPONSE_ENCODINGS = None
+    RESPONSE_COMPRESSION_MIN_SIZE = 1024
+    # Cache for serialized all/day/week listings and their compressed copies: 'memory://' (per-process LRU),
+    # 'redis://host:port/db' (shared by all workers) or None to disable.
+    RESPONSE_CACHE_URL = 'memory://'
+    RESPONSE_CACHE_SIZE = 256
+    RESPONSE_CACHE_MAX_TTL = 300
+    # Archival of finished reservations to archived_reservation: rows that
+    # ended ARCHIVE_AFTER ago are moved ARCHIVE_BATCH_SIZE at a time, every
+    # ARCHIVE_INTERVAL seconds by `python app.py` and asgi.py (None: only by
+    # `flask --app app archive`).
+    ARCHIVE_AFTER = timedelta(days=1)
+    ARCHIVE_BATCH_SIZE = 1000
+    ARCHIVE_INTERVAL = 3600
+    # GET /reservations/stream: change events kept for clients resuming with
+    # Last-Event-ID, and seconds between keepalive comments on idle streams
+    EVENT_HISTORY_SIZE = 1000
+    EVENT_KEEPALIVE = 15
+    # Request and stage timings and booking counters, served at GET /metrics
+    # in the Prometheus text format. Off: no recording and /metrics is a 404.
+    METRICS_ENABLED = False
+
+
+# Config keys holding durations, and the unit of plain numbers given for them
+DURATION_UNITS = {
+    'MAX_RESERVATION_DURATION': 'minutes',
+    'MIN_RESERVATION_DURATION': 'minutes',
+    'ADVANCE_BOOKING_LIMIT': 'days',
+    'ARCHIVE_AFTER': 'days',
+}
+
+
+def load_config(app, overrides=None):
+    """Fill ``app.config`` from the layered sources described above."""
+    app.config.from_object(Config)
+    app.config.from_envvar('RESERVATIONS_SETTINGS', silent=True)
+    for key in ('DATABASE_URL', 'STORAGE_PROFILE'):
+        if key in os.environ:
+            app.config['SQLALCHEMY_DATABASE_URI' if key == 'DATABASE_URL' else key] = os.environ[key]
+    app.config.from_prefixed_env('RESERVATIONS')
+    if overrides:
+        app.config.update(overrides)
+
+    for key, unit in DURATION_UNITS.items():
+        value = app.config[key]
+        if isinstance(value, (int, float)):
+            app.config[key] = timedelta(**{unit: value})
+        elif not isinstance(value, timedelta):
+            raise ValueError(f"{key} must be a timedelta or a number of {unit}")
@@ -0,0 +1,117 @@
+"""In-process publish/subscribe of reservation changes, served as Server-Sent Events.
+
+Every published event is rendered into its SSE frame once and appended to a
+bounded history. A subscriber is only a cursor into that history plus an
+optional resource filter. Publishing never loops over subscribers. Threads
+(the WSGI route) wait on one shared Condition. Coroutines (the ASGI route)
+wait on one asyncio.Event per event loop, which the publisher sets with a
+single ``call_soon_threadsafe``. An idle subscriber therefore costs a cursor
+and a parked waiter, and a thousand of them cost the publisher the same as
+one.
+
+Event ids are ``<stream id>:<sequence>``. The stream id is random per
+broker, so a client resuming with ``Last-Event-ID`` after a restart, or
+after falling out of the history, gets a ``reset`` event telling it to
+reload the listing instead of silently missing changes.
+"""
+import asyncio
+import threading
+import uuid
+from collections import deque, namedtuple
+
+Event = namedtuple('Event', 'seq resource_id frame')
+
+# Sent on idle connections so proxies do not time them out
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+
+class EventBroker:
+    """Bounded history of SSE frames with thread and asyncio wake-ups."""
+
+    def __init__(self, history_size=1000):
+        self.stream_id = uuid.uuid4().hex[:12]
+        self._events = deque(maxlen=history_size)
+        self._last_seq = 0
+        self._changed = threading.Condition()
+        self._loop_waiters = {}
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def publish(self, name, items):
+        """Publish one ``name`` event per (resource_id, json_data) item and
+        wake every waiting subscriber once."""
+        with self._changed:
+            for resource_id, data in items:
+                self._last_seq += 1
+                frame = f"id: {self.stream_id}:{self._last_seq}\nevent: {name}\ndata: {data}\n\n"
+                self._events.append(Event(self._last_seq, resource_id, frame.encode()))
+            self._changed.notify_all()
+            waiters, self._loop_waiters = self._loop_waiters, {}
+        for loop, event in waiters.items():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The loop has closed; its subscribers are gone
+
+    def since(self, seq):
+        """Events published after ``seq``, oldest first, or None if some of
+        them have already left the history."""
+        with self._changed:
+            first = self._last_seq - len(self._events) + 1
+            if not first - 1 <= seq <= self._last_seq:
+                return None
+            # Negative indexes walk in from the newest end of the deque
+            return [self._events[i] for i in range(seq - self._last_seq, 0)]
+
+    def wait(self, seq, timeout):
+        """Block until an event after ``seq`` is published; False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._last_seq > seq, timeout)
+
+    async def wait_async(self, seq, timeout):
+        """Coroutine version of ``wait`` for subscribers on an event loop."""
+        loop = asyncio.get_running_loop()
+        with self._changed:
+            if self._last_seq > seq:
+                return True
+            event = self._loop_waiters.get(loop)
+            if event is None:
+                event = self._loop_waiters[loop] = asyncio.Event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class Subscription:
+    """One client's position in a broker's event stream.
+
+    Starts at the newest event, or after ``last_event_id`` when the client
+    is resuming. ``resource_ids`` (a collection, or None for all) filters
+    the events delivered.
+    """
+
+    def __init__(self, broker, resource_ids=None, last_event_id=None):
+        self.broker = broker
+        self.resource_ids = set(resource_ids) if resource_ids is not None else None
+        self.cursor = broker.last_seq
+        if last_event_id:
+            stream_id, _, seq = last_event_id.partition(':')
+            # An id from another broker cannot be resumed; -1 forces a reset
+            self.cursor = int(seq) if stream_id == broker.stream_id and seq.isdigit() else -1
+
+    def pending(self):
+        """SSE bytes for the events published since the last call, or b''."""
+        events = self.broker.since(self.cursor)
+        if events is None:
+            # Missed events: tell the client to reload, then carry on from now
+            self.cursor = self.broker.last_seq
+            return f"id: {self.broker.stream_id}:{self.cursor}\nevent: reset\ndata: {{}}\n\n".encode()
+        if not events:
+            return b''
+        self.cursor = events[-1].seq
+        return b''.join(e.frame for e in events
+                        if self.resource_ids is None or e.resource_id in self.resource_ids)
@@ -0,0 +1,155 @@
+"""Per-process counters and stage timers, served in the Prometheus text format.
+
+Request handlers record into the app's ``Metrics``. With METRICS_ENABLED
+off the app holds ``NULL_METRICS`` instead, whose methods do nothing, so
+instrumented code costs one no-op call per measurement point and has no
+branches of its own.
+
+Timings are histograms with fixed buckets. Each observation is one bisect
+and two additions under a lock, and scraping renders a snapshot. Values
+are per process: with several workers, Prometheus scrapes each worker, or
+the workers' series are summed by the query.
+"""
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of the timing histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0)
+
+# Type and help text of every metric the app records
+METRICS = {
+    'http_request_duration_seconds': ('histogram', "Time spent handling a request, by endpoint, method and status"),
+    'reservation_stage_duration_seconds': ('histogram', "Time spent in each stage of a request handler"),
+    'reservation_conflicts_total': ('counter', "Writes refused because the slot overlaps a stored reservation"),
+    'reservation_rejections_total': ('counter', "Reservation payloads refused by a booking rule"),
+    'reservation_rows_returned_total': ('counter', "Reservations listed from the database, by view"),
+    'reservation_listing_cache_total': ('counter', "Listing response cache lookups (all/day/week views and compressed copies), by result"),
+}
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class StageTimer:
+    """Times consecutive stages of one request.
+
+    Each ``mark(stage)`` records the time since the previous mark (or since
+    the timer was created) under that stage name.
+    """
+
+    __slots__ = ('_metrics', '_labels', '_last')
+
+    def __init__(self, metrics, labels):
+        self._metrics = metrics
+        self._labels = labels
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self._metrics.observe('reservation_stage_duration_seconds', now - self._last, stage=stage, **self._labels)
+        self._last = now
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by metric name and labels."""
+
+    enabled = True
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        # Per series: a count per bucket plus +Inf, then the sum of observations
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        """Add ``amount`` to counter ``name``."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one ``value`` (seconds) in histogram ``name``."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def timer(self, **labels):
+        """A StageTimer recording under ``labels``, starting now."""
+        return StageTimer(self, labels)
+
+    def render(self):
+        """Every recorded series in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(series)) for key, series in self._histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRICS.get(name, ('untyped', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), series in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                le = bound if isinstance(bound, str) else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(series[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+class NullMetrics:
+    """Stand-in for Metrics when metrics are disabled: records nothing."""
+
+    enabled = False
+
+    def inc(self, name, amount=1, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, **labels):
+        return NULL_TIMER
+
+
+NULL_TIMER = _NullTimer()
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,274 @@
+"""Database models and table-version helpers.
+
+``db`` is created unbound here and attached to an application by
+``create_app()``, so the models are defined once, whatever the number of
+apps (tests build one per test case).
+"""
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import BigInteger, text, update
+from sqlalchemy.types import TypeDecorator
+
+from recurrence import Recurrence
+from timeparse import from_epoch, to_epoch
+
+db = SQLAlchemy()
+
+# Resource (server) booked when a request does not name one
+DEFAULT_RESOURCE = 'default'
+
+class EpochSeconds(TypeDecorator):
+    """Timestamp stored as an integer of UTC epoch seconds.
+
+    Python code sees naive PST wall-clock datetimes, as with DateTime. Bound
+    values may be naive PST or aware, so a comparison with ``now_pst``
+    compiles to an integer comparison. Ordering is chronological across DST
+    changes, and index entries are 8-byte integers instead of 26-character
+    strings. Fractions of a second are not kept.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return to_epoch(value)
+
+    def process_result_value(self, value, dialect):
+        return from_epoch(value) if value is not None else None
+
+    def result_processor(self, dialect, coltype):
+        # Skip TypeDecorator's generic wrapper: this runs for every row read
+        def process(value):
+            return from_epoch(value) if value is not None else None
+        return process
+
+# Timestamp columns per table; upgrade_schema converts them from DATETIME text
+EPOCH_COLUMNS = {
+    'reservation': ('start_time', 'end_time'),
+    'archived_reservation': ('start_time', 'end_time'),
+    'recurring_series': ('start_time', 'end_time', 'next_start'),
+}
+
+class Reservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False)
+    resource_id = db.Column(db.String(64), nullable=False, default=DEFAULT_RESOURCE,
+                            server_default=DEFAULT_RESOURCE)
+    start_time = db.Column(EpochSeconds, nullable=False)
+    end_time = db.Column(EpochSeconds, nullable=False)
+    # Table version (see DataVersion) of the write that stored the row
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # RecurringSeries this reservation is an occurrence of, if any
+    series_id = db.Column(db.Integer, db.ForeignKey('recurring_series.id'), nullable=True)
+
+    __table_args__ = (
+        # Overlap probe and per-resource listing:
+        # resource_id = :r AND start_time < :end AND end_time > :start
+        db.Index('ix_reservation_resource_start_end', 'resource_id', 'start_time', 'end_time'),
+        # Listing across all resources, in start_time order
+        db.Index('ix_reservation_start_end', 'start_time', 'end_time'),
+        # Listing filter: end_time > now
+        db.Index('ix_reservation_end_time', 'end_time'),
+        # Catch-up of in-memory state: version > :synced
+        db.Index('ix_reservation_version', 'version'),
+    )
+
+    def __repr__(self):
+        return f'<Reservation {self.username} from {self.start_time} to {self.end_time}>'
+
+    def to_dict(self):
+        # Times are naive PST wall-clock datetimes (read back from epoch seconds), so isoformat() has no offset
+        return {
+            'id': self.id,
+            'username': self.username,
+            'resource_id': self.resource_id,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'series_id': self.series_id,
+        }
+
+class RecurringSeries(db.Model):
+    """A repeating reservation.
+
+    Occurrences become ordinary Reservation rows once they enter the booking
+    horizon. ``expanded`` counts the occurrences handled so far, booked or
+    ``skipped`` because the slot was taken. ``next_start`` is the start of
+    the next one, or None once the series is exhausted.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False)
+    resource_id = db.Column(db.String(64), nullable=False)
+    # First occurrence, naive PST wall-clock time
+    start_time = db.Column(EpochSeconds, nullable=False)
+    end_time = db.Column(EpochSeconds, nullable=False)
+    freq = db.Column(db.String(10), nullable=False)
+    interval = db.Column(db.Integer, nullable=False, default=1)
+    count = db.Column(db.Integer, nullable=True)
+    until = db.Column(db.Date, nullable=True)
+    expanded = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    # Horizon expansion: next_start < :cutoff
+    next_start = db.Column(EpochSeconds, nullable=True, index=True)
+
+    def recurrence(self):
+        return Recurrence(self.freq, self.interval, self.count, self.until)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'resource_id': self.resource_id,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'recurrence': {'freq': self.freq, 'interval': self.interval, 'count': self.count,
+                           'until': self.until.isoformat() if self.until is not None else None},
+            'next_start': self.next_start.isoformat() if self.next_start is not None else None,
+            'skipped': self.skipped,
+        }
+
+class ArchivedReservation(db.Model):
+    """A finished reservation moved out of the hot ``reservation`` table by
+    archive_expired(), keeping its id. SQLite hands the id of an archived
+    row to the next booking, so the same id can be archived more than once
+    and the archive has a key of its own."""
+    __tablename__ = 'archived_reservation'
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(80), nullable=False)
+    resource_id = db.Column(db.String(64), nullable=False)
+    start_time = db.Column(EpochSeconds, nullable=False)
+    end_time = db.Column(EpochSeconds, nullable=False)
+    series_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        # History listing, per resource or across all, in start_time order
+        db.Index('ix_archived_reservation_resource_start', 'resource_id', 'start_time'),
+        db.Index('ix_archived_reservation_start', 'start_time'),
+        db.Index('ix_archived_reservation_id', 'id'),
+    )
+
+    to_dict = Reservation.to_dict
+
+class ReservationTombstone(db.Model):
+    """Record of a deleted reservation, stamped with the table version of
+    the delete, so other workers can drop it from their in-memory state
+    when they catch up."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    reservation_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+class DataVersion(db.Model):
+    """Monotonic change counter for a table.
+
+    Bumped in the same transaction as every write to the table, so all
+    worker processes agree on it; a cheap primary-key read tells a worker
+    whether its in-memory state (conflict index, ETags) is still current.
+    """
+    name = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def read_counter(name):
+    """Value of a DataVersion row (0 if it does not exist yet)."""
+    return db.session.query(DataVersion.version).filter_by(name=name).scalar() or 0
+
+def write_counter(name, value):
+    """Set a DataVersion row within the open write transaction."""
+    if not db.session.execute(update(DataVersion).where(DataVersion.name == name).values(version=value)).rowcount:
+        db.session.add(DataVersion(name=name, version=value))
+
+def current_version():
+    """Current version of the reservation table (0 before the first write)."""
+    return read_counter('reservation')
+
+def bump_version():
+    """Increment the reservation table version within the open write
+    transaction and return the new value.
+
+    The increment is a single UPDATE, so writers that do not otherwise
+    exclude each other (different resources on PostgreSQL) still get
+    distinct versions, handed out in commit order: the row lock taken here
+    is held until the transaction ends.
+    """
+    version = db.session.execute(
+        update(DataVersion).where(DataVersion.name == 'reservation')
+        .values(version=DataVersion.version + 1).returning(DataVersion.version)
+    ).scalar()
+    if version is None:
+        version = 1
+        db.session.add(DataVersion(name='reservation', version=version))
+        db.session.flush()
+    return version
+
+def _text_to_epoch(value):
+    # SQLite function for the migration: stored DATETIME text to epoch seconds
+    return to_epoch(datetime.fromisoformat(value)) if isinstance(value, str) else value
+
+def _convert_timestamps(conn):
+    """Rewrite DATETIME text timestamps as epoch seconds (see EpochSeconds).
+
+    On SQLite the values are converted in place by a Python function. The
+    column keeps its declared type, which does not matter to SQLite, and
+    a table whose first row already holds an integer is done. PostgreSQL
+    changes the column type, converting wall-clock times in the database's
+    own copy of the time zone.
+    """
+    dialect = conn.dialect.name
+    inspector = db.inspect(conn)
+    for table, columns in EPOCH_COLUMNS.items():
+        if dialect == 'sqlite':
+            stored = conn.execute(text(f"SELECT typeof({columns[0]}) FROM {table} LIMIT 1")).scalar()
+            if stored != 'text':
+                continue
+            conn.connection.driver_connection.create_function('pst_epoch', 1, _text_to_epoch, deterministic=True)
+            assignments = ', '.join(f"{c} = pst_epoch({c})" for c in columns)
+            conn.execute(text(f"UPDATE {table} SET {assignments}"))
+        else:
+            types = {c['name']: c['type'] for c in inspector.get_columns(table)}
+            for column in columns:
+                if not isinstance(types[column], db.Integer):
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT USING "
+                        f"floor(extract(epoch FROM {column} AT TIME ZONE 'America/Los_Angeles'))::bigint"))
+
+def _add_archive_key(conn):
+    """Rebuild an archived_reservation table keyed by the reservation id
+    (releases before archive_id) around its own archive_id key."""
+    inspector = db.inspect(conn)
+    if not inspector.has_table('archived_reservation'):
+        return
+    if 'archive_id' in {c['name'] for c in inspector.get_columns('archived_reservation')}:
+        return
+    table = ArchivedReservation.__table__
+    conn.execute(text("ALTER TABLE archived_reservation RENAME TO archived_reservation_old"))
+    # The renamed table keeps its indexes, and with them their names
+    for table_index in table.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {table_index.name}"))
+    table.create(conn)
+    columns = 'id, username, resource_id, start_time, end_time, series_id'
+    conn.execute(text(f"INSERT INTO archived_reservation ({columns}) "
+                      f"SELECT {columns} FROM archived_reservation_old ORDER BY start_time, id"))
+    conn.execute(text("DROP TABLE archived_reservation_old"))
+
+def upgrade_schema():
+    """Bring a database created by an earlier release up to the current models.
+
+    create_all() only creates missing tables, so columns added since are
+    added here (existing rows belong to DEFAULT_RESOURCE and version 0, and
+    to no series). Timestamps stored as DATETIME text become epoch seconds,
+    the archive gets its own primary key, then any missing indexes are
+    created.
+    """
+    columns = {c['name'] for c in db.inspect(db.engine).get_columns('reservation')}
+    with db.engine.begin() as conn:
+        if 'resource_id' not in columns:
+            conn.execute(text("ALTER TABLE reservation ADD COLUMN resource_id VARCHAR(64) "
+                              f"NOT NULL DEFAULT '{DEFAULT_RESOURCE}'"))
+        if 'version' not in columns:
+            conn.execute(text("ALTER TABLE reservation ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+        if 'series_id' not in columns:
+            conn.execute(text("ALTER TABLE reservation ADD COLUMN series_id INTEGER REFERENCES recurring_series (id)"))
+        _convert_timestamps(conn)
+        _add_archive_key(conn)
+    for table_index in Reservation.__table__.indexes:
+        table_index.create(db.engine, checkfirst=True)
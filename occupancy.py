@@ -0,0 +1,83 @@
+"""Slot occupancy map for the booking horizon.
+
+The horizon (today plus the advance booking limit) is cut into fixed slots
+of MIN_RESERVATION_DURATION, about 3,000 for 30 days. Two byte arrays count,
+per slot, the reservations that touch it and the ones that cover it
+completely, so most conflict tests are answered by looking at a handful of
+bytes; only requests that share a partially booked slot need an exact check.
+"""
+import re
+
+_BUSY_RUN = re.compile(rb'[^\x00]+')
+
+
+class SlotOccupancy:
+    """Per-slot reservation counts for ``n_slots`` slots of ``slot`` starting at ``origin``.
+
+    Times are whatever the caller indexes reservations by (naive PST
+    datetimes in this app); ``origin`` must be aligned to the slot grid.
+    """
+
+    def __init__(self, origin, slot, n_slots):
+        self.origin = origin
+        self.slot = slot
+        self.n_slots = n_slots
+        self.end = origin + slot * n_slots
+        # Reservations intersecting each slot / covering each slot entirely.
+        self._touched = bytearray(n_slots)
+        self._full = bytearray(n_slots)
+
+    def _span(self, start, end):
+        """Slots ``[first, last)`` that intersect ``[start, end)``, clipped to the horizon."""
+        first = max((start - self.origin) // self.slot, 0)
+        last = min(-((self.origin - end) // self.slot), self.n_slots)
+        return first, last
+
+    def _mark(self, start, end, delta):
+        first, last = self._span(start, end)
+        for k in range(first, last):
+            slot_start = self.origin + k * self.slot
+            self._touched[k] += delta
+            if start <= slot_start and end >= slot_start + self.slot:
+                self._full[k] += delta
+
+    def add(self, start, end):
+        """Record a reservation; parts outside the horizon are ignored."""
+        self._mark(start, end, 1)
+
+    def remove(self, start, end):
+        """Forget a reservation recorded with ``add``."""
+        self._mark(start, end, -1)
+
+    def extend(self, intervals):
+        for start, end in intervals:
+            self.add(start, end)
+
+    def overlaps(self, start, end, exact):
+        """Return True if ``[start, end)`` collides with a recorded reservation.
+
+        A fully booked slot inside the range is a certain conflict and an
+        untouched range is certainly free. Anything else (partially booked
+        boundary slots, or a range outside the horizon) is decided by
+        calling ``exact(start, end)``.
+        """
+        if start < self.origin or end > self.end:
+            return exact(start, end)
+        first, last = self._span(start, end)
+        if any(self._full[first:last]):
+            return True
+        if not any(self._touched[first:last]):
+            return False
+        return exact(start, end)
+
+    def busy_intervals(self, start, end):
+        """Coalesced ``(start, end)`` runs of touched slots within ``[start, end)``.
+
+        Slots are all-or-nothing here, so the runs are exact for callers that
+        work on a grid of whole slots.
+        """
+        first, last = self._span(start, end)
+        runs = []
+        for match in _BUSY_RUN.finditer(self._touched, first, last):
+            runs.append((self.origin + match.start() * self.slot, self.origin + match.end() * self.slot))
+        return runs
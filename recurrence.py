@@ -0,0 +1,88 @@
+"""Recurrence rules for repeating reservations.
+
+A rule expands into occurrences lazily, so a long series costs nothing
+until its occurrences are needed. Occurrences inside the booking horizon
+are checked against stored reservations in one merge pass over both sorted
+sequences, instead of one overlap query per occurrence.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+
+FREQUENCIES = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+
+Recurrence = namedtuple('Recurrence', 'freq interval count until')
+
+
+def parse_recurrence(data, max_occurrences):
+    """Validate a ``recurrence`` object such as ``{"freq": "weekly", "count": 10}``.
+
+    ``freq`` is 'daily' or 'weekly', ``interval`` (default 1) repeats every
+    n days or weeks, and ``count`` and/or ``until`` (a YYYY-MM-DD date,
+    inclusive) end the series. Raises ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("recurrence must be an object")
+    freq = data.get('freq')
+    if freq not in FREQUENCIES:
+        raise ValueError(f"recurrence freq must be one of: {', '.join(FREQUENCIES)}")
+    interval = data.get('interval', 1)
+    if not isinstance(interval, int) or isinstance(interval, bool) or not 1 <= interval <= 365:
+        raise ValueError("recurrence interval must be an integer between 1 and 365")
+    count = data.get('count')
+    if count is not None and (not isinstance(count, int) or isinstance(count, bool)
+                              or not 1 <= count <= max_occurrences):
+        raise ValueError(f"recurrence count must be an integer between 1 and {max_occurrences}")
+    until = data.get('until')
+    if until is not None:
+        try:
+            until = date.fromisoformat(until)
+        except (TypeError, ValueError):
+            raise ValueError("recurrence until must be a date in YYYY-MM-DD format")
+    if count is None and until is None:
+        raise ValueError("recurrence needs a count or an until date")
+    return Recurrence(freq, interval, count, until)
+
+
+def occurrence_count(start, recurrence):
+    """Number of occurrences of a series whose first one starts at ``start``."""
+    count = recurrence.count
+    if recurrence.until is not None:
+        step_days = (FREQUENCIES[recurrence.freq] * recurrence.interval).days
+        until_count = max((recurrence.until - start.date()).days // step_days + 1, 0)
+        count = until_count if count is None else min(count, until_count)
+    return count
+
+
+def occurrences(start, end, recurrence, skip=0):
+    """Yield ``(start, end)`` of each occurrence after the first ``skip``.
+
+    Steps are whole days added to the wall-clock times, so occurrences keep
+    their local time of day across daylight saving changes.
+    """
+    step = FREQUENCIES[recurrence.freq] * recurrence.interval
+    total = occurrence_count(start, recurrence)
+    for k in range(skip, total):
+        yield start + k * step, end + k * step
+
+
+def conflicts(candidates, busy):
+    """Positions of the ``candidates`` that overlap any of ``busy``.
+
+    Both are sequences of ``(start, end)`` sorted by start. One merge pass:
+    the busy intervals starting before a candidate ends are consumed in
+    order, keeping the latest end among them. The candidate collides if
+    that end is after its start. Candidates must not overlap each other,
+    which holds for the occurrences of a series.
+    """
+    found = []
+    busy = iter(busy)
+    pending = next(busy, None)
+    reach = None
+    for i, (start, end) in enumerate(candidates):
+        while pending is not None and pending[0] < end:
+            if reach is None or pending[1] > reach:
+                reach = pending[1]
+            pending = next(busy, None)
+        if reach is not None and reach > start:
+            found.append(i)
+    return found
@@ -0,0 +1,189 @@
+"""In-memory index of reservation intervals used for conflict checks.
+
+Reservations are kept in arrays sorted by start time, so testing whether a
+candidate ``[start, end)`` interval collides with an existing reservation is
+a binary search plus a short backwards scan instead of a table scan.
+"""
+from bisect import bisect_left, bisect_right, insort
+import threading
+
+
+class ReservationIndex:
+    """Sorted-array index of reservation intervals keyed on start time.
+
+    Intervals are half-open, matching the overlap rule used by the API:
+    two reservations collide when ``a.start < b.end and a.end > b.start``.
+    Keys only need to be orderable and subtractable, so naive datetimes and
+    integer timestamps both work as long as one index uses a single kind.
+    """
+
+    def __init__(self, rows=()):
+        self._starts = []
+        self._ends = []
+        self._ids = []
+        # All end times, sorted on their own, for next_expiry().
+        self._expiries = []
+        # Longest interval seen so far; bounds the backwards scan in overlaps().
+        self._max_span = None
+        # Interval of each indexed reservation id, so rows seen twice by
+        # catch-up are skipped and removals can find their entry.
+        self._known = {}
+        self._lock = threading.RLock()
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, reservation_id, start, end):
+        """Insert one interval, keeping the arrays sorted by start time.
+
+        Adding an id that is already indexed is a no-op, so a row picked up
+        by a catch-up query can safely be added again. Returns True if the
+        interval was inserted.
+        """
+        with self._lock:
+            if reservation_id is not None:
+                if reservation_id in self._known:
+                    return False
+                self._known[reservation_id] = (start, end)
+            i = bisect_right(self._starts, start)
+            self._starts.insert(i, start)
+            self._ends.insert(i, end)
+            self._ids.insert(i, reservation_id)
+            insort(self._expiries, end)
+            span = end - start
+            if self._max_span is None or span > self._max_span:
+                self._max_span = span
+            return True
+
+    def remove(self, reservation_id):
+        """Drop the interval of ``reservation_id``; returns its ``(start, end)``,
+        or None if the id is not indexed.
+
+        The longest span is left as it was: it only has to be an upper bound.
+        """
+        with self._lock:
+            interval = self._known.pop(reservation_id, None)
+            if interval is None:
+                return None
+            start, end = interval
+            i = bisect_left(self._starts, start)
+            while self._ids[i] != reservation_id:
+                i += 1
+            del self._starts[i], self._ends[i], self._ids[i]
+            del self._expiries[bisect_left(self._expiries, end)]
+            return interval
+
+    def find(self, reservation_id):
+        """``(start, end)`` of an indexed reservation id, or None."""
+        return self._known.get(reservation_id)
+
+    def extend(self, rows):
+        """Insert many ``(id, start, end)`` rows at once."""
+        with self._lock:
+            for reservation_id, start, end in rows:
+                self.add(reservation_id, start, end)
+
+    def next_expiry(self, after):
+        """Earliest end time strictly later than ``after``, or None."""
+        with self._lock:
+            i = bisect_right(self._expiries, after)
+            return self._expiries[i] if i < len(self._expiries) else None
+
+    def _colliding(self, start, end, exclude=None):
+        """Yield positions of intervals colliding with ``[start, end)``, latest start first.
+
+        Every candidate starts before ``end``; walk back from the last one
+        until starts are too early to reach ``start`` even with the longest
+        span in the index. The interval of id ``exclude`` is skipped. Callers
+        must hold the lock.
+        """
+        if not self._starts:
+            return
+        i = bisect_left(self._starts, end) - 1
+        earliest = start - self._max_span
+        while i >= 0 and self._starts[i] > earliest:
+            if self._ends[i] > start and (exclude is None or self._ids[i] != exclude):
+                yield i
+            i -= 1
+
+    def overlaps(self, start, end, exclude=None):
+        """Return True if ``[start, end)`` collides with any indexed interval
+        other than that of reservation ``exclude``."""
+        with self._lock:
+            return next(self._colliding(start, end, exclude), None) is not None
+
+    def overlapping(self, start, end):
+        """Return ``(start, end)`` of every interval colliding with ``[start, end)``,
+        sorted by start."""
+        with self._lock:
+            return [(self._starts[i], self._ends[i]) for i in reversed(list(self._colliding(start, end)))]
+
+
+class ResourceIndexes:
+    """One ReservationIndex per resource, synced to the table version as a whole.
+
+    Conflicts only exist between reservations of the same resource, so each
+    resource gets its own timeline and lock: a check for one server never
+    scans or waits on another server's bookings.
+    """
+
+    def __init__(self, rows=()):
+        self._partitions = {}
+        # Resource of each indexed reservation id, for find() and remove()
+        self._resource_of = {}
+        # Table version the indexes were last synced to; maintained by the caller.
+        self.version = None
+        self._lock = threading.Lock()
+        for resource_id, reservation_id, start, end in rows:
+            self.add(resource_id, reservation_id, start, end)
+
+    def __len__(self):
+        return sum(len(index) for index in list(self._partitions.values()))
+
+    def __contains__(self, resource_id):
+        return resource_id in self._partitions
+
+    def resources(self):
+        """Resource ids with at least one indexed reservation, sorted."""
+        return sorted(self._partitions)
+
+    def get(self, resource_id):
+        """The index for ``resource_id``; an empty, unregistered one if it has
+        no reservations yet."""
+        index = self._partitions.get(resource_id)
+        return index if index is not None else ReservationIndex()
+
+    def add(self, resource_id, reservation_id, start, end):
+        """Insert one interval into its resource's index; see ReservationIndex.add."""
+        index = self._partitions.get(resource_id)
+        if index is None:
+            with self._lock:
+                index = self._partitions.setdefault(resource_id, ReservationIndex())
+        added = index.add(reservation_id, start, end)
+        if added and reservation_id is not None:
+            self._resource_of[reservation_id] = resource_id
+        return added
+
+    def find(self, reservation_id):
+        """``(resource_id, start, end)`` of an indexed reservation id, or None."""
+        resource_id = self._resource_of.get(reservation_id)
+        interval = self._partitions[resource_id].find(reservation_id) if resource_id is not None else None
+        return (resource_id, *interval) if interval is not None else None
+
+    def remove(self, reservation_id):
+        """Drop a reservation from its resource's index; returns its
+        ``(resource_id, start, end)``, or None if the id is not indexed."""
+        resource_id = self._resource_of.pop(reservation_id, None)
+        interval = self._partitions[resource_id].remove(reservation_id) if resource_id is not None else None
+        return (resource_id, *interval) if interval is not None else None
+
+    def next_expiry(self, after, resource_ids=None):
+        """Earliest end time strictly later than ``after`` among ``resource_ids``
+        (all resources if None), or None."""
+        if resource_ids is None:
+            indexes = list(self._partitions.values())
+        else:
+            indexes = [self._partitions[r] for r in resource_ids if r in self._partitions]
+        expiries = [e for e in (index.next_expiry(after) for index in indexes) if e is not None]
+        return min(expiries, default=None)
@@ -0,0 +1,85 @@
+"""Caches for serialized listing responses.
+
+Two interchangeable backends share the same small interface (``get``,
+``set``, ``invalidate``): an in-process LRU for single-worker deployments
+and a Redis-backed store shared by every Gunicorn worker. Callers put the
+reservation table version into their keys, so an entry written by one
+worker is never served after another worker has changed the data.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Only needed for the shared backend
+    redis = None
+
+
+class LRUResponseCache:
+    """Bounded in-process cache of response bodies with per-entry TTLs."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached bytes for ``key``, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``ttl`` seconds, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisResponseCache:
+    """Response cache in a Redis server shared by all worker processes."""
+
+    def __init__(self, url, prefix='reservations:response:'):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_URL points at Redis but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        return self._client.get(self._prefix + key)
+
+    def set(self, key, value, ttl):
+        # Redis expiries have millisecond resolution; keep at least 1 ms
+        self._client.set(self._prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    def invalidate(self):
+        """Do nothing: keys carry the table version, so a write leaves the old
+        entries unread until they expire. Deleting them would mean scanning
+        the whole keyspace on every write."""
+
+
+def create_response_cache(url, max_entries=256):
+    """Build a cache from a URL: ``memory://`` for the in-process LRU,
+    ``redis://...`` for the shared store, or None to disable caching."""
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return LRUResponseCache(max_entries)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisResponseCache(url)
+    raise ValueError(f"Unsupported RESPONSE_CACHE_URL: {url}")
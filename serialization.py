@@ -0,0 +1,113 @@
+"""JSON encoding of reservation rows selected as plain tuples.
+
+Listing routes can select RESERVATION_COLUMNS with SQLAlchemy Core instead
+of loading Reservation objects. That avoids an identity-map entry, the
+attribute instrumentation and a ``to_dict()`` call per row. The encoders
+here turn those tuples straight into response bytes.
+
+``JSONEncoder`` (the standard library) writes exactly what ``jsonify``
+writes for ``to_dict()``: sorted keys, compact separators, ASCII escapes
+and a trailing newline. ``OrjsonEncoder`` is used when ``orjson`` is
+installed. Its output is the same JSON, with non-ASCII characters left
+as UTF-8 rather than escaped.
+
+Both also write the columnar form of a listing (``columns``): one array per
+column instead of one object per row, usernames and resource ids
+dictionary-encoded, and timestamps as epoch seconds.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional faster encoder
+    orjson = None
+
+# Listed columns, in the order the encoders unpack each row
+RESERVATION_COLUMNS = ('id', 'username', 'resource_id', 'start_time', 'end_time', 'series_id')
+
+
+def _dictionary_encode(values):
+    """``{'dictionary': distinct values in first-seen order, 'codes': the
+    index of each value in it}``."""
+    dictionary = {}
+    codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    return {'codes': codes, 'dictionary': list(dictionary)}
+
+
+def columnar(rows, next_cursor):
+    """Column-oriented listing of RESERVATION_COLUMNS rows whose start_time
+    and end_time are epoch seconds, keys in sorted order."""
+    ids, usernames, resource_ids, starts, ends, series_ids = zip(*rows) if rows else ((),) * 6
+    return {'count': len(ids), 'end_time': list(ends), 'id': list(ids), 'next': next_cursor,
+            'resource_id': _dictionary_encode(resource_ids), 'series_id': list(series_ids),
+            'start_time': list(starts), 'username': _dictionary_encode(usernames)}
+
+
+class JSONEncoder:
+    """Row encoder on the standard library's json module."""
+
+    name = 'json'
+
+    @staticmethod
+    def _dicts(rows):
+        # Keys in sorted order, as jsonify's sort_keys would put them
+        return [{'end_time': end.isoformat(), 'id': id_, 'resource_id': resource_id, 'series_id': series_id,
+                 'start_time': start.isoformat(), 'username': username}
+                for id_, username, resource_id, start, end, series_id in rows]
+
+    def array(self, rows):
+        """A JSON array of ``rows``, as bytes."""
+        return (json.dumps(self._dicts(rows), separators=(',', ':')) + '\n').encode()
+
+    def page(self, rows, next_cursor):
+        """The paginated listing envelope for ``rows``, as bytes."""
+        return (json.dumps({'next': next_cursor, 'reservations': self._dicts(rows)}, separators=(',', ':'))
+                + '\n').encode()
+
+    def lines(self, rows):
+        """One JSON object per row, newline-terminated (NDJSON), as bytes."""
+        return ''.join(json.dumps(d) + '\n' for d in self._dicts(rows)).encode()
+
+    def columns(self, rows, next_cursor=None):
+        """The columnar listing of ``rows`` (epoch-second timestamps), as bytes."""
+        return (json.dumps(columnar(rows, next_cursor), separators=(',', ':')) + '\n').encode()
+
+
+class OrjsonEncoder:
+    """Row encoder on orjson, which also formats the datetimes itself."""
+
+    name = 'orjson'
+
+    @staticmethod
+    def _dicts(rows):
+        return [{'end_time': end, 'id': id_, 'resource_id': resource_id, 'series_id': series_id,
+                 'start_time': start, 'username': username}
+                for id_, username, resource_id, start, end, series_id in rows]
+
+    def array(self, rows):
+        return orjson.dumps(self._dicts(rows), option=orjson.OPT_APPEND_NEWLINE)
+
+    def page(self, rows, next_cursor):
+        return orjson.dumps({'next': next_cursor, 'reservations': self._dicts(rows)},
+                            option=orjson.OPT_APPEND_NEWLINE)
+
+    def lines(self, rows):
+        dumps, option = orjson.dumps, orjson.OPT_APPEND_NEWLINE
+        return b''.join(dumps(d, option=option) for d in self._dicts(rows))
+
+    def columns(self, rows, next_cursor=None):
+        return orjson.dumps(columnar(rows, next_cursor), option=orjson.OPT_APPEND_NEWLINE)
+
+
+def create_encoder(name):
+    """Encoder for a JSON_ENCODER setting: 'orjson', 'json', or None for
+    orjson when it is installed and json otherwise."""
+    if name is None:
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise RuntimeError("JSON_ENCODER is 'orjson' but the 'orjson' package is not installed")
+        return OrjsonEncoder()
+    if name == 'json':
+        return JSONEncoder()
+    raise ValueError(f"Unknown JSON_ENCODER {name!r}; use 'orjson', 'json' or None")
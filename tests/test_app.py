@@ -1,19 +1,30 @@
 import unittest
+import gzip
 import json
 from datetime import datetime, timedelta, timezone
+from unittest import mock
 import pytz # Import pytz
-from app import app, db, Reservation, PST, MAX_RESERVATION_DURATION, MIN_RESERVATION_DURATION, ADVANCE_BOOKING_LIMIT
+from app import create_app, db, Reservation, upgrade_schema, PST, archive_expired, get_reservation_index
+from models import ArchivedReservation, RecurringSeries, ReservationTombstone, bump_version
+from config import Config
+
+MAX_RESERVATION_DURATION = Config.MAX_RESERVATION_DURATION
+MIN_RESERVATION_DURATION = Config.MIN_RESERVATION_DURATION
+ADVANCE_BOOKING_LIMIT = Config.ADVANCE_BOOKING_LIMIT
 
 class ReservationTestCase(unittest.TestCase):
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:' # Use in-memory SQLite for tests
-        self.client = app.test_client()
-        with app.app_context():
+        # A fresh app per test, so no in-memory state carries over between tests
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', # Use in-memory SQLite for tests
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
             db.create_all()
 
     def tearDown(self):
-        with app.app_context():
+        with self.app.app_context():
             db.session.remove()
             db.drop_all()
 
@@ -35,7 +46,7 @@ class ReservationTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
         data = json.loads(response.data)
         self.assertEqual(data['username'], "testuser")
-        with app.app_context(): # Add app context for DB query
+        with self.app.app_context(): # Add app context for DB query
             self.assertTrue(Reservation.query.count() == 1)
 
     def test_02_get_reservations_empty(self):
@@ -82,6 +93,29 @@ class ReservationTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 409)
 
 
+    def test_04b_create_reservation_conflict_query_mode(self):
+        """Test that the database-backed conflict check agrees with the index."""
+        payload1 = self._make_reservation("user_A", 1, 15, 60)
+        self.client.post('/reservations', json=payload1)
+
+        self.app.config['CONFLICT_CHECK'] = 'query'
+        try:
+            response = self.client.post('/reservations', json=self._make_reservation("user_B", 1, 15, 30))
+            self.assertEqual(response.status_code, 409)
+            response = self.client.post('/reservations', json=self._make_reservation("user_C", 1, 16, 30))
+            self.assertEqual(response.status_code, 201)
+        finally:
+            self.app.config['CONFLICT_CHECK'] = 'index'
+
+    def test_04c_reservation_indexes_created(self):
+        """Test that create_all builds the indexes used by the conflict and listing queries."""
+        with self.app.app_context():
+            names = {ix['name'] for ix in db.inspect(db.engine).get_indexes('reservation')}
+        self.assertIn('ix_reservation_resource_start_end', names)
+        self.assertIn('ix_reservation_start_end', names)
+        self.assertIn('ix_reservation_end_time', names)
+        self.assertIn('ix_reservation_version', names)
+
     def test_05_create_reservation_past_date(self):
         """Test creating a reservation in the past."""
         payload = self._make_reservation("pastuser", -1, 10, 60) # Yesterday, 10 AM
@@ -138,6 +172,11 @@ class ReservationTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         data = json.loads(response.data)
         self.assertIn("days in advance", data['error'])
+        # The last representable day is rejected the same way
+        response = self.client.post('/reservations', json={"username": "futurelooker", "start_time": "9999-12-31 10:00",
+                                                           "end_time": "9999-12-31 11:00"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("days in advance", json.loads(response.data)['error'])
 
     def test_10_create_reservation_boundary_advance_limit(self):
         """Test reservation at the exact advance booking limit."""
@@ -296,5 +335,716 @@ class ReservationTestCase(unittest.TestCase):
         data = json.loads(response.data)
         self.assertIn("Invalid date format", data['error'])
 
+    def test_15_batch_create_success(self):
+        """Test creating several reservations in one batch."""
+        payloads = [self._make_reservation(f"batchuser{i}", 1, 8 + i, 60) for i in range(3)]
+        response = self.client.post('/reservations/batch', json=payloads)
+        self.assertEqual(response.status_code, 201, response.data.decode())
+        data = json.loads(response.data)
+        self.assertEqual(data['created'], 3)
+        self.assertEqual([r['status'] for r in data['results']], [201, 201, 201])
+        self.assertEqual([r['reservation']['username'] for r in data['results']],
+                         ["batchuser0", "batchuser1", "batchuser2"])
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.count(), 3)
+
+    def test_16_batch_create_partial(self):
+        """Test per-entry results for invalid, conflicting and duplicate batch entries."""
+        self.client.post('/reservations', json=self._make_reservation("existing", 1, 10, 60))
+
+        payloads = [
+            self._make_reservation("ok", 1, 12, 60),
+            self._make_reservation("clashes_with_db", 1, 10, 30),
+            self._make_reservation("clashes_with_batch", 1, 12, 30),
+            self._make_reservation("too_long", 1, 14, int(MAX_RESERVATION_DURATION.total_seconds() / 60) + 15),
+            {"username": "missing_times"},
+        ]
+        response = self.client.post('/reservations/batch', json=payloads)
+        self.assertEqual(response.status_code, 207)
+        data = json.loads(response.data)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([r['status'] for r in data['results']], [201, 409, 409, 400, 400])
+        self.assertIn("Maximum reservation duration", data['results'][3]['error'])
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.count(), 2)
+
+        # Conflicts are detected the same way without the in-memory index
+        self.app.config['CONFLICT_CHECK'] = 'query'
+        try:
+            response = self.client.post('/reservations/batch', json=payloads[:3])
+            data = json.loads(response.data)
+            self.assertEqual([r['status'] for r in data['results']], [409, 409, 409])
+        finally:
+            self.app.config['CONFLICT_CHECK'] = 'index'
+
+    def test_17_batch_requires_array(self):
+        """Test that the batch endpoint rejects anything but a non-empty array."""
+        for body in [{}, [], self._make_reservation("single", 1, 10, 60)]:
+            response = self.client.post('/reservations/batch', json=body)
+            self.assertEqual(response.status_code, 400)
+
+    def test_18_get_reservations_ndjson(self):
+        """Test the streaming newline-delimited JSON listing."""
+        for i in range(3):
+            self.client.post('/reservations', json=self._make_reservation(f"streamuser{i}", 1 + i, 10, 60))
+
+        for url, headers in [('/reservations?format=ndjson', {}),
+                             ('/reservations', {'Accept': 'application/x-ndjson'})]:
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = response.get_data(as_text=True).splitlines()
+            self.assertEqual([json.loads(line)['username'] for line in lines],
+                             ["streamuser0", "streamuser1", "streamuser2"])
+
+        # Plain JSON stays the default
+        response = self.client.get('/reservations', headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(len(json.loads(response.data)), 3)
+
+    def test_19_get_reservations_keyset_pagination(self):
+        """Test walking the listing page by page with cursors."""
+        for i in range(5):
+            self.client.post('/reservations', json=self._make_reservation(f"pageuser{i}", 1 + i, 10, 60))
+
+        usernames = []
+        url = '/reservations?limit=2'
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertLessEqual(len(data['reservations']), 2)
+            usernames.extend(r['username'] for r in data['reservations'])
+            pages += 1
+            url = f"/reservations?limit=2&after={data['next']}" if data['next'] else None
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(usernames, [f"pageuser{i}" for i in range(5)])
+
+        # NDJSON honours the same cursor
+        first = json.loads(self.client.get('/reservations?limit=2').data)['reservations']
+        cursor = f"{first[-1]['start_time']},{first[-1]['id']}"
+        response = self.client.get(f'/reservations?format=ndjson&limit=2&after={cursor}')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)['username'] for line in lines], ["pageuser2", "pageuser3"])
+
+    def test_20_get_reservations_bad_pagination(self):
+        """Test that malformed limits and cursors are rejected."""
+        for query in ['limit=0', 'limit=abc', 'limit=100000', 'after=notacursor', 'after=2025-01-01T10:00:00,x',
+                      'after=2026-10-18T10:00:00,99999999999999999999999', f'after=2026-10-18T10:00:00,{2 ** 63}']:
+            response = self.client.get(f'/reservations?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        # A cursor on the last representable day binds as epoch seconds
+        response = self.client.get('/reservations?after=9999-12-31T23:00:00,1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {"reservations": [], "next": None})
+
+    def test_21_get_reservations_etag(self):
+        """Test conditional GETs against the table version ETag."""
+        self.client.post('/reservations', json=self._make_reservation("etaguser1", 1, 10, 60))
+
+        response = self.client.get('/reservations?view=all')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(etag)
+
+        response = self.client.get('/reservations?view=all', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # Other views and formats have their own tags
+        response = self.client.get('/reservations?view=week', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/reservations?view=all&format=ndjson', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        response.get_data()
+
+        # Any write invalidates the tag
+        self.client.post('/reservations', json=self._make_reservation("etaguser2", 2, 10, 60))
+        response = self.client.get('/reservations?view=all', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_22_day_week_listing_cache(self):
+        """Test that full listings are cached and invalidated by writes."""
+        self.client.post('/reservations', json=self._make_reservation("cacheuser1", 1, 10, 60))
+
+        first = self.client.get('/reservations?view=week')
+        self.assertEqual(first.status_code, 200)
+        cache = self.app.extensions['response_cache']
+        self.assertEqual(len(cache._entries), 1)
+
+        second = self.client.get('/reservations?view=week')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+        self.client.post('/reservations', json=self._make_reservation("cacheuser2", 1, 12, 60))
+        self.assertEqual(len(cache._entries), 0)
+
+        self.client.get('/reservations?view=all')
+        self.assertEqual(len(cache._entries), 1)
+        # Pages are not cached
+        self.client.get('/reservations?limit=10')
+        self.assertEqual(len(cache._entries), 1)
+
+    def test_23_availability(self):
+        """Test the free-slot listing for a future day."""
+        payload = self._make_reservation("busyuser", 2, 10, 60)
+        self.client.post('/reservations', json=payload)
+        day = payload['start_time'][:10]
+
+        response = self.client.get(f'/availability?date={day}&granularity=30m')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['date'], day)
+        self.assertEqual(data['granularity_minutes'], 30)
+        self.assertEqual(data['slots'], [
+            {"start_time": f"{day}T00:00:00", "end_time": f"{day}T10:00:00"},
+            {"start_time": f"{day}T11:00:00", "end_time": (datetime.fromisoformat(day) + timedelta(days=1)).isoformat()},
+        ])
+
+        # Served from the cache until the next write
+        self.assertEqual(self.client.get(f'/availability?date={day}&granularity=30m').data, response.data)
+        self.client.post('/reservations', json=self._make_reservation("busyuser2", 2, 12, 60))
+        data = json.loads(self.client.get(f'/availability?date={day}&granularity=30m').data)
+        self.assertEqual(len(data['slots']), 3)
+
+    def test_24_availability_today_and_limits(self):
+        """Test that availability starts after now and respects the booking horizon."""
+        now_pst = datetime.now(PST)
+        data = json.loads(self.client.get('/availability').data)
+        for slot in data['slots']:
+            self.assertGreater(datetime.fromisoformat(slot['start_time']), now_pst.replace(tzinfo=None))
+
+        too_far = (now_pst + ADVANCE_BOOKING_LIMIT + timedelta(days=1)).date().isoformat()
+        yesterday = (now_pst - timedelta(days=1)).date().isoformat()
+        for query in [f'date={too_far}', f'date={yesterday}', 'date=tomorrow', 'granularity=0m']:
+            self.assertEqual(self.client.get(f'/availability?{query}').status_code, 400, query)
+
+    def test_25_bitmap_conflict_check(self):
+        """Test conflict detection and availability with the slot occupancy map."""
+        self.app.config['CONFLICT_CHECK'] = 'bitmap'
+        try:
+            first = self._make_reservation("bitmap_A", 1, 15, 60) # 3 PM - 4 PM
+            self.assertEqual(self.client.post('/reservations', json=first).status_code, 201)
+            # Fully booked slots
+            self.assertEqual(self.client.post('/reservations', json=self._make_reservation("bitmap_B", 1, 15, 30)).status_code, 409)
+
+            # Off-grid reservation 4:05 PM - 4:25 PM leaves partially booked slots
+            off_grid = dict(first, username="bitmap_C")
+            off_grid['start_time'] = first['end_time'][:-5] + "05:00"
+            off_grid['end_time'] = first['end_time'][:-5] + "25:00"
+            self.assertEqual(self.client.post('/reservations', json=off_grid).status_code, 201)
+            touching = dict(off_grid, username="bitmap_D", start_time=off_grid['end_time'])
+            touching['end_time'] = first['end_time'][:-5] + "45:00"
+            self.assertEqual(self.client.post('/reservations', json=touching).status_code, 201)
+            clashing = dict(touching, username="bitmap_E", start_time=first['end_time'][:-5] + "40:00")
+            clashing['end_time'] = first['end_time'][:-5] + "55:00"
+            self.assertEqual(self.client.post('/reservations', json=clashing).status_code, 409)
+
+            day = first['start_time'][:10]
+            bitmap_slots = json.loads(self.client.get(f'/availability?date={day}').data)['slots']
+        finally:
+            self.app.config['CONFLICT_CHECK'] = 'index'
+        self.app.extensions.pop('response_cache', None)
+        index_slots = json.loads(self.client.get(f'/availability?date={day}').data)['slots']
+        self.assertEqual(bitmap_slots, index_slots)
+
+    def test_26_resources_book_independently(self):
+        """Test that the same slot can be booked once per resource."""
+        payload = self._make_reservation("res_A", 1, 9, 60)
+        response = self.client.post('/reservations', json=payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.data)['resource_id'], 'default')
+
+        for mode in ['index', 'query', 'bitmap']:
+            self.app.config['CONFLICT_CHECK'] = mode
+            try:
+                resource_id = f"server-{mode}"
+                response = self.client.post('/reservations', json=dict(payload, resource_id=resource_id))
+                self.assertEqual(response.status_code, 201, mode)
+                self.assertEqual(json.loads(response.data)['resource_id'], resource_id)
+                response = self.client.post('/reservations', json=dict(payload, resource_id=resource_id, username="res_B"))
+                self.assertEqual(response.status_code, 409, mode)
+            finally:
+                self.app.config['CONFLICT_CHECK'] = 'index'
+
+        for bad in ['', 'a,b', 'x' * 65, 42]:
+            response = self.client.post('/reservations', json=dict(payload, resource_id=bad))
+            self.assertEqual(response.status_code, 400, bad)
+
+    def test_27_batch_across_resources(self):
+        """Test that batch entries only conflict with entries of the same resource."""
+        payload = self._make_reservation("batch_res", 1, 9, 60)
+        response = self.client.post('/reservations/batch', json=[
+            dict(payload, resource_id='server-a'),
+            dict(payload, resource_id='server-b'),
+            dict(payload, resource_id='server-a'),
+        ])
+        self.assertEqual(response.status_code, 207)
+        statuses = [r['status'] for r in json.loads(response.data)['results']]
+        self.assertEqual(statuses, [201, 201, 409])
+
+    def test_28_get_reservations_filter_resource(self):
+        """Test filtering the listing by one or many resources."""
+        payload = self._make_reservation("filter_res", 1, 9, 60)
+        for resource_id in ['server-a', 'server-b', 'server-c']:
+            self.client.post('/reservations', json=dict(payload, resource_id=resource_id))
+
+        def listed(query):
+            response = self.client.get(f'/reservations?{query}')
+            self.assertEqual(response.status_code, 200)
+            return [r['resource_id'] for r in json.loads(response.data)]
+
+        self.assertEqual(listed('resource=server-b'), ['server-b'])
+        self.assertEqual(listed('resource=server-a,server-c'), ['server-a', 'server-c'])
+        self.assertEqual(listed('resource=server-a&resource=server-c&view=week'), ['server-a', 'server-c'])
+        self.assertEqual(listed('resource=nowhere'), [])
+        self.assertEqual(len(listed('view=all')), 3)
+        self.assertEqual(self.client.get('/reservations?resource=bad:id').status_code, 400)
+
+        etag_a = self.client.get('/reservations?resource=server-a').headers['ETag']
+        etag_b = self.client.get('/reservations?resource=server-b').headers['ETag']
+        self.assertNotEqual(etag_a, etag_b)
+
+    def test_29_availability_per_resource(self):
+        """Test that availability only counts the requested resource's reservations."""
+        payload = self._make_reservation("avail_res", 2, 10, 60)
+        self.client.post('/reservations', json=dict(payload, resource_id='server-a'))
+        day = payload['start_time'][:10]
+
+        busy = json.loads(self.client.get(f'/availability?date={day}&resource=server-a').data)
+        free = json.loads(self.client.get(f'/availability?date={day}&resource=server-b').data)
+        self.assertEqual(busy['resource_id'], 'server-a')
+        self.assertEqual(len(busy['slots']), 2)
+        self.assertEqual(len(free['slots']), 1)
+        self.assertEqual(self.client.get(f'/availability?date={day}&resource=a,b').status_code, 400)
+
+    def test_30_upgrade_schema_adds_resource_columns(self):
+        """Test that a table from before resources and epoch timestamps is upgraded in place."""
+        with self.app.app_context():
+            db.drop_all()
+            db.session.execute(db.text(
+                "CREATE TABLE reservation (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL, "
+                "start_time DATETIME NOT NULL, end_time DATETIME NOT NULL)"))
+            db.session.execute(db.text(
+                "INSERT INTO reservation (username, start_time, end_time) "
+                "VALUES ('old', '2030-01-01 09:00:00.000000', '2030-01-01 10:00:00.000000')"))
+            db.session.commit()
+            db.create_all()
+            upgrade_schema()
+            reservation = Reservation.query.one()
+            self.assertEqual(reservation.resource_id, 'default')
+            self.assertEqual(reservation.version, 0)
+            self.assertEqual((reservation.start_time, reservation.end_time),
+                             (datetime(2030, 1, 1, 9), datetime(2030, 1, 1, 10)))
+            stored = db.session.execute(db.text("SELECT typeof(start_time), start_time FROM reservation")).one()
+            self.assertEqual(tuple(stored), ('integer', int(datetime(2030, 1, 1, 17, tzinfo=timezone.utc).timestamp())))
+            upgrade_schema()  # Already converted: nothing changes
+            self.assertEqual(Reservation.query.one().start_time, datetime(2030, 1, 1, 9))
+            names = {ix['name'] for ix in db.inspect(db.engine).get_indexes('reservation')}
+        self.assertIn('ix_reservation_resource_start_end', names)
+
+    def test_31_event_stream(self):
+        """Test that the SSE stream delivers created reservations, filtered by resource."""
+        response = self.client.get('/reservations/stream?resource=server-a', buffered=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = response.response
+        self.assertEqual(next(chunks), b': keepalive\n\n')
+
+        self.client.post('/reservations', json=dict(self._make_reservation("other", 1, 9, 60), resource_id='server-b'))
+        self.client.post('/reservations/batch', json=[
+            dict(self._make_reservation("streamed", 1, 10, 60), resource_id='server-a'),
+            dict(self._make_reservation("streamed", 1, 12, 60), resource_id='server-a'),
+        ])
+        frames = next(chunks).decode().split('\n\n')[:-1]
+        self.assertEqual(len(frames), 2)
+        event_id, event, data = frames[1].split('\n')
+        self.assertEqual(event, 'event: created')
+        reservation = json.loads(data[len('data: '):])
+        self.assertEqual((reservation['username'], reservation['resource_id']), ("streamed", 'server-a'))
+        response.close()
+
+        # Resuming from the first event replays the second one
+        last_event_id = frames[0].split('\n')[0][len('id: '):]
+        resumed = self.client.get('/reservations/stream', headers={'Last-Event-ID': last_event_id}, buffered=False)
+        chunks = resumed.response
+        next(chunks)
+        self.assertTrue(next(chunks).startswith(event_id.encode()))
+        resumed.close()
+        self.assertEqual(self.client.get('/reservations/stream?resource=bad:id').status_code, 400)
+
+    def test_32_update_reservation(self):
+        """Test that PATCH moves a reservation atomically, ignoring its own old slot."""
+        first = json.loads(self.client.post('/reservations', json=self._make_reservation("mover", 1, 10, 60)).data)
+        self.client.post('/reservations', json=self._make_reservation("neighbour", 1, 12, 60))
+        etag = self.client.get('/reservations').headers['ETag']
+
+        # Shift by 30 minutes: overlaps only its own old slot
+        moved = self._make_reservation("mover", 1, 10, 60)
+        moved['start_time'] = moved['start_time'].replace('10:00', '10:30')
+        moved['end_time'] = moved['end_time'].replace('11:00', '11:30')
+        response = self.client.patch(f"/reservations/{first['id']}", json=moved)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['start_time'].endswith('10:30:00'))
+        self.assertEqual(self.client.post('/reservations', json=self._make_reservation("taker", 1, 10, 30)).status_code, 201)
+
+        # Into the neighbour: rejected, nothing changed
+        clash = self._make_reservation("mover", 1, 12, 30)
+        self.assertEqual(self.client.patch(f"/reservations/{first['id']}", json=clash).status_code, 409)
+        # Onto another resource the same slot is free
+        response = self.client.patch(f"/reservations/{first['id']}", json=dict(clash, resource_id='server-b'))
+        self.assertEqual(json.loads(response.data)['resource_id'], 'server-b')
+        self.assertEqual(self.client.post('/reservations', json=self._make_reservation("back", 1, 10, 30)).status_code, 409)
+        self.assertEqual(self.client.post('/reservations', json=self._make_reservation("back", 1, 10, 60)).status_code, 409)
+        self.assertEqual(self.client.post('/reservations', json=self._make_reservation("back", 1, 11, 60)).status_code, 201)
+
+        # Only the username: times are kept
+        renamed = json.loads(self.client.patch(f"/reservations/{first['id']}", json={"username": "renamed"}).data)
+        self.assertEqual((renamed['username'], renamed['resource_id']), ("renamed", 'server-b'))
+        self.assertNotEqual(self.client.get('/reservations').headers['ETag'], etag)
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.count(), 4)
+
+        self.assertEqual(self.client.patch('/reservations/999', json={"username": "x"}).status_code, 404)
+        self.assertEqual(self.client.patch(f"/reservations/{first['id']}", json={}).status_code, 400)
+        too_long = dict(clash, end_time=clash['start_time'].replace('12:00', '17:00'))
+        self.assertEqual(self.client.patch(f"/reservations/{first['id']}", json=too_long).status_code, 400)
+        # Rejected before the resource is used as a lock key
+        with mock.patch('app.begin_write') as begin_write:
+            for resource_id in (["server-a"], None, "bad id"):
+                response = self.client.patch(f"/reservations/{first['id']}", json={"resource_id": resource_id})
+                self.assertEqual(response.status_code, 400, resource_id)
+                self.assertIn("Invalid resource_id", json.loads(response.data)['error'])
+            begin_write.assert_not_called()
+
+    def test_33_delete_reservation(self):
+        """Test that DELETE frees the slot in every conflict mode and notifies subscribers."""
+        stream = self.client.get('/reservations/stream', buffered=False)
+        chunks = stream.response
+        next(chunks)
+        for mode in ['index', 'bitmap', 'query']:
+            self.app.config['CONFLICT_CHECK'] = mode
+            payload = self._make_reservation(f"cancel_{mode}", 2, 10, 60)
+            created = json.loads(self.client.post('/reservations', json=payload).data)
+            self.assertEqual(self.client.post('/reservations', json=payload).status_code, 409, mode)
+            self.assertEqual(self.client.delete(f"/reservations/{created['id']}").status_code, 204)
+            self.assertEqual(self.client.delete(f"/reservations/{created['id']}").status_code, 404)
+            replacement = self.client.post('/reservations', json=payload)
+            self.assertEqual(replacement.status_code, 201, mode)
+            self.client.delete(f"/reservations/{json.loads(replacement.data)['id']}")
+        day = self._make_reservation("x", 2, 10, 60)['start_time'][:10]
+        self.assertEqual(len(json.loads(self.client.get(f'/availability?date={day}').data)['slots']), 1)
+        self.assertEqual(json.loads(self.client.get('/reservations').data), [])
+
+        events = [line for line in next(chunks).decode().splitlines() if line.startswith('event: ')]
+        self.assertEqual(events, ['event: created', 'event: cancelled', 'event: created', 'event: cancelled'] * 3)
+        stream.close()
+
+    def test_34_recurring_reservation(self):
+        """Test that a weekly series books the occurrences inside the horizon and keeps the rest."""
+        payload = dict(self._make_reservation("weekly", 1, 9, 60), recurrence={"freq": "weekly", "count": 8})
+        response = self.client.post('/reservations', json=payload)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.data)
+        booked = data['reservations']
+        # Tomorrow plus four more weeks fit in the 30 day horizon
+        self.assertEqual(len(booked), 5)
+        self.assertEqual({r['series_id'] for r in booked}, {data['series']['id']})
+        self.assertEqual(len({r['start_time'][11:] for r in booked}), 1)
+        self.assertEqual(data['series']['next_start'][:10],
+                         (datetime.fromisoformat(booked[0]['start_time']) + timedelta(weeks=5)).date().isoformat())
+        self.assertEqual(self.client.post('/reservations', json=self._make_reservation("x", 8, 9, 30)).status_code, 409)
+
+        # A daily series through an occupied day is rejected as a whole
+        daily = dict(self._make_reservation("daily", 1, 9, 30), recurrence={"freq": "daily", "count": 3})
+        response = self.client.post('/reservations', json=daily)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(json.loads(response.data)['conflicts']), 1)
+        self.assertEqual(self.client.post('/reservations', json=dict(daily, recurrence={"freq": "yearly"})).status_code, 400)
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.count(), 5)
+
+    def test_35_series_expand_as_horizon_advances(self):
+        """Test that occurrences entering the horizon are booked, skipping taken slots."""
+        payload = dict(self._make_reservation("weekly", 1, 9, 60), recurrence={"freq": "weekly", "count": 8})
+        series = json.loads(self.client.post('/reservations', json=payload).data)['series']
+        # Take the sixth week's slot before the horizon reaches it
+        sixth = datetime.fromisoformat(series['start_time']) + timedelta(weeks=5)
+        with self.app.app_context():
+            db.session.add(Reservation(username="early", resource_id='default', start_time=sixth,
+                                       end_time=sixth + timedelta(minutes=30), version=bump_version()))
+            db.session.commit()
+
+        # Stretch the horizon instead of waiting for midnight
+        self.app.config['ADVANCE_BOOKING_LIMIT'] = timedelta(days=60)
+        self.app.extensions.pop('series_expanded_on')
+        listed = json.loads(self.client.get('/reservations').data)
+        self.assertEqual(len([r for r in listed if r['series_id'] == series['id']]), 7)
+        self.client.get('/reservations')  # Already expanded today: nothing more happens
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.count(), 8)
+            stored = db.session.get(RecurringSeries, series['id'])
+            self.assertEqual((stored.expanded, stored.skipped, stored.next_start), (8, 1, None))
+        next_week = self._make_reservation("x", 1 + 7 * 7, 9, 30)
+        self.assertEqual(self.client.post('/reservations', json=next_week).status_code, 409)
+
+    def _store_finished(self, count, days_ago=3):
+        """Insert ``count`` 30-minute reservations that ended days ago, as another worker would."""
+        start = datetime.now(PST).replace(tzinfo=None, second=0, microsecond=0) - timedelta(days=days_ago, hours=count + 1)
+        with self.app.app_context():
+            version = bump_version()
+            db.session.add_all(Reservation(username=f"past{i}", resource_id=f"server-{i % 2}", version=version,
+                                           start_time=start + timedelta(hours=i), end_time=start + timedelta(hours=i, minutes=30))
+                               for i in range(count))
+            db.session.commit()
+
+    def test_36_archive_expired(self):
+        """Test that finished reservations move to the archive in batches and show up in the history."""
+        self.app.config['ARCHIVE_BATCH_SIZE'] = 2
+        self._store_finished(5)
+        upcoming = json.loads(self.client.post('/reservations', json=self._make_reservation("future", 1, 10, 60)).data)
+        self._store_finished(1, days_ago=0)  # Ended less than ARCHIVE_AFTER ago: stays
+        with self.app.app_context():
+            self.assertEqual(len(get_reservation_index()), 7)
+            self.assertEqual(archive_expired(), 5)
+            self.assertEqual(Reservation.query.count(), 2)
+            self.assertEqual(len(get_reservation_index()), 2)
+        self.assertEqual([r['id'] for r in json.loads(self.client.get('/reservations').data)], [upcoming['id']])
+
+        page = json.loads(self.client.get('/reservations/history?limit=3').data)
+        self.assertEqual([r['username'] for r in page['reservations']], ["past0", "past1", "past2"])
+        rest = json.loads(self.client.get(f"/reservations/history?limit=3&after={page['next']}").data)
+        self.assertEqual(([r['username'] for r in rest['reservations']], rest['next']), (["past3", "past4"], None))
+        filtered = json.loads(self.client.get('/reservations/history?resource=server-1').data)['reservations']
+        self.assertEqual([r['username'] for r in filtered], ["past1", "past3"])
+        first_day, last_day = page['reservations'][0]['start_time'][:10], rest['reservations'][-1]['start_time'][:10]
+        self.assertEqual(len(json.loads(self.client.get(f'/reservations/history?from={first_day}&to={last_day}').data)['reservations']), 5)
+        self.assertEqual(self.client.get('/reservations/history?from=yesterday').status_code, 400)
+        self.assertEqual(len(json.loads(self.client.get('/reservations/history?to=9999-12-31').data)['reservations']), 5)
+        self.assertEqual(json.loads(self.client.get('/reservations/history?from=9999-12-31').data)['reservations'], [])
+        self.assertEqual(self.client.get('/reservations/history?after=2026-10-18T10:00:00,99999999999999999999999').status_code, 400)
+
+        # The next run prunes the tombstones left by the first
+        result = self.app.test_cli_runner().invoke(args=['archive'])
+        self.assertIn("Archived 0 reservations", result.output)
+        with self.app.app_context():
+            self.assertEqual(ReservationTombstone.query.count(), 0)
+
+    def test_37_metrics(self):
+        """Test that /metrics reports stage timings and booking counters, and is off by default."""
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+        app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'METRICS_ENABLED': True})
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        payload = self._make_reservation("metrics", 1, 10, 60)
+        self.assertEqual(client.post('/reservations', json=payload).status_code, 201)
+        self.assertEqual(client.post('/reservations', json=payload).status_code, 409)
+        self.assertEqual(client.post('/reservations', json={**payload, "end_time": payload["start_time"]}).status_code, 400)
+        client.get('/reservations')
+
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('reservation_conflicts_total{endpoint="create_reservation"} 1', text)
+        self.assertIn('reservation_rejections_total{rule="end_before_start"} 1', text)
+        self.assertIn('reservation_rows_returned_total{view="all"} 1', text)
+        # Each request counts only the stages it got through
+        for stage, count in {'parse': 3, 'validate': 2, 'lock': 2, 'overlap': 2, 'commit': 1, 'publish': 1}.items():
+            self.assertIn(f'reservation_stage_duration_seconds_count{{endpoint="create_reservation",stage="{stage}"}} {count}', text)
+        self.assertIn('reservation_stage_duration_seconds_count{endpoint="get_reservations",stage="query"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="create_reservation",method="POST",status="201"} 1', text)
+
+    def test_38_core_listing_matches_orm_listing(self):
+        """Test that listings from Core row tuples are byte-identical to the ORM and to_dict() path."""
+        for day, hour in ((1, 9), (1, 11), (2, 10)):
+            self.client.post('/reservations', json={**self._make_reservation(f"user{hour}", day, hour, 60),
+                                                    "resource_id": f"server-{hour}"})
+        orm_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                              'CORE_LISTING_ROUTES': ()})
+        core_app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                               'JSON_ENCODER': 'json'})
+        with self.app.app_context():
+            rows = [r.to_dict() for r in Reservation.query.all()]
+        for app in (orm_app, core_app):
+            with app.app_context():
+                db.create_all()
+                for row in rows:
+                    db.session.add(Reservation(**{**row, 'start_time': datetime.fromisoformat(row['start_time']),
+                                                  'end_time': datetime.fromisoformat(row['end_time'])}))
+                db.session.commit()
+        for query in ('', '?limit=2', '?view=day', '?format=ndjson', '?format=ndjson&limit=2'):
+            orm = orm_app.test_client().get(f'/reservations{query}')
+            core = core_app.test_client().get(f'/reservations{query}')
+            self.assertEqual(core.data, orm.data, query)
+            self.assertEqual(core.content_type, orm.content_type)
+            self.assertEqual(core.headers['ETag'], orm.headers['ETag'])
+        page = json.loads(core_app.test_client().get('/reservations?limit=2').data)
+        self.assertEqual([r['username'] for r in page['reservations']], ['user9', 'user11'])
+        self.assertEqual(json.loads(core_app.test_client().get(f"/reservations?limit=2&after={page['next']}").data)
+                         ['reservations'][0]['username'], 'user10')
+
+    def test_39_compressed_listing(self):
+        """Test gzip negotiation for listings and the cache of compressed bodies."""
+        for hour in range(8, 20):
+            self.client.post('/reservations', json={**self._make_reservation(f"gzipuser{hour}", 1, hour, 60),
+                                                    "resource_id": "server-1"})
+        plain = self.client.get('/reservations')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        compressed = self.client.get('/reservations', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data))
+        self.assertEqual(compressed.headers['ETag'], plain.headers['ETag'])
+        cache = self.app.extensions['response_cache']
+        self.assertEqual(len(cache._entries), 2)
+        # A repeated poll is served from the compressed copy
+        self.assertEqual(self.client.get('/reservations', headers={'Accept-Encoding': 'gzip'}).data, compressed.data)
+        self.assertEqual(len(cache._entries), 2)
+
+        page = self.client.get('/reservations?limit=10', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(page.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(page.data))['reservations']), 10)
+        # Too small to be worth compressing, or refused by the client
+        self.assertNotIn('Content-Encoding', self.client.get('/reservations?limit=1', headers={'Accept-Encoding': 'gzip'}).headers)
+        self.assertNotIn('Content-Encoding', self.client.get('/reservations', headers={'Accept-Encoding': 'gzip;q=0'}).headers)
+
+        app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'RESPONSE_ENCODINGS': ()})
+        with app.app_context():
+            db.create_all()
+        response = app.test_client().get('/reservations', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+
+    def test_40_columnar_listing(self):
+        """Test that ?format=columnar lists the same reservations as parallel arrays."""
+        for day, hour, username in ((1, 9, "col_a"), (1, 11, "col_b"), (2, 10, "col_a")):
+            self.client.post('/reservations', json=self._make_reservation(username, day, hour, 60))
+        listed = json.loads(self.client.get('/reservations').data)
+        response = self.client.get('/reservations?format=columnar', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.content_type, 'application/json')
+        columns = json.loads(response.data)
+        self.assertEqual(columns['count'], 3)
+        self.assertIsNone(columns['next'])
+        self.assertEqual(columns['username']['dictionary'], ["col_a", "col_b"])
+        rows = [{'id': columns['id'][i],
+                 'username': columns['username']['dictionary'][columns['username']['codes'][i]],
+                 'resource_id': columns['resource_id']['dictionary'][columns['resource_id']['codes'][i]],
+                 'start_time': datetime.fromtimestamp(columns['start_time'][i], PST).replace(tzinfo=None).isoformat(),
+                 'end_time': datetime.fromtimestamp(columns['end_time'][i], PST).replace(tzinfo=None).isoformat(),
+                 'series_id': columns['series_id'][i]}
+                for i in range(columns['count'])]
+        self.assertEqual(rows, listed)
+
+        # Cached apart from the JSON listing
+        cache = self.app.extensions['response_cache']
+        self.assertEqual(len(cache._entries), 2)
+        self.assertEqual(self.client.get('/reservations?format=columnar').data, response.data)
+        self.assertNotEqual(self.client.get('/reservations?format=columnar').headers['ETag'],
+                            self.client.get('/reservations').headers['ETag'])
+
+        page = json.loads(self.client.get('/reservations?format=columnar&limit=2').data)
+        self.assertEqual(page['id'], columns['id'][:2])
+        rest = json.loads(self.client.get(f"/reservations?format=columnar&limit=2&after={page['next']}").data)
+        self.assertEqual(rest['id'], columns['id'][2:])
+        self.assertIsNone(rest['next'])
+
+    def test_41_archive_reused_id(self):
+        """Test that a reservation id SQLite reuses after archival can be archived again."""
+        self._store_finished(1)
+        with self.app.app_context():
+            self.assertEqual(archive_expired(), 1)
+        self._store_finished(1)
+        with self.app.app_context():
+            self.assertEqual(Reservation.query.one().id, 1)
+            self.assertEqual(archive_expired(), 1)
+        history = json.loads(self.client.get('/reservations/history').data)['reservations']
+        self.assertEqual([r['id'] for r in history], [1, 1])
+
+        # Equal start and id on a page boundary: pages follow archive_id
+        with self.app.app_context():
+            start = datetime(2020, 1, 1, 9)
+            db.session.add_all(ArchivedReservation(id=5, username=f"twin{i}", resource_id='default', start_time=start,
+                                                   end_time=start + timedelta(hours=1)) for i in range(2))
+            db.session.commit()
+        for core_routes in (('get_history',), ()):
+            self.app.config['CORE_LISTING_ROUTES'] = core_routes
+            page = json.loads(self.client.get('/reservations/history?limit=1').data)
+            rest = json.loads(self.client.get(f"/reservations/history?limit=1&after={page['next']}").data)
+            self.assertEqual([r['username'] for r in page['reservations'] + rest['reservations']], ["twin0", "twin1"])
+            self.assertTrue(page['next'].startswith("2020-01-01T09:00:00,"))
+
+    def test_42_upgrade_schema_adds_archive_key(self):
+        """Test that an archive keyed by reservation id is rebuilt with its own key."""
+        with self.app.app_context():
+            db.session.execute(db.text("DROP TABLE archived_reservation"))
+            db.session.execute(db.text(
+                "CREATE TABLE archived_reservation (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL, "
+                "resource_id VARCHAR(64) NOT NULL, start_time BIGINT NOT NULL, end_time BIGINT NOT NULL, "
+                "series_id INTEGER)"))
+            db.session.execute(db.text("CREATE INDEX ix_archived_reservation_start ON archived_reservation (start_time)"))
+            db.session.execute(db.text(
+                "INSERT INTO archived_reservation VALUES (7, 'old', 'default', 1893517200, 1893520800, NULL)"))
+            db.session.commit()
+            upgrade_schema()
+            upgrade_schema()  # Already rebuilt: nothing changes
+            archived = ArchivedReservation.query.one()
+            self.assertEqual((archived.archive_id, archived.id, archived.username), (1, 7, 'old'))
+            names = {ix['name'] for ix in db.inspect(db.engine).get_indexes('archived_reservation')}
+        self.assertEqual(names, {'ix_archived_reservation_resource_start', 'ix_archived_reservation_start',
+                                 'ix_archived_reservation_id'})
+
+    def test_43_cache_failure_does_not_fail_writes(self):
+        """Test that a response cache error after commit leaves the write successful."""
+        class BrokenCache:
+            def get(self, key):
+                return None
+
+            def set(self, key, value, ttl):
+                pass
+
+            def invalidate(self):
+                raise ConnectionError("cache unreachable")
+
+        self.app.extensions['response_cache'] = BrokenCache()
+        with self.assertLogs(self.app.logger, 'WARNING'):
+            response = self.client.post('/reservations', json=self._make_reservation("cacheless", 1, 10, 60))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(json.loads(self.client.get('/reservations').data)), 1)
+
+    def test_44_dst_gap_conflicts(self):
+        """Test that times skipped when DST starts conflict with the hour they are stored as."""
+        today = datetime.now(PST).date()
+        # Second Sunday of March, this year or next
+        year = today.year if today < datetime(today.year, 3, 8).date() else today.year + 1
+        march_8 = datetime(year, 3, 8)
+        gap_day = (march_8 + timedelta(days=(6 - march_8.weekday()) % 7)).date().isoformat()
+        existing = {"username": "gap_a", "start_time": f"{gap_day} 03:00", "end_time": f"{gap_day} 03:30"}
+        in_gap = {"username": "gap_b", "start_time": f"{gap_day} 02:15", "end_time": f"{gap_day} 02:45"}
+        for mode in ('index', 'bitmap', 'query'):
+            app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                              'CONFLICT_CHECK': mode, 'ADVANCE_BOOKING_LIMIT': timedelta(days=400)})
+            client = app.test_client()
+            with app.app_context():
+                db.create_all()
+            self.assertEqual(client.post('/reservations', json=existing).status_code, 201, mode)
+            # 02:15-02:45 is stored as 03:15-03:45 PDT
+            self.assertEqual(client.post('/reservations', json=in_gap).status_code, 409, mode)
+            results = json.loads(client.post('/reservations/batch', json=[in_gap]).data)['results']
+            self.assertEqual([r['status'] for r in results], [409], mode)
+            # Within one batch too
+            later = {"username": "gap_c", "start_time": f"{gap_day} 04:00", "end_time": f"{gap_day} 04:30"}
+            batch = [{**later, "start_time": f"{gap_day} 02:30", "end_time": f"{gap_day} 02:45"},
+                     {**later, "start_time": f"{gap_day} 03:35", "end_time": f"{gap_day} 04:00"}]
+            results = json.loads(client.post('/reservations/batch', json=batch).data)['results']
+            self.assertEqual([r['status'] for r in results], [201, 409], mode)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,197 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+try:
+    import aiosqlite  # noqa: F401
+    from asgi import ReservationASGI
+except ImportError:  # Async serving extras not installed
+    ReservationASGI = None
+
+from app import create_app, db, PST
+from metrics import Metrics
+
+
+@unittest.skipIf(ReservationASGI is None, "asgiref/aiosqlite not installed")
+class ASGITestCase(unittest.TestCase):
+    def setUp(self):
+        # The async engine opens its own connections, so use a database file
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp.name, 'asgi.db')}",
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def _payload(self, username, days, hour):
+        start = (datetime.now(PST) + timedelta(days=days)).replace(hour=hour, minute=0, second=0, microsecond=0)
+        return {
+            "username": username,
+            "start_time": start.strftime('%Y-%m-%d %H:%M:%S'),
+            "end_time": (start + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def _run(self, requests):
+        """Send (method, path, headers, body) requests through one ASGI app and
+        return (status, headers, body) for each."""
+        async def call(application, method, path, headers, body):
+            path, _, query = path.partition('?')
+            scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+                     'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                     'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+                     'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            sent = []
+
+            async def receive():
+                return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            await application(scope, receive, send)
+            start = sent[0]
+            response_headers = {k.decode(): v.decode() for k, v in start['headers']}
+            return start['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+        async def main():
+            application = ReservationASGI(self.app)
+            try:
+                return [await call(application, *request) for request in requests]
+            finally:
+                await application.dispose()
+
+        return asyncio.run(main())
+
+    def test_listing_matches_wsgi_route(self):
+        """Test that the async listing returns the same body and ETag as the Flask route."""
+        for days, hour in [(1, 10), (2, 9)]:
+            self.client.post('/reservations', json=self._payload("asgiuser", days, hour))
+        queries = ['/reservations', '/reservations?view=week', '/reservations?limit=1',
+                   '/reservations?resource=default', '/reservations?format=columnar',
+                   '/reservations?format=columnar&limit=1']
+        results = self._run([('GET', q, {}, b'') for q in queries])
+        for query, (status, headers, body) in zip(queries, results):
+            expected = self.client.get(query)
+            self.assertEqual(status, 200, query)
+            self.assertEqual(body, expected.data, query)
+            self.assertEqual(headers['etag'], expected.headers['ETag'], query)
+            self.assertEqual(headers['cache-control'], 'no-cache')
+
+    def test_conditional_get_and_errors(self):
+        """Test 304 revalidation, NDJSON streaming and parameter errors."""
+        self.client.post('/reservations', json=self._payload("asgiuser", 1, 10))
+        etag = self.client.get('/reservations').headers['ETag']
+        (not_modified, _, body), (ndjson, headers, lines), (bad, _, error) = self._run([
+            ('GET', '/reservations', {'If-None-Match': etag}, b''),
+            ('GET', '/reservations', {'Accept': 'application/x-ndjson'}, b''),
+            ('GET', '/reservations?limit=0', {}, b''),
+        ])
+        self.assertEqual((not_modified, body), (304, b''))
+        self.assertEqual(ndjson, 200)
+        self.assertEqual(headers['content-type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['username'] for line in lines.splitlines()], ["asgiuser"])
+        self.assertEqual(bad, 400)
+        self.assertIn('limit', json.loads(error)['error'])
+
+    def test_other_routes_use_flask(self):
+        """Test that writes are passed through to the Flask app."""
+        payload = json.dumps(self._payload("asgiwriter", 1, 11)).encode()
+        (created, _, body), (listed, _, listing) = self._run([
+            ('POST', '/reservations', {'Content-Type': 'application/json',
+                                       'Content-Length': str(len(payload))}, payload),
+            ('GET', '/reservations', {}, b''),
+        ])
+        self.assertEqual((created, listed), (201, 200))
+        self.assertEqual(json.loads(body)['username'], "asgiwriter")
+        self.assertEqual([r['username'] for r in json.loads(listing)], ["asgiwriter"])
+
+    def test_compressed_listing_matches_wsgi_route(self):
+        """Test that the async listing negotiates gzip like the Flask route."""
+        for hour in range(8, 20):
+            self.client.post('/reservations', json=self._payload(f"asgiuser{hour}", 1, hour))
+        gzipped = {'Accept-Encoding': 'gzip'}
+        queries = ['/reservations', '/reservations', '/reservations?limit=10']
+        results = self._run([('GET', q, gzipped, b'') for q in queries])
+        for query, (status, headers, body) in zip(queries, results):
+            expected = self.client.get(query, headers=gzipped)
+            self.assertEqual(status, 200, query)
+            self.assertEqual(headers['content-encoding'], 'gzip', query)
+            self.assertEqual(headers['vary'], 'Accept-Encoding')
+            self.assertEqual(gzip.decompress(body), gzip.decompress(expected.data), query)
+
+    def test_native_listing_expands_series(self):
+        """Test that the async listing books occurrences that entered the horizon, as Flask routes do."""
+        payload = dict(self._payload("weekly", 1, 9), recurrence={"freq": "weekly", "count": 8})
+        series_id = json.loads(self.client.post('/reservations', json=payload).data)['series']['id']
+        # Stretch the horizon instead of waiting for midnight
+        self.app.config['ADVANCE_BOOKING_LIMIT'] = timedelta(days=60)
+        self.app.extensions.pop('series_expanded_on')
+        (status, _, body), = self._run([('GET', '/reservations', {}, b'')])
+        self.assertEqual(status, 200)
+        self.assertEqual(len([r for r in json.loads(body) if r['series_id'] == series_id]), 8)
+
+    def test_metrics_cover_native_listing(self):
+        """Test that the async listing records into the registry served by /metrics."""
+        self.app.extensions['metrics'] = Metrics()
+        self.client.post('/reservations', json=self._payload("asgiuser", 1, 10))
+        (listed, _, _), (scraped, _, text) = self._run([
+            ('GET', '/reservations', {}, b''),
+            ('GET', '/metrics', {}, b''),
+        ])
+        self.assertEqual((listed, scraped), (200, 200))
+        text = text.decode()
+        self.assertIn('reservation_rows_returned_total{view="all"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="get_reservations",method="GET",status="200"} 1', text)
+
+    def test_event_stream(self):
+        """Test that the async stream delivers writes made through Flask and ends on disconnect."""
+        async def main():
+            application = ReservationASGI(self.app)
+            scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                     'path': '/reservations/stream', 'raw_path': b'/reservations/stream', 'query_string': b'',
+                     'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234), 'headers': []}
+            disconnected = asyncio.Event()
+            sent = []
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            stream = asyncio.ensure_future(application(scope, receive, send))
+            await asyncio.sleep(0.05)
+            # Written from another thread, as the WSGI adapter would
+            await asyncio.to_thread(self.client.post, '/reservations', json=self._payload("subscriber", 1, 10))
+            for _ in range(100):
+                if any(b'event: created' in m.get('body', b'') for m in sent):
+                    break
+                await asyncio.sleep(0.01)
+            disconnected.set()
+            await asyncio.wait_for(stream, 5)
+            return sent
+
+        sent = asyncio.run(main())
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        body = b''.join(m.get('body', b'') for m in sent[1:]).decode()
+        data = [line[len('data: '):] for line in body.splitlines() if line.startswith('data: ')]
+        self.assertEqual([json.loads(d)['username'] for d in data], ["subscriber"])
+
+
+if __name__ == '__main__':
+    unittest.main()
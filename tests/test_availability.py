@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime, timedelta
+
+from availability import free_windows, parse_granularity
+
+
+class FreeWindowsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.day_start = datetime(2030, 1, 1)
+        self.day_end = self.day_start + timedelta(days=1)
+        self.step = timedelta(minutes=15)
+        self.min_duration = timedelta(minutes=15)
+
+    def _at(self, hour, minute=0):
+        return self.day_start + timedelta(hours=hour, minutes=minute)
+
+    def test_empty_day_is_one_window(self):
+        windows = free_windows([], self.day_start, self.day_end, self.step, self.min_duration)
+        self.assertEqual(windows, [(self.day_start, self.day_end)])
+
+    def test_gaps_between_reservations(self):
+        busy = [(self._at(9), self._at(10)), (self._at(10), self._at(11)), (self._at(14), self._at(15))]
+        windows = free_windows(busy, self.day_start, self.day_end, self.step, self.min_duration)
+        self.assertEqual(windows, [(self.day_start, self._at(9)),
+                                   (self._at(11), self._at(14)),
+                                   (self._at(15), self.day_end)])
+
+    def test_windows_are_grid_aligned_and_long_enough(self):
+        # 10:05-10:20 leaves 10:30 as the first aligned start after it, and the
+        # 10:45-10:50 sliver before the next booking is too short to keep.
+        busy = [(self.day_start, self._at(10, 5)), (self._at(10, 20), self._at(10, 25)),
+                (self._at(10, 50), self.day_end)]
+        windows = free_windows(busy, self.day_start, self.day_end, self.step, self.min_duration)
+        self.assertEqual(windows, [(self._at(10, 30), self._at(10, 45))])
+
+    def test_earliest_and_reservations_crossing_midnight(self):
+        busy = [(self.day_start - timedelta(hours=1), self._at(1)), (self._at(23), self.day_end + timedelta(hours=1))]
+        windows = free_windows(busy, self.day_start, self.day_end, self.step, self.min_duration,
+                               earliest=self._at(12, 1))
+        self.assertEqual(windows, [(self._at(12, 15), self._at(23))])
+
+
+class ParseGranularityTestCase(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(parse_granularity('15m'), timedelta(minutes=15))
+        self.assertEqual(parse_granularity('1h'), timedelta(hours=1))
+        self.assertEqual(parse_granularity('30'), timedelta(minutes=30))
+        for bad in ['', 'abc', '0m', '25h', '-5m']:
+            with self.assertRaises(ValueError):
+                parse_granularity(bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import gzip
+import unittest
+from unittest import mock
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+import compression
+from compression import Compressor, create_compressor
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+class CompressionTestCase(unittest.TestCase):
+    def test_negotiate(self):
+        compressor = Compressor(('br', 'gzip'))
+        self.assertIsNone(compressor.negotiate(accept(None)))
+        self.assertIsNone(compressor.negotiate(accept('identity, deflate')))
+        self.assertEqual(compressor.negotiate(accept('gzip, deflate, br')), 'br')
+        self.assertEqual(compressor.negotiate(accept('br;q=0.5, gzip')), 'gzip')
+        self.assertEqual(compressor.negotiate(accept('br;q=0, *')), 'gzip')
+        self.assertEqual(compressor.negotiate(accept('*')), 'br')
+        self.assertIsNone(Compressor(()).negotiate(accept('gzip')))
+
+    def test_compress(self):
+        compressor = Compressor(('gzip',), min_size=100)
+        body = b'[' + b'{"start_time":"2030-06-12T09:00:00"},' * 20 + b'{}]\n'
+        compressed, encoding = compressor.compress(body, 'gzip')
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.decompress(compressed), body)
+        # Deterministic, so compressed bodies can be cached and shared
+        self.assertEqual(compressor.compress(body, 'gzip')[0], compressed)
+        self.assertEqual(compressor.compress(b'[]\n', 'gzip'), (b'[]\n', None))
+        self.assertEqual(compressor.compress(body, None), (body, None))
+
+    def test_create_compressor(self):
+        self.assertEqual(create_compressor(['gzip']).encodings, ('gzip',))
+        self.assertEqual(create_compressor(()).encodings, ())
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(create_compressor(None).encodings, ('gzip',))
+            with self.assertRaises(RuntimeError):
+                create_compressor(('br', 'gzip'))
+        with self.assertRaises(ValueError):
+            create_compressor(('deflate',))
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        body = b'{"username":"alice"}' * 100
+        compressed, encoding = create_compressor(None, min_size=0).compress(body, 'br')
+        self.assertEqual(encoding, 'br')
+        self.assertEqual(compression.brotli.decompress(compressed), body)
+
+
+if __name__ == '__main__':
+    unittest.main()
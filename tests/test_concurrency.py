@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from app import create_app, db, Reservation, PST, archive_expired, get_reservation_index
+from models import bump_version
+
+# Worker processes and candidate slots posted by each of them. Every worker
+# posts every candidate, so each slot is contested WORKERS times on top of
+# overlapping its neighbours.
+WORKERS = int(os.environ.get('STRESS_WORKERS', 4))
+CANDIDATES = int(os.environ.get('STRESS_CANDIDATES', 300))
+
+
+def _post_all(app, payloads, results):
+    """Worker process body: POST every payload through its own client."""
+    with app.app_context():
+        # Connections inherited from the parent must not be shared after fork
+        db.engine.dispose(close=False)
+    client = app.test_client()
+    statuses = [client.post('/reservations', json=payload).status_code for payload in payloads]
+    results.put(statuses)
+
+
+class ConcurrentReservationTestCase(unittest.TestCase):
+    def setUp(self):
+        # Worker processes need a database file they can all open
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp.name, 'stress.db')}",
+        })
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def _candidates(self):
+        """Overlapping slots every 5 minutes lasting 15-60 minutes, starting tomorrow."""
+        rng = random.Random(42)
+        base = (datetime.now(PST) + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        payloads = []
+        for i in range(CANDIDATES):
+            start = base + timedelta(minutes=5 * i)
+            end = start + timedelta(minutes=rng.choice([15, 30, 45, 60]))
+            payloads.append({
+                "username": f"stress{i}",
+                "start_time": start.strftime('%Y-%m-%d %H:%M:%S'),
+                "end_time": end.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+        return payloads
+
+    def test_colliding_posts_from_many_processes(self):
+        """Test that racing POSTs from several processes never double-book a slot."""
+        candidates = self._candidates()
+        ctx = multiprocessing.get_context('fork')
+        results = ctx.Queue()
+        workers = []
+        for seed in range(WORKERS):
+            payloads = candidates[:]
+            random.Random(seed).shuffle(payloads)
+            workers.append(ctx.Process(target=_post_all, args=(self.app, payloads, results)))
+        for worker in workers:
+            worker.start()
+        statuses = [status for _ in workers for status in results.get(timeout=300)]
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(statuses), WORKERS * CANDIDATES)
+        self.assertLessEqual(set(statuses), {201, 409})
+        with self.app.app_context():
+            self.assertEqual(statuses.count(201), Reservation.query.count())
+            overlaps = db.session.execute(db.text(
+                "SELECT COUNT(*) FROM reservation a JOIN reservation b "
+                "ON a.id < b.id AND a.start_time < b.end_time AND a.end_time > b.start_time"
+            )).scalar()
+        self.assertEqual(overlaps, 0)
+
+    def test_other_worker_catches_up_with_updates_and_deletes(self):
+        """Test that a second app on the same database sees moves and cancellations."""
+        other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI'],
+                            'CONFLICT_CHECK': 'bitmap'})
+        client, other_client = self.app.test_client(), other.test_client()
+        first, second, third = self._candidates()[0:36:12]  # Three disjoint slots
+        created = client.post('/reservations', json=first).get_json()
+        doomed = client.post('/reservations', json=second).get_json()
+        self.assertEqual(other_client.post('/reservations', json=first).status_code, 409)
+
+        self.assertEqual(client.patch(f"/reservations/{created['id']}", json=third).status_code, 200)
+        self.assertEqual(client.delete(f"/reservations/{doomed['id']}").status_code, 204)
+        self.assertEqual(other_client.post('/reservations', json=third).status_code, 409)
+        self.assertEqual(other_client.post('/reservations', json=first).status_code, 201)
+        self.assertEqual(other_client.post('/reservations', json=second).status_code, 201)
+        with other.app_context():
+            self.assertEqual(len(other.extensions['reservation_index']), 3)
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_worker_behind_pruned_tombstones_reloads(self):
+        """Test that a worker that slept through two archival runs rebuilds its index."""
+        other = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI']})
+        finished = datetime.now(PST).replace(tzinfo=None) - timedelta(days=3)
+        with self.app.app_context():
+            version = bump_version()
+            db.session.add(Reservation(username="old", start_time=finished, end_time=finished + timedelta(hours=1),
+                                       version=version))
+            db.session.commit()
+        with other.app_context():
+            self.assertEqual(len(get_reservation_index()), 1)
+        client = self.app.test_client()
+        upcoming = self._candidates()[0]
+        self.assertEqual(client.post('/reservations', json=upcoming).status_code, 201)
+        with self.app.app_context():
+            self.assertEqual(archive_expired(), 1)
+            archive_expired()  # Prunes the first run's tombstones
+        with other.app_context():
+            indexes = get_reservation_index()
+            self.assertEqual(len(indexes), 1)
+            db.session.remove()
+            db.engine.dispose()
+        self.assertEqual(other.test_client().post('/reservations', json=upcoming).status_code, 409)
+
+
+if __name__ == '__main__':
+    unittest.main()
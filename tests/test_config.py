@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from app import create_app
+from models import db
+
+
+class ConfigLoadingTestCase(unittest.TestCase):
+    def test_defaults(self):
+        app = create_app()
+        self.assertEqual(app.config['MAX_RESERVATION_DURATION'], timedelta(hours=4))
+        self.assertEqual(app.config['CONFLICT_CHECK'], 'index')
+
+    def test_settings_file_environment_and_overrides(self):
+        """Test that later sources win: file, then environment, then arguments."""
+        with tempfile.TemporaryDirectory() as tmp:
+            settings = os.path.join(tmp, 'settings.py')
+            with open(settings, 'w') as f:
+                f.write("MAX_PAGE_SIZE = 50\nDEFAULT_PAGE_SIZE = 10\nRESPONSE_CACHE_SIZE = 8\n")
+            env = {
+                'RESERVATIONS_SETTINGS': settings,
+                'RESERVATIONS_DEFAULT_PAGE_SIZE': '20',
+                'RESERVATIONS_RESPONSE_CACHE_URL': 'null',
+                'RESERVATIONS_MAX_RESERVATION_DURATION': '120',
+                'RESERVATIONS_ADVANCE_BOOKING_LIMIT': '7',
+                'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'env.db')}",
+            }
+            with mock.patch.dict(os.environ, env):
+                app = create_app({'RESPONSE_CACHE_SIZE': 16})
+        self.assertEqual(app.config['MAX_PAGE_SIZE'], 50)
+        self.assertEqual(app.config['DEFAULT_PAGE_SIZE'], 20)
+        self.assertEqual(app.config['RESPONSE_CACHE_SIZE'], 16)
+        self.assertIsNone(app.config['RESPONSE_CACHE_URL'])
+        self.assertEqual(app.config['MAX_RESERVATION_DURATION'], timedelta(minutes=120))
+        self.assertEqual(app.config['ADVANCE_BOOKING_LIMIT'], timedelta(days=7))
+        self.assertTrue(app.config['SQLALCHEMY_DATABASE_URI'].endswith('env.db'))
+
+    def test_limits_apply_per_app(self):
+        """Test that two apps in one process enforce their own booking rules."""
+        strict = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'MAX_RESERVATION_DURATION': 60})
+        with strict.app_context():
+            db.create_all()
+        payload = {"username": "u", "start_time": "2999-01-01 10:00", "end_time": "2999-01-01 12:00"}
+        response = strict.test_client().post('/reservations', json=payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Maximum reservation duration is 1.0 hours", response.get_json()['error'])
+
+    def test_invalid_duration(self):
+        with self.assertRaises(ValueError):
+            create_app({'MIN_RESERVATION_DURATION': '15m'})
+
+
+if __name__ == '__main__':
+    unittest.main()
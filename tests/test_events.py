@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import unittest
+
+from events import EventBroker, Subscription
+
+
+class EventBrokerTestCase(unittest.TestCase):
+    def test_subscription_receives_events_after_it_opened(self):
+        broker = EventBroker()
+        broker.publish('created', [('a', '{"id": 1}')])
+        subscription = Subscription(broker)
+        self.assertEqual(subscription.pending(), b'')
+        broker.publish('created', [('a', '{"id": 2}'), ('b', '{"id": 3}')])
+        frames = subscription.pending().decode().split('\n\n')[:-1]
+        self.assertEqual(frames, [f'id: {broker.stream_id}:2\nevent: created\ndata: {{"id": 2}}',
+                                  f'id: {broker.stream_id}:3\nevent: created\ndata: {{"id": 3}}'])
+        self.assertEqual(subscription.pending(), b'')
+
+    def test_resource_filter(self):
+        broker = EventBroker()
+        subscription = Subscription(broker, ['b'])
+        broker.publish('created', [('a', '1'), ('b', '2')])
+        self.assertEqual(subscription.pending(), f'id: {broker.stream_id}:2\nevent: created\ndata: 2\n\n'.encode())
+
+    def test_resume_and_reset(self):
+        """Test that Last-Event-ID resumes within the history and resets outside it."""
+        broker = EventBroker(history_size=2)
+        broker.publish('created', [('a', '1'), ('a', '2'), ('a', '3')])
+        resumed = Subscription(broker, last_event_id=f'{broker.stream_id}:1')
+        self.assertIn(b'data: 2', resumed.pending())
+
+        for last_event_id in (f'{broker.stream_id}:0', 'otherstream:3', 'garbage'):
+            subscription = Subscription(broker, last_event_id=last_event_id)
+            self.assertIn(b'event: reset', subscription.pending())
+            self.assertEqual(subscription.cursor, 3)
+            self.assertEqual(subscription.pending(), b'')
+
+    def test_wait(self):
+        broker = EventBroker()
+        self.assertFalse(broker.wait(0, 0.01))
+        timer = threading.Timer(0.05, broker.publish, ('created', [('a', '1')]))
+        timer.start()
+        self.assertTrue(broker.wait(0, 5))
+        timer.join()
+
+    def test_wait_async_wakes_every_subscriber(self):
+        """Test that one publish from another thread wakes all coroutines waiting on the loop."""
+        broker = EventBroker()
+
+        async def main():
+            waiters = [asyncio.ensure_future(broker.wait_async(0, 5)) for _ in range(100)]
+            await asyncio.sleep(0)
+            threading.Thread(target=broker.publish, args=('created', [('a', '1')])).start()
+            results = await asyncio.gather(*waiters)
+            timed_out = await broker.wait_async(1, 0.01)
+            return results, timed_out
+
+        results, timed_out = asyncio.run(main())
+        self.assertEqual(results, [True] * 100)
+        self.assertFalse(timed_out)
+
+
+if __name__ == '__main__':
+    unittest.main()
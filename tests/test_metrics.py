@@ -0,0 +1,51 @@
+import unittest
+
+from metrics import NULL_METRICS, NULL_TIMER, Metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.01, 0.1))
+
+    def test_counters_render_per_label_set(self):
+        self.metrics.inc('reservation_conflicts_total', endpoint='create_reservation')
+        self.metrics.inc('reservation_conflicts_total', endpoint='create_reservation')
+        self.metrics.inc('reservation_rows_returned_total', 5, view='all')
+        text = self.metrics.render()
+        self.assertIn('# TYPE reservation_conflicts_total counter', text)
+        self.assertIn('reservation_conflicts_total{endpoint="create_reservation"} 2', text)
+        self.assertIn('reservation_rows_returned_total{view="all"} 5', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.005, 0.01, 0.05, 3.0):
+            self.metrics.observe('reservation_stage_duration_seconds', value, stage='query')
+        lines = self.metrics.render().splitlines()
+        self.assertIn('reservation_stage_duration_seconds_bucket{stage="query",le="0.01"} 2', lines)
+        self.assertIn('reservation_stage_duration_seconds_bucket{stage="query",le="0.1"} 3', lines)
+        self.assertIn('reservation_stage_duration_seconds_bucket{stage="query",le="+Inf"} 4', lines)
+        self.assertIn('reservation_stage_duration_seconds_count{stage="query"} 4', lines)
+        self.assertIn('reservation_stage_duration_seconds_sum{stage="query"} 3.065', lines)
+
+    def test_timer_records_each_stage(self):
+        timer = self.metrics.timer(endpoint='create_reservation')
+        timer.mark('parse')
+        timer.mark('commit')
+        text = self.metrics.render()
+        for stage in ('parse', 'commit'):
+            self.assertIn(f'reservation_stage_duration_seconds_count{{endpoint="create_reservation",stage="{stage}"}} 1',
+                          text)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.inc('reservation_rejections_total', rule='a"b\\c')
+        self.assertIn(r'reservation_rejections_total{rule="a\"b\\c"} 1', self.metrics.render())
+
+    def test_null_metrics_record_nothing(self):
+        self.assertFalse(NULL_METRICS.enabled)
+        NULL_METRICS.inc('reservation_conflicts_total')
+        NULL_METRICS.observe('http_request_duration_seconds', 1.0)
+        self.assertIs(NULL_METRICS.timer(endpoint='x'), NULL_TIMER)
+        NULL_TIMER.mark('parse')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime, timedelta
+
+from occupancy import SlotOccupancy
+
+
+class SlotOccupancyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.origin = datetime(2030, 1, 1)
+        self.slot = timedelta(minutes=15)
+        self.occupancy = SlotOccupancy(self.origin, self.slot, 96 * 2)
+        self.exact_calls = []
+
+    def _at(self, hour, minute=0):
+        return self.origin + timedelta(hours=hour, minutes=minute)
+
+    def _exact(self, result):
+        def exact(start, end):
+            self.exact_calls.append((start, end))
+            return result
+        return exact
+
+    def test_full_slots_conflict_without_exact_check(self):
+        self.occupancy.add(self._at(10), self._at(11))
+        self.assertTrue(self.occupancy.overlaps(self._at(10, 30), self._at(12), self._exact(False)))
+        self.assertFalse(self.occupancy.overlaps(self._at(11), self._at(12), self._exact(True)))
+        self.assertFalse(self.occupancy.overlaps(self._at(9), self._at(10), self._exact(True)))
+        self.assertEqual(self.exact_calls, [])
+
+    def test_partial_slots_defer_to_exact_check(self):
+        self.occupancy.add(self._at(10, 5), self._at(10, 25))
+        self.assertFalse(self.occupancy.overlaps(self._at(10, 25), self._at(11), self._exact(False)))
+        self.assertEqual(self.exact_calls, [(self._at(10, 25), self._at(11))])
+
+    def test_outside_horizon_defers_to_exact_check(self):
+        self.assertTrue(self.occupancy.overlaps(self._at(47), self._at(49), self._exact(True)))
+        self.assertEqual(len(self.exact_calls), 1)
+
+    def test_remove_frees_slots(self):
+        self.occupancy.add(self._at(10), self._at(11))
+        self.occupancy.add(self._at(10, 30), self._at(10, 40))
+        self.occupancy.remove(self._at(10), self._at(11))
+        self.assertFalse(self.occupancy.overlaps(self._at(10), self._at(10, 15), self._exact(True)))
+        self.assertEqual(self.occupancy.busy_intervals(self._at(0), self._at(24)),
+                         [(self._at(10, 30), self._at(10, 45))])
+
+    def test_busy_intervals_coalesce_touched_slots(self):
+        self.occupancy.extend([(self._at(10), self._at(11)), (self._at(11), self._at(11, 20)),
+                               (self._at(14, 50), self._at(15))])
+        self.assertEqual(self.occupancy.busy_intervals(self._at(0), self._at(24)),
+                         [(self._at(10), self._at(11, 30)), (self._at(14, 45), self._at(15))])
+        self.assertEqual(self.occupancy.busy_intervals(self._at(10, 15), self._at(10, 45)),
+                         [(self._at(10, 15), self._at(10, 45))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from recurrence import Recurrence, conflicts, occurrence_count, occurrences, parse_recurrence
+
+
+class RecurrenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime(2030, 3, 4, 9, 0)  # A Monday
+        self.end = self.start + timedelta(hours=1)
+
+    def test_parse_recurrence(self):
+        self.assertEqual(parse_recurrence({"freq": "weekly", "count": 4}, 10), Recurrence('weekly', 1, 4, None))
+        self.assertEqual(parse_recurrence({"freq": "daily", "interval": 2, "until": "2030-04-01"}, 10),
+                         Recurrence('daily', 2, None, date(2030, 4, 1)))
+        for bad in [None, {}, {"freq": "monthly", "count": 2}, {"freq": "daily"},
+                    {"freq": "daily", "count": 11}, {"freq": "daily", "count": True},
+                    {"freq": "daily", "interval": 0, "count": 2}, {"freq": "daily", "until": "soon"}]:
+            with self.assertRaises(ValueError, msg=bad):
+                parse_recurrence(bad, 10)
+
+    def test_occurrences_keep_wall_clock_time(self):
+        """Test that weekly occurrences stay at 09:00 across the March DST change."""
+        weekly = list(occurrences(self.start, self.end, Recurrence('weekly', 1, 3, None)))
+        self.assertEqual([s for s, _ in weekly],
+                         [datetime(2030, 3, 4, 9), datetime(2030, 3, 11, 9), datetime(2030, 3, 18, 9)])
+        self.assertEqual(list(occurrences(self.start, self.end, Recurrence('weekly', 1, 3, None), skip=2)), weekly[2:])
+
+    def test_until_is_inclusive_and_combines_with_count(self):
+        self.assertEqual(occurrence_count(self.start, Recurrence('daily', 2, None, date(2030, 3, 8))), 3)
+        self.assertEqual(occurrence_count(self.start, Recurrence('daily', 1, 2, date(2030, 3, 8))), 2)
+        self.assertEqual(occurrence_count(self.start, Recurrence('daily', 1, None, date(2030, 3, 3))), 0)
+
+    def test_occurrences_are_lazy(self):
+        every_day = occurrences(self.start, self.end, Recurrence('daily', 1, 10 ** 9, None))
+        self.assertEqual(len(list(islice(every_day, 5))), 5)
+
+    def test_conflicts_match_pairwise_check(self):
+        rng = random.Random(7)
+        candidates = list(occurrences(self.start, self.end, Recurrence('daily', 1, 60, None)))
+        busy = []
+        for _ in range(200):
+            start = self.start + timedelta(minutes=15 * rng.randrange(60 * 24 * 4))
+            busy.append((start, start + timedelta(minutes=rng.choice([15, 60, 240]))))
+        busy.sort()
+        expected = [i for i, (start, end) in enumerate(candidates)
+                    if any(b_start < end and b_end > start for b_start, b_end in busy)]
+        self.assertTrue(expected)
+        self.assertEqual(conflicts(candidates, busy), expected)
+        self.assertEqual(conflicts(candidates, []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from datetime import datetime, timedelta
+
+from reservation_index import ReservationIndex, ResourceIndexes
+
+
+class ReservationIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = datetime(2030, 1, 1, 9, 0)
+
+    def _at(self, minutes):
+        return self.base + timedelta(minutes=minutes)
+
+    def test_empty_index_has_no_overlaps(self):
+        index = ReservationIndex()
+        self.assertFalse(index.overlaps(self._at(0), self._at(60)))
+        self.assertEqual(len(index), 0)
+
+    def test_half_open_boundaries(self):
+        """Back-to-back reservations do not collide."""
+        index = ReservationIndex([(1, self._at(60), self._at(120))])
+        self.assertFalse(index.overlaps(self._at(0), self._at(60)))
+        self.assertFalse(index.overlaps(self._at(120), self._at(180)))
+        self.assertTrue(index.overlaps(self._at(30), self._at(61)))
+        self.assertTrue(index.overlaps(self._at(119), self._at(180)))
+        self.assertTrue(index.overlaps(self._at(70), self._at(80)))
+        self.assertTrue(index.overlaps(self._at(0), self._at(240)))
+
+    def test_long_interval_found_behind_short_ones(self):
+        """A long reservation is still found when shorter ones start after it."""
+        index = ReservationIndex([
+            (1, self._at(0), self._at(240)),
+            (2, self._at(30), self._at(45)),
+            (3, self._at(60), self._at(75)),
+        ])
+        self.assertTrue(index.overlaps(self._at(200), self._at(210)))
+        self.assertFalse(index.overlaps(self._at(240), self._at(255)))
+
+    def test_re_adding_indexed_row_is_noop(self):
+        index = ReservationIndex([(1, self._at(0), self._at(15))])
+        self.assertFalse(index.add(1, self._at(0), self._at(15)))
+        self.assertTrue(index.add(2, self._at(0), self._at(15)))
+        self.assertEqual(len(index), 2)
+
+    def test_remove(self):
+        """Test that removing an id frees its interval and leaves same-start neighbours."""
+        index = ReservationIndex([(1, self._at(0), self._at(60)), (2, self._at(0), self._at(30)),
+                                  (3, self._at(60), self._at(90))])
+        self.assertEqual(index.remove(1), (self._at(0), self._at(60)))
+        self.assertIsNone(index.remove(1))
+        self.assertFalse(index.overlaps(self._at(30), self._at(60)))
+        self.assertTrue(index.overlaps(self._at(15), self._at(20)))
+        self.assertEqual(index.next_expiry(self._at(30)), self._at(90))
+        self.assertTrue(index.add(1, self._at(30), self._at(45)))
+        self.assertEqual(index.find(1), (self._at(30), self._at(45)))
+
+    def test_overlaps_excluding_own_interval(self):
+        index = ReservationIndex([(1, self._at(0), self._at(60)), (2, self._at(60), self._at(90))])
+        self.assertTrue(index.overlaps(self._at(30), self._at(75), exclude=1))
+        self.assertFalse(index.overlaps(self._at(15), self._at(60), exclude=1))
+
+    def test_next_expiry(self):
+        index = ReservationIndex([
+            (1, self._at(0), self._at(240)),
+            (2, self._at(30), self._at(45)),
+        ])
+        self.assertEqual(index.next_expiry(self._at(0)), self._at(45))
+        self.assertEqual(index.next_expiry(self._at(45)), self._at(240))
+        self.assertIsNone(index.next_expiry(self._at(240)))
+
+    def test_overlapping_returns_sorted_intervals(self):
+        index = ReservationIndex([
+            (1, self._at(0), self._at(240)),
+            (2, self._at(300), self._at(315)),
+            (3, self._at(30), self._at(45)),
+        ])
+        self.assertEqual(index.overlapping(self._at(40), self._at(301)),
+                         [(self._at(0), self._at(240)), (self._at(30), self._at(45)),
+                          (self._at(300), self._at(315))])
+        self.assertEqual(index.overlapping(self._at(240), self._at(300)), [])
+
+
+class ResourceIndexesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = datetime(2030, 1, 1, 9, 0)
+
+    def _at(self, minutes):
+        return self.base + timedelta(minutes=minutes)
+
+    def test_resources_do_not_collide(self):
+        indexes = ResourceIndexes([('server-a', 1, self._at(0), self._at(60))])
+        self.assertTrue(indexes.get('server-a').overlaps(self._at(30), self._at(45)))
+        self.assertFalse(indexes.get('server-b').overlaps(self._at(30), self._at(45)))
+        self.assertTrue(indexes.add('server-b', 2, self._at(30), self._at(45)))
+        self.assertEqual(indexes.resources(), ['server-a', 'server-b'])
+        self.assertEqual(len(indexes), 2)
+
+    def test_lookup_does_not_register_resource(self):
+        indexes = ResourceIndexes()
+        self.assertEqual(len(indexes.get('unknown')), 0)
+        self.assertNotIn('unknown', indexes)
+
+    def test_find_and_remove_across_resources(self):
+        indexes = ResourceIndexes([('server-a', 1, self._at(0), self._at(60))])
+        self.assertEqual(indexes.find(1), ('server-a', self._at(0), self._at(60)))
+        self.assertEqual(indexes.remove(1), ('server-a', self._at(0), self._at(60)))
+        self.assertIsNone(indexes.find(1))
+        self.assertIsNone(indexes.remove(1))
+        indexes.add('server-b', 1, self._at(0), self._at(60))
+        self.assertFalse(indexes.get('server-a').overlaps(self._at(0), self._at(60)))
+        self.assertTrue(indexes.get('server-b').overlaps(self._at(0), self._at(60)))
+
+    def test_next_expiry_across_resources(self):
+        indexes = ResourceIndexes([
+            ('server-a', 1, self._at(0), self._at(240)),
+            ('server-b', 2, self._at(30), self._at(45)),
+        ])
+        self.assertEqual(indexes.next_expiry(self._at(0)), self._at(45))
+        self.assertEqual(indexes.next_expiry(self._at(0), ['server-a']), self._at(240))
+        self.assertIsNone(indexes.next_expiry(self._at(0), ['server-c']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+import response_cache
+from response_cache import LRUResponseCache, create_response_cache
+
+
+class LRUResponseCacheTestCase(unittest.TestCase):
+    def test_get_and_set(self):
+        cache = LRUResponseCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', b'body', ttl=60)
+        self.assertEqual(cache.get('a'), b'body')
+
+    def test_entries_expire(self):
+        cache = LRUResponseCache()
+        with mock.patch.object(response_cache.time, 'monotonic', return_value=100.0):
+            cache.set('a', b'body', ttl=5)
+        with mock.patch.object(response_cache.time, 'monotonic', return_value=104.9):
+            self.assertEqual(cache.get('a'), b'body')
+        with mock.patch.object(response_cache.time, 'monotonic', return_value=105.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUResponseCache(max_entries=2)
+        cache.set('a', b'1', ttl=60)
+        cache.set('b', b'2', ttl=60)
+        cache.get('a')
+        cache.set('c', b'3', ttl=60)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.get('c'), b'3')
+
+    def test_invalidate(self):
+        cache = LRUResponseCache()
+        cache.set('a', b'1', ttl=60)
+        cache.invalidate()
+        self.assertIsNone(cache.get('a'))
+
+    def test_redis_invalidate_leaves_the_keyspace_alone(self):
+        with mock.patch.object(response_cache, 'redis') as redis:
+            cache = create_response_cache('redis://localhost:6379/0')
+            cache.set('a', b'1', ttl=1.5)
+            cache.invalidate()
+        client = redis.Redis.from_url.return_value
+        client.set.assert_called_once_with('reservations:response:a', b'1', px=1500)
+        client.scan_iter.assert_not_called()
+        client.delete.assert_not_called()
+
+
+class CreateResponseCacheTestCase(unittest.TestCase):
+    def test_backends(self):
+        self.assertIsNone(create_response_cache(None))
+        self.assertIsInstance(create_response_cache('memory://', 10), LRUResponseCache)
+        with self.assertRaises(ValueError):
+            create_response_cache('memcached://localhost')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from flask import Flask
+
+import serialization
+from serialization import JSONEncoder, create_encoder
+
+ROWS = [
+    (1, 'alice', 'server-1', datetime(2030, 6, 12, 9, 0), datetime(2030, 6, 12, 10, 0), None),
+    (2, 'béatrice', 'gpu-2', datetime(2030, 6, 12, 9, 30), datetime(2030, 6, 12, 11, 15, 30), 7),
+]
+
+
+def to_dict(row):
+    id_, username, resource_id, start, end, series_id = row
+    return {'id': id_, 'username': username, 'resource_id': resource_id, 'start_time': start.isoformat(),
+            'end_time': end.isoformat(), 'series_id': series_id}
+
+
+class SerializationTestCase(unittest.TestCase):
+    def test_json_encoder_matches_flask_provider(self):
+        app = Flask(__name__)
+        encoder = JSONEncoder()
+        dicts = [to_dict(row) for row in ROWS]
+        with app.app_context():
+            self.assertEqual(encoder.array(ROWS), app.json.response(dicts).get_data())
+            self.assertEqual(encoder.page(ROWS, 'c'), app.json.response({'reservations': dicts, 'next': 'c'}).get_data())
+            self.assertEqual(encoder.lines(ROWS), ''.join(app.json.dumps(d) + '\n' for d in dicts).encode())
+        self.assertEqual(encoder.array([]), b'[]\n')
+
+    @unittest.skipIf(serialization.orjson is None, "orjson is not installed")
+    def test_orjson_encoder_decodes_to_the_same_json(self):
+        encoder = create_encoder('orjson')
+        dicts = [to_dict(row) for row in ROWS]
+        self.assertEqual(json.loads(encoder.array(ROWS)), dicts)
+        self.assertEqual(json.loads(encoder.page(ROWS, None)), {'reservations': dicts, 'next': None})
+        self.assertEqual([json.loads(line) for line in encoder.lines(ROWS).splitlines()], dicts)
+        self.assertTrue(encoder.array(ROWS).endswith(b'\n'))
+
+    def test_columns(self):
+        rows = [(id_, username, resource_id, int(start.timestamp()), int(end.timestamp()), series_id)
+                for id_, username, resource_id, start, end, series_id in ROWS + ROWS[:1]]
+        expected = {
+            'count': 3, 'id': [1, 2, 1], 'next': 'c', 'series_id': [None, 7, None],
+            'username': {'dictionary': ['alice', 'béatrice'], 'codes': [0, 1, 0]},
+            'resource_id': {'dictionary': ['server-1', 'gpu-2'], 'codes': [0, 1, 0]},
+            'start_time': [row[3] for row in rows], 'end_time': [row[4] for row in rows],
+        }
+        encoders = [JSONEncoder()] + ([create_encoder('orjson')] if serialization.orjson is not None else [])
+        for encoder in encoders:
+            self.assertEqual(json.loads(encoder.columns(rows, 'c')), expected, encoder.name)
+            self.assertEqual(json.loads(encoder.columns([]))['count'], 0)
+        self.assertEqual(JSONEncoder().columns([]),
+                         b'{"count":0,"end_time":[],"id":[],"next":null,'
+                         b'"resource_id":{"codes":[],"dictionary":[]},"series_id":[],"start_time":[],'
+                         b'"username":{"codes":[],"dictionary":[]}}\n')
+
+    def test_create_encoder(self):
+        self.assertEqual(create_encoder('json').name, 'json')
+        self.assertEqual(create_encoder(None).name, 'json' if serialization.orjson is None else 'orjson')
+        with mock.patch.object(serialization, 'orjson', None):
+            self.assertEqual(create_encoder(None).name, 'json')
+            with self.assertRaises(RuntimeError):
+                create_encoder('orjson')
+        with self.assertRaises(ValueError):
+            create_encoder('ujson')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from storage import apply_pragmas, engine_options
+
+
+class StorageProfileTestCase(unittest.TestCase):
+    def _engine(self, profile):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        url = f"sqlite:///{os.path.join(tmp.name, 'storage.db')}"
+        engine = create_engine(url, **engine_options(profile, url))
+        self.addCleanup(engine.dispose)
+        apply_pragmas(engine, profile)
+        return engine
+
+    def _pragma(self, engine, name):
+        with engine.connect() as conn:
+            return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_production_profile_sets_pragmas(self):
+        engine = self._engine('production')
+        self.assertEqual(self._pragma(engine, 'journal_mode'), 'wal')
+        self.assertEqual(self._pragma(engine, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self._pragma(engine, 'busy_timeout'), 5000)
+        self.assertEqual(self._pragma(engine, 'cache_size'), -65536)
+        self.assertEqual(engine.pool.size(), 10)
+
+    def test_default_profile_leaves_sqlite_alone(self):
+        engine = self._engine('default')
+        self.assertEqual(self._pragma(engine, 'journal_mode'), 'delete')
+        self.assertEqual(self._pragma(engine, 'synchronous'), 2)  # FULL
+
+    def test_engine_options(self):
+        self.assertEqual(engine_options('production', 'sqlite:///:memory:'), {})
+        self.assertEqual(engine_options('default', 'sqlite:////tmp/x.db'), {})
+        self.assertTrue(engine_options('production', 'postgresql://db/reservations')['pool_pre_ping'])
+        self.assertNotIn('pool_pre_ping', engine_options('production', 'sqlite:////tmp/x.db'))
+        with self.assertRaises(ValueError):
+            engine_options('fast', 'sqlite:////tmp/x.db')
+
+
+if __name__ == '__main__':
+    unittest.main()
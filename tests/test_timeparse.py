@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+from dateutil import parser
+
+from timeparse import from_epoch, localize, parse_local, to_epoch
+
+PST = pytz.timezone('America/Los_Angeles')
+
+
+class TimeParseTestCase(unittest.TestCase):
+    def _assert_same_as_pytz(self, naive):
+        expected = PST.localize(naive)
+        actual = localize(naive)
+        self.assertEqual(actual.replace(tzinfo=None), naive)
+        self.assertEqual(actual.utcoffset(), expected.utcoffset(), naive)
+
+    def test_matches_pytz_across_dst_transitions(self):
+        # Every 15 minutes through both 2030 transition days, gap and repeated hour included
+        for day in (datetime(2030, 3, 10), datetime(2030, 11, 3)):
+            for quarter in range(96 * 2):
+                self._assert_same_as_pytz(day + timedelta(minutes=15 * quarter))
+
+    def test_matches_pytz_over_a_year(self):
+        t = datetime(2031, 1, 1)
+        while t < datetime(2032, 1, 1):
+            self._assert_same_as_pytz(t)
+            t += timedelta(hours=7, minutes=13)
+
+    def test_matches_pytz_on_the_last_day(self):
+        for naive in (datetime(9999, 12, 31), datetime(9999, 12, 31, 10)):
+            self._assert_same_as_pytz(naive)
+        # Where pytz itself overflows
+        self.assertEqual(localize(datetime(9999, 12, 31, 23, 59, 59)).utcoffset(), timedelta(hours=-8))
+
+    def test_standard_time_for_repeated_and_skipped_times(self):
+        self.assertEqual(localize(datetime(2030, 11, 3, 1, 30)).utcoffset(), timedelta(hours=-8))
+        self.assertEqual(localize(datetime(2030, 3, 10, 2, 30)).utcoffset(), timedelta(hours=-8))
+        self.assertEqual(localize(datetime(2030, 3, 10, 3, 30)).utcoffset(), timedelta(hours=-7))
+
+    def test_parse_accepts_what_isoparse_accepts(self):
+        for value in ['2030-06-12 14:30', '2030-06-12T14:30:15', '2030-06-12', '20300612T1430',
+                      '2030-06-12 24:00', '2030-06-12T14:30:00.250', '9999-12-31 10:00']:
+            expected = PST.localize(parser.isoparse(value))
+            self.assertEqual(parse_local(value), expected, value)
+            self.assertEqual(parse_local(value).replace(tzinfo=None), expected.replace(tzinfo=None), value)
+
+    def test_parse_rejects_bad_and_offset_strings(self):
+        for value in ['2030-02-30 10:00', '2030-06-12 14:30:60', 'tomorrow', '2030-06-12T14:30+01:00']:
+            with self.assertRaises(ValueError, msg=value):
+                parse_local(value)
+        with self.assertRaises(TypeError):
+            parse_local(20300612)
+
+    def test_epoch_round_trip(self):
+        t = datetime(2030, 11, 2, 22)
+        while t < datetime(2030, 11, 3, 4):
+            epoch = to_epoch(t)
+            self.assertEqual(epoch, int(PST.localize(t).timestamp()))
+            self.assertEqual(from_epoch(epoch), t)
+            t += timedelta(minutes=15)
+        # Aware values keep their own instant; fractions of a second are floored
+        self.assertEqual(to_epoch(PST.localize(datetime(2030, 6, 12, 14, 30, 0, 900000))),
+                         to_epoch(datetime(2030, 6, 12, 14, 30)))
+        # The first 1:30 on the day DST ends is PDT, an hour before the stored (standard) 1:30
+        first = to_epoch(datetime(2030, 11, 3, 1, 30)) - 3600
+        self.assertEqual(from_epoch(first), datetime(2030, 11, 3, 1, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Fast parsing of the API's wall-clock timestamps into aware PST datetimes.
+
+Request bodies carry naive ``YYYY-MM-DD HH:MM[:SS]`` strings meaning
+America/Los_Angeles wall-clock time. ``parse_local`` reads that format with
+``datetime.fromisoformat`` (C code) rather than dateutil's pure-Python
+``isoparse``. Any other spelling still goes to ``isoparse``, so the accepted
+inputs do not change.
+
+``localize`` replaces ``pytz.localize``. Almost every day has one UTC offset
+all day long, so the fixed-offset tzinfo for a date is looked up once and
+cached. Only the two transition days a year are resolved per call through
+zoneinfo. The result matches ``PST.localize(naive)`` (``is_dst=False``):
+
+* a time repeated when DST ends resolves to standard time;
+* a time skipped when DST starts gets the standard offset, so it reads
+  as the hour after the gap.
+
+``to_epoch`` and ``from_epoch`` convert between those datetimes and the
+integer UTC epoch seconds the database stores (see models.EpochSeconds).
+"""
+import functools
+import math
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from dateutil import parser
+
+LOCAL_ZONE = ZoneInfo('America/Los_Angeles')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _fixed_zone(offset):
+    return timezone(offset)
+
+
+@functools.lru_cache(maxsize=1024)
+def _day_zone(ordinal):
+    """Fixed-offset tzinfo valid for all of local day ``ordinal``, or None on
+    a day the offset changes (or 9999-12-31, which has no next day)."""
+    midnight = datetime.fromordinal(ordinal)
+    offset = midnight.replace(tzinfo=LOCAL_ZONE).utcoffset()
+    if ordinal == datetime.max.toordinal():
+        return None
+    if (midnight + timedelta(days=1)).replace(tzinfo=LOCAL_ZONE).utcoffset() != offset:
+        return None
+    return _fixed_zone(offset)
+
+
+def _transition_offset(naive):
+    earlier = naive.replace(tzinfo=LOCAL_ZONE, fold=0)
+    later = naive.replace(tzinfo=LOCAL_ZONE, fold=1)
+    if earlier.utcoffset() == later.utcoffset():
+        return earlier.utcoffset()
+    # Repeated or skipped wall-clock time: take the standard-time reading
+    return (earlier if not earlier.dst() else later).utcoffset()
+
+
+def localize(naive):
+    """Attach the America/Los_Angeles UTC offset to a naive wall-clock datetime."""
+    zone = _day_zone(naive.toordinal())
+    if zone is None:
+        zone = _fixed_zone(_transition_offset(naive))
+    return naive.replace(tzinfo=zone)
+
+
+def parse_local(value):
+    """Parse a naive ISO 8601 string as America/Los_Angeles wall-clock time.
+
+    Raises ValueError (or TypeError for a non-string) like
+    ``PST.localize(parser.isoparse(value))``, including for strings that
+    carry their own UTC offset.
+    """
+    if len(value) in (16, 19) and value[10] in ' T':
+        try:
+            naive = datetime.fromisoformat(value)
+        except ValueError:
+            naive = parser.isoparse(value)
+    else:
+        naive = parser.isoparse(value)
+    if naive.tzinfo is not None:
+        raise ValueError("Not naive datetime (tzinfo is already set)")
+    return localize(naive)
+
+
+def to_epoch(value):
+    """Whole UTC epoch seconds of an aware datetime, or of a naive one read
+    as America/Los_Angeles wall-clock time. Fractions of a second are
+    dropped (floored)."""
+    if value.tzinfo is None:
+        value = localize(value)
+    return math.floor(value.timestamp())
+
+
+_SECOND = timedelta(seconds=1)
+# UTC day number -> naive datetime of the epoch shifted by that day's UTC
+# offset, or None for a day the offset changes. Filled on first use.
+_day_bases = {}
+
+
+def _local_offset(seconds):
+    return datetime.fromtimestamp(seconds, LOCAL_ZONE).utcoffset()
+
+
+def _day_base(day):
+    offset = _local_offset(day * 86400)
+    if _local_offset(day * 86400 + 86399) != offset:
+        return None
+    return _EPOCH + offset
+
+
+def from_epoch(seconds):
+    """Naive America/Los_Angeles wall-clock datetime of UTC epoch ``seconds``.
+
+    Runs once per timestamp of every row read, so the common case is one
+    dict lookup, one timedelta product and one addition.
+    """
+    day = seconds // 86400
+    try:
+        base = _day_bases[day]
+    except KeyError:
+        base = _day_bases[day] = _day_base(day)
+    if base is None:
+        return _EPOCH + _SECOND * seconds + _local_offset(seconds)
+    return base + _SECOND * seconds